@@ -0,0 +1,115 @@
+"""
+Token-level inverted index over the searchable text fields of the ads corpus.
+
+Built once when the dataset is loaded. Each term maps to a sorted NumPy array
+of row ids. Search keeps the original semantics, a case-insensitive substring
+of one text field, but uses the index to narrow the rows to check: a row can
+only match if it has a term ending with the query's first token, the exact
+middle tokens and a term starting with its last one (or, for a one-token
+query, a term containing it). The posting lists are intersected smallest
+first and only the surviving rows get the substring check, so the cost
+follows the size of the matching sets rather than the corpus.
+
+Queries without any alphanumeric token (punctuation, symbols, emoji) cannot
+be narrowed and are answered by scanning every row.
+"""
+
+import re
+from bisect import bisect_left
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+TEXT_FIELDS = ("ad_creative_body", "business_type", "category", "target_audience")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Joins a row's fields for the substring scan; never typed in a query, so matches cannot span fields
+FIELD_SEPARATOR = "\0"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens of a piece of text"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TextIndex:
+    """Inverted index from lowercase tokens to row ids"""
+
+    def __init__(self, columns: Dict[str, Iterable[str]]):
+        """Build from text columns (field name -> values in row order)"""
+        postings: Dict[str, List[int]] = {}
+        row_fields: List[List[str]] = []
+        for values in columns.values():
+            for row, text in enumerate(values):
+                text = str(text or "").lower()
+                if row == len(row_fields):
+                    row_fields.append([])
+                row_fields[row].append(text)
+                for term in set(tokenize(text)):
+                    postings.setdefault(term, []).append(row)
+        # Lowercased text per row for queries the tokens cannot answer
+        self.texts = [FIELD_SEPARATOR.join(fields) for fields in row_fields]
+        # np.unique sorts and drops rows repeated across fields
+        self.postings = {
+            term: np.unique(np.asarray(rows, dtype=np.int64)) for term, rows in postings.items()
+        }
+        # Sorted vocabulary (and its reversed terms) let a token match every term it prefixes (or ends)
+        self.vocabulary = sorted(self.postings)
+        self.reversed_vocabulary = sorted(term[::-1] for term in self.postings)
+
+    def rows_of(self, terms: Iterable[str]) -> np.ndarray:
+        """Sorted rows containing any of terms"""
+        matches = [self.postings[term] for term in terms]
+        if not matches:
+            return np.empty(0, dtype=np.int64)
+        if len(matches) == 1:
+            return matches[0]
+        return np.unique(np.concatenate(matches))
+
+    def prefix_rows(self, token: str) -> np.ndarray:
+        """Sorted rows containing any term that starts with token"""
+        start = bisect_left(self.vocabulary, token)
+        terms = []
+        for term in self.vocabulary[start:]:
+            if not term.startswith(token):
+                break
+            terms.append(term)
+        return self.rows_of(terms)
+
+    def suffix_rows(self, token: str) -> np.ndarray:
+        """Sorted rows containing any term that ends with token"""
+        reversed_token = token[::-1]
+        start = bisect_left(self.reversed_vocabulary, reversed_token)
+        terms = []
+        for reversed_term in self.reversed_vocabulary[start:]:
+            if not reversed_term.startswith(reversed_token):
+                break
+            terms.append(reversed_term[::-1])
+        return self.rows_of(terms)
+
+    def infix_rows(self, token: str) -> np.ndarray:
+        """Sorted rows containing any term that contains token"""
+        return self.rows_of(term for term in self.vocabulary if token in term)
+
+    def candidate_rows(self, tokens: List[str]) -> np.ndarray:
+        """Sorted rows that can contain a query with these tokens, in query order"""
+        if len(tokens) == 1:
+            return self.infix_rows(tokens[0])
+        # Inner tokens are whole words in any match; the outer ones may be cut off
+        posting_lists = [self.suffix_rows(tokens[0]), self.prefix_rows(tokens[-1])]
+        posting_lists += [self.postings.get(token, np.empty(0, dtype=np.int64)) for token in set(tokens[1:-1])]
+        posting_lists.sort(key=len)
+        rows = posting_lists[0]
+        for other in posting_lists[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def search(self, query: str) -> np.ndarray:
+        """Sorted rows with query as a substring of one of their fields (case-insensitive)"""
+        query = query.lower()
+        tokens = tokenize(query)
+        rows = self.candidate_rows(tokens) if tokens else range(len(self.texts))
+        return np.fromiter((row for row in rows if query in self.texts[row]), dtype=np.int64)
@@ -0,0 +1,226 @@
+"""
+Columnar in-memory store for the ads corpus.
+
+Numeric fields live in NumPy arrays, low-cardinality string fields are
+dictionary-encoded into integer codes, and free text stays in plain lists
+behind a TextIndex. Filters compile to boolean masks over the columns, and
+ad dicts are only rebuilt for the rows that are actually returned.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ad_index import TEXT_FIELDS, TextIndex
+
+NUMERIC_FIELDS = ("spend", "impressions")
+DATE_FIELDS = ("created_date",)
+CATEGORICAL_FIELDS = ("country", "business_type", "category", "platform", "ad_type")
+
+# Rows scanned per step when seeking to the next cursor page
+SEEK_CHUNK_ROWS = 65536
+
+
+class AdStore:
+    """Column-oriented ads table with mask-based filtering"""
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.size = len(records)
+        self.field_order = list(records[0].keys()) if records else []
+
+        # Content hash of the dataset; changes whenever any record does
+        digest = hashlib.sha256()
+        for ad in records:
+            digest.update(json.dumps(ad, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        self.version = digest.hexdigest()[:16]
+
+        self.numeric = {
+            field: np.fromiter((ad.get(field, 0) for ad in records), dtype=np.int64, count=self.size)
+            for field in NUMERIC_FIELDS
+        }
+        self.dates = {
+            field: np.array([ad.get(field) or "NaT" for ad in records], dtype="datetime64[D]")
+            for field in DATE_FIELDS
+        }
+
+        # Dictionary encoding: codes index into a sorted vocabulary of distinct values
+        self.vocabularies: Dict[str, List[str]] = {}
+        self.lookups: Dict[str, Dict[str, int]] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        for field in CATEGORICAL_FIELDS:
+            vocabulary = sorted({ad.get(field, "") for ad in records})
+            lookup = {value: code for code, value in enumerate(vocabulary)}
+            self.vocabularies[field] = vocabulary
+            self.lookups[field] = lookup
+            self.codes[field] = np.fromiter(
+                (lookup[ad.get(field, "")] for ad in records), dtype=np.int32, count=self.size
+            )
+
+        encoded = set(NUMERIC_FIELDS) | set(DATE_FIELDS) | set(CATEGORICAL_FIELDS)
+        self.objects: Dict[str, List[Any]] = {
+            field: [ad.get(field) for ad in records]
+            for field in self.field_order if field not in encoded
+        }
+
+        self.text_index = TextIndex({
+            field: self.column_values(field) for field in TEXT_FIELDS
+        })
+
+    def column_values(self, field: str) -> List[Any]:
+        """Plain Python values of a column, in row order"""
+        if field in self.codes:
+            vocabulary = self.vocabularies[field]
+            return [vocabulary[code] for code in self.codes[field]]
+        if field in self.numeric:
+            return self.numeric[field].tolist()
+        if field in self.dates:
+            return [str(value) for value in self.dates[field]]
+        return self.objects[field]
+
+    def compile(
+        self,
+        search_query: str = "",
+        filters: Optional[Dict[str, Optional[Iterable[str]]]] = None,
+        ranges: Optional[Dict[str, tuple]] = None,
+        date_ranges: Optional[Dict[str, tuple]] = None,
+    ) -> "AdQuery":
+        """Compile filter arguments into an AdQuery against this store"""
+        return AdQuery(self, search_query, filters, ranges, date_ranges)
+
+    def predicate(self, query: "AdQuery", selector: Any = slice(None), check_text: bool = True) -> np.ndarray:
+        """
+        Boolean array over the rows picked by selector (a slice or a sorted row
+        array) that satisfy query. Text matching is only applied to slices.
+        """
+        if isinstance(selector, slice):
+            start, stop, _ = selector.indices(self.size)
+            mask = np.ones(max(0, stop - start), dtype=bool)
+        else:
+            start = stop = None
+            mask = np.ones(len(selector), dtype=bool)
+
+        for field, (low, high) in query.ranges.items():
+            column = self.numeric[field][selector]
+            mask &= (column >= low) & (column <= high)
+
+        for field, (begin, end) in query.date_ranges.items():
+            column = self.dates[field][selector]
+            if begin is not None:
+                mask &= column >= begin
+            if end is not None:
+                mask &= column <= end
+
+        for field, codes in query.codes.items():
+            mask &= np.isin(self.codes[field][selector], codes)
+
+        if check_text and query.text_rows is not None and start is not None:
+            rows = query.text_rows
+            hits = rows[np.searchsorted(rows, start):np.searchsorted(rows, stop)] - start
+            text_mask = np.zeros(len(mask), dtype=bool)
+            text_mask[hits] = True
+            mask &= text_mask
+
+        return mask
+
+    def mask(self, query: "AdQuery") -> np.ndarray:
+        """Boolean mask over every row of the store"""
+        return self.predicate(query)
+
+    def count(self, query: "AdQuery") -> int:
+        """Number of rows matching query"""
+        if query.text_rows is not None:
+            return int(np.count_nonzero(self.predicate(query, query.text_rows, check_text=False)))
+        return int(np.count_nonzero(self.predicate(query)))
+
+    def seek(self, query: "AdQuery", after: int, limit: int) -> tuple:
+        """
+        Keyset pagination: up to limit matching rows with row id > after, plus
+        whether more follow. Only the rows up to the end of the page are scanned.
+        """
+        wanted = limit + 1
+        found: List[np.ndarray] = []
+        total = 0
+        chunk = max(SEEK_CHUNK_ROWS, wanted * 8)
+
+        if query.text_rows is not None:
+            # Walk the posting list instead of the table
+            candidates = query.text_rows[np.searchsorted(query.text_rows, after, side="right"):]
+            for start in range(0, len(candidates), chunk):
+                rows = candidates[start:start + chunk]
+                rows = rows[self.predicate(query, rows, check_text=False)]
+                found.append(rows)
+                total += len(rows)
+                if total >= wanted:
+                    break
+        else:
+            start = after + 1
+            while start < self.size and total < wanted:
+                stop = min(self.size, start + chunk)
+                rows = np.flatnonzero(self.predicate(query, slice(start, stop))) + start
+                found.append(rows)
+                total += len(rows)
+                start = stop
+
+        rows = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+        return rows[:limit], len(rows) > limit
+
+    def facet_counts(self, fields: Iterable[str] = CATEGORICAL_FIELDS, mask: Optional[np.ndarray] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Per-value row counts for categorical fields, over the rows selected by
+        mask (all rows if None), most frequent first. Zero counts are omitted.
+        """
+        facets = {}
+        for field in fields:
+            codes = self.codes[field] if mask is None else self.codes[field][mask]
+            counts = np.bincount(codes, minlength=len(self.vocabularies[field]))
+            order = sorted(np.flatnonzero(counts), key=lambda code: (-counts[code], self.vocabularies[field][code]))
+            facets[field] = [
+                {"value": self.vocabularies[field][code], "count": int(counts[code])} for code in order
+            ]
+        return facets
+
+    def materialize(self, rows: Iterable[int]) -> List[Dict[str, Any]]:
+        """Rebuild ad dicts, in the original field order, for the given rows"""
+        ads = []
+        for row in rows:
+            row = int(row)
+            ad = {}
+            for field in self.field_order:
+                if field in self.codes:
+                    ad[field] = self.vocabularies[field][self.codes[field][row]]
+                elif field in self.numeric:
+                    ad[field] = int(self.numeric[field][row])
+                elif field in self.dates:
+                    ad[field] = str(self.dates[field][row])
+                else:
+                    ad[field] = self.objects[field][row]
+            ads.append(ad)
+        return ads
+
+    def page(self, query: "AdQuery", limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """Materialize one offset-addressed page of the rows matching query"""
+        rows = np.flatnonzero(self.mask(query))[offset:offset + limit]
+        return self.materialize(rows)
+
+
+class AdQuery:
+    """Filter arguments resolved against one AdStore: text hits found, categorical values encoded"""
+
+    def __init__(self, store, search_query="", filters=None, ranges=None, date_ranges=None):
+        self.text_rows = store.text_index.search(search_query) if search_query else None
+        self.codes = {}
+        for field, values in (filters or {}).items():
+            if values:
+                lookup = store.lookups[field]
+                self.codes[field] = np.array([lookup[value] for value in values if value in lookup], dtype=np.int32)
+        self.ranges = dict(ranges or {})
+        self.date_ranges = {
+            field: (
+                np.datetime64(start, "D") if start else None,
+                np.datetime64(end, "D") if end else None,
+            )
+            for field, (start, end) in (date_ranges or {}).items()
+            if start or end
+        }
@@ -0,0 +1,183 @@
+"""
+Content-addressed cache for per-ad analysis results.
+
+Entries are keyed on the ad id, a hash of every field that goes into the
+analysis prompt and the prompt version, so editing an ad or the prompt
+naturally misses. Lookups go to an in-memory LRU first and then to an
+optional SQLite (WAL) tier that survives restarts.
+
+The LRU and the SQLite connection have separate locks, so memory hits never
+wait behind disk I/O. Expired rows are deleted from SQLite on open and then
+on writes at most once per purge interval.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Ad fields that feed the analysis prompt
+PROMPT_FIELDS = (
+    'ad_creative_body', 'business_type', 'category', 'platform',
+    'ad_type', 'target_audience', 'spend', 'impressions',
+)
+
+
+def analysis_cache_key(ad: Dict[str, Any], prompt_version: str) -> str:
+    """Build the cache key for an ad under the given prompt version"""
+    fields = {field: ad.get(field) for field in PROMPT_FIELDS}
+    digest = hashlib.sha256(
+        json.dumps(fields, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+    return f"{prompt_version}:{ad.get('id', '')}:{digest}"
+
+
+class AnalysisCache:
+    """Two-tier LRU/TTL cache: in-memory OrderedDict backed by SQLite"""
+
+    def __init__(
+        self, max_entries: int = 1024, ttl: float = 86400, db_path: Optional[str] = None, purge_interval: float = 3600
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.purge_interval = purge_interval
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Guards the LRU and the counters; never held across SQLite calls
+        self._lock = threading.Lock()
+        # Serializes use of the shared SQLite connection
+        self._db_lock = threading.Lock()
+        self._db = None
+        self._purged_at = 0.0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.expired_deleted = 0
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> None:
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS analysis_cache_created_at ON analysis_cache (created_at)"
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Analysis cache disk tier disabled ({db_path}): {e}")
+            self._db = None
+            return
+        self._purge_expired(time.time())
+
+    def _purge_expired(self, now: float) -> None:
+        """Delete SQLite rows past their TTL; callers must not hold _db_lock"""
+        with self._db_lock:
+            try:
+                deleted = self._db.execute(
+                    "DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl,)
+                ).rowcount
+            except sqlite3.Error as e:
+                logger.error(f"Analysis cache purge failed: {e}")
+                return
+            self._purged_at = now
+        if deleted > 0:
+            logger.info(f"Deleted {deleted} expired analysis cache rows")
+            with self._lock:
+                self.expired_deleted += deleted
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached analysis for key, or None on a miss or expiry"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+        row = None
+        if self._db is not None:
+            with self._db_lock:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.error(f"Analysis cache read failed: {e}")
+        if row is not None and now - row[1] < self.ttl:
+            value = json.loads(row[0])
+            with self._lock:
+                self._remember(key, value, row[1])
+                self.disk_hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store an analysis in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self.writes += 1
+        if self._db is None:
+            return
+        data = json.dumps(value)
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, data, now),
+                )
+            except sqlite3.Error as e:
+                logger.error(f"Analysis cache write failed: {e}")
+            purge_due = now - self._purged_at >= self.purge_interval
+        if purge_due:
+            self._purge_expired(now)
+
+    def _remember(self, key: str, value: Dict[str, Any], created_at: float) -> None:
+        self._entries[key] = (value, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM analysis_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "expired_deleted": self.expired_deleted,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "disk_enabled": self._db is not None,
+            }
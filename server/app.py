@@ -1,13 +1,33 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, send_file, Response, stream_with_context
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 import logging
-import requests
 import json
 import re
-import random
-from mock_ads_data import filter_ads, get_business_types, get_categories, get_countries
+import time
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed, wait
+from mock_ads_data import build_ad_query, page_ads, filter_ads_page, get_facets, get_business_types, get_categories, get_countries, get_dataset_version
+from llm_client import (
+    LLMError, LLMUnavailableError, DeadlineExceeded, GEMINI_MODEL, get_gemini_client, get_openai_client,
+    single_flight_stats, rate_limit_stats, circuit_breaker_stats,
+)
+from llm_flow import Blocking, Generate, GenerateJson, Parallel, run_flow
+from rate_limiter import CHAT, INTERACTIVE, with_priority
+from deadline import DEADLINE_HEADER, Deadline, deadline_scope
+from analysis_cache import AnalysisCache, analysis_cache_key
+from jobs import JobWorkers, MemoryJobBackend, SQLiteJobBackend
+from image_store import ImageAssetStore, MEDIA_TYPES, ASSET_NAME, image_prompt_key
+from http_cache import http_cached
+from chat_sessions import ChatSessionStore
+from structured_output import (
+    StructuredOutputError, ANALYSIS_SCHEMA, BATCH_ANALYSIS_SCHEMA, INSIGHTS_SCHEMA, STRATEGY_SCHEMA, FINDINGS_SCHEMA
+)
+from heuristic_analyzer import HeuristicAnalyzer
+from prompts import SYSTEM_PROMPT, CONTEXT_SYSTEM_PROMPT, ChatPromptTemplate
+from insights_summary import InsightsAggregator, summarize_analyses, findings_rounds, parse_findings, render_insights_data
 
 # Load environment variables
 load_dotenv()
@@ -24,206 +44,185 @@ GEMINI_API_KEY = os.getenv('GEMINI_APIKEY')
 if not GEMINI_API_KEY:
     logger.warning("GEMINI_APIKEY not found in environment variables")
 
+# Maximum number of ads analyzed concurrently per /api/analyze-ads request (1 = sequential)
+ANALYZE_MAX_WORKERS = max(1, int(os.getenv('ANALYZE_MAX_WORKERS', 8)))
+
+# Default /api/analyze-ads mode: "single" (one request per ad), "batch" (ANALYZE_BATCH_SIZE ads per request)
+# or "heuristic" (local keyword analyzer, no Gemini call)
+ANALYZE_MODE = os.getenv('ANALYZE_MODE', 'single')
+ANALYZE_BATCH_SIZE = max(1, int(os.getenv('ANALYZE_BATCH_SIZE', 5)))
+
+# Time budget of an /api/analyze-ads request (the X-Request-Timeout header overrides it; 0 = none).
+# Ads not analyzed in time get the heuristic analysis ("fallback") or only a marker ("pending")
+ANALYZE_DEADLINE_SECONDS = float(os.getenv('ANALYZE_DEADLINE_SECONDS', 25))
+ANALYZE_ON_DEADLINE = os.getenv('ANALYZE_ON_DEADLINE', 'fallback')
+
+# Relative data paths from the environment resolve against this directory
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Per-ad analysis cache; bump ANALYSIS_PROMPT_VERSION whenever the analysis prompt or output format changes
+# (v2: schema-constrained JSON output)
+ANALYSIS_PROMPT_VERSION = "v2"
+ANALYSIS_CACHE_PATH = os.getenv('ANALYSIS_CACHE_PATH', 'analysis_cache.sqlite3')
+analysis_cache = AnalysisCache(
+    max_entries=int(os.getenv('ANALYSIS_CACHE_SIZE', 1024)),
+    ttl=float(os.getenv('ANALYSIS_CACHE_TTL', 86400)),
+    db_path=os.path.join(SERVER_DIR, ANALYSIS_CACHE_PATH) if ANALYSIS_CACHE_PATH else None,
+    purge_interval=float(os.getenv('ANALYSIS_CACHE_PURGE_SECONDS', 3600))
+)
+
+# Ask Gemini for schema-constrained JSON, parsed as it streams (1), or free text parsed with a regex (0)
+STRUCTURED_OUTPUT = os.getenv('STRUCTURED_OUTPUT', '1') == '1'
+
+# Local keyword analyzer, used for mode="heuristic" and as the fallback when Gemini fails
+HEURISTIC_SEED = os.getenv('HEURISTIC_SEED')
+heuristic_analyzer = HeuristicAnalyzer(seed=int(HEURISTIC_SEED) if HEURISTIC_SEED else None)
+
+# Generation settings per endpoint
+CHAT_GENERATION_CONFIG = {"temperature": 0.7, "topP": 0.9, "topK": 40, "maxOutputTokens": 1000}
+ANALYSIS_GENERATION_CONFIG = {"temperature": 0.3, "topP": 0.8, "topK": 40, "maxOutputTokens": 2000}
+INSIGHTS_GENERATION_CONFIG = {"temperature": 0.4, "topP": 0.8, "topK": 40, "maxOutputTokens": 3000}
+STRATEGY_GENERATION_CONFIG = {"temperature": 0.7, "topP": 0.9, "topK": 40, "maxOutputTokens": 1500}
+FINDINGS_GENERATION_CONFIG = {"temperature": 0.3, "topP": 0.8, "topK": 40, "maxOutputTokens": 800}
+
+def call_gemini(prompt, generation_config):
+    """Return the text of a Gemini completion, raising LLMError on failure"""
+    return get_gemini_client(GEMINI_API_KEY).generate_text(prompt, generation_config)
+
+def run_gemini_flow(flow):
+    """Result of an llm_flow flow, run in this thread on the Gemini client (asgi.py awaits the same flows)"""
+    return run_flow(flow, get_gemini_client(GEMINI_API_KEY))
+
+def llm_error_answer(e):
+    """Chat answer text explaining a failed Gemini call"""
+    if isinstance(e, LLMUnavailableError):
+        return "Sorry, the AI service is temporarily unavailable. Please try again in a minute."
+    if e.status_code is None:
+        return "I received a response but it was empty."
+    logger.error(f"Gemini API error: {e.status_code} - {e.body}")
+    return f"Sorry, I encountered an error with the Gemini API: {e.status_code} - {e.body}"
+
+# Prompt token budgets: chat (system prompt + user context + history + question) and the analysis summary in the insights prompt
+CHAT_PROMPT_TOKEN_BUDGET = int(os.getenv('CHAT_PROMPT_TOKEN_BUDGET', 4000))
+INSIGHTS_PROMPT_TOKEN_BUDGET = int(os.getenv('INSIGHTS_PROMPT_TOKEN_BUDGET', 24000))
+
+# Insights selections larger than this are also map-reduced into findings, INSIGHTS_MAP_CHUNK_SIZE analyses per map call
+INSIGHTS_MAP_REDUCE_THRESHOLD = int(os.getenv('INSIGHTS_MAP_REDUCE_THRESHOLD', 200))
+INSIGHTS_MAP_CHUNK_SIZE = max(1, int(os.getenv('INSIGHTS_MAP_CHUNK_SIZE', 100)))
+INSIGHTS_REDUCE_FAN_IN = 8
+INSIGHTS_MAX_FINDINGS = 8
+INSIGHTS_FINDINGS_TOKEN_BUDGET = 1500
+CHAT_PROMPT = ChatPromptTemplate(CONTEXT_SYSTEM_PROMPT, CHAT_PROMPT_TOKEN_BUDGET)
+SIMPLE_CHAT_PROMPT = ChatPromptTemplate(SYSTEM_PROMPT, CHAT_PROMPT_TOKEN_BUDGET)
+
 def generate_gemini_response(user_query):
     """Generate response using Google's Gemini API"""
     if not GEMINI_API_KEY:
         return "Gemini API key not configured. Please check server logs and ensure GEMINI_APIKEY is set in the .env file."
     
     try:
-        # Use gemini-1.5-flash which is available in the current API
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
-        headers = {
-            "Content-Type": "application/json",
-        }
-        
-        # Professional marketing expert system prompt
-        system_prompt = """You are AdVision AI, a professional Marketing, Advertising, and Campaign Product Manager expert. You specialize in:
-
-**Core Expertise:**
-- Digital marketing strategy and campaign planning
-- Social media advertising (Meta, Google, TikTok, LinkedIn)
-- Performance marketing and ROI optimization
-- Brand strategy and positioning
-- Marketing analytics and data-driven insights
-- Creative campaign development
-- Customer acquisition and retention strategies
-- Marketing automation and funnel optimization
-
-**Your Communication Style:**
-- Professional yet approachable
-- Data-driven with practical insights
-- Ask clarifying questions to understand context
-- Provide actionable recommendations
-- Use industry terminology appropriately
-- Share relevant examples and case studies when helpful
-
-**Conversation Flow:**
-- Greet users warmly and introduce yourself as AdVision AI
-- Ask about their business, industry, or specific marketing challenges
-- Gather relevant context (budget, timeline, goals, current performance)
-- Provide tailored, actionable advice
-- Ask follow-up questions to dive deeper
-- Offer next steps or additional resources when appropriate
-
-**Response Guidelines:**
-- Keep responses concise but comprehensive
-- Focus ONLY on marketing, advertising, and campaign management topics
-- If asked about non-marketing topics, politely redirect to marketing-related subjects
-- Use bullet points and structured responses for complex topics
-- Include specific metrics, benchmarks, or industry standards when relevant
-- Always maintain a helpful, professional tone
-
-Remember: You are a marketing expert assistant. Stay focused on helping users with their marketing, advertising, and campaign needs."""
-
-        # Combine system prompt with user query
-        full_prompt = f"{system_prompt}\n\nUser: {user_query}\n\nAdVision AI:"
-        
-        data = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": full_prompt
-                        }
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topP": 0.9,
-                "topK": 40,
-                "maxOutputTokens": 1000
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=data)
+        return call_gemini(SIMPLE_CHAT_PROMPT.render(user_query), CHAT_GENERATION_CONFIG)
         
-        if response.status_code == 200:
-            result = response.json()
-            if 'candidates' in result and len(result['candidates']) > 0:
-                content = result['candidates'][0]['content']
-                if 'parts' in content and len(content['parts']) > 0:
-                    return content['parts'][0]['text']
-                else:
-                    return "I received a response but couldn't extract the text."
-            else:
-                return "I received a response but it was empty."
-        else:
-            logger.error(f"Gemini API error: {response.status_code} - {response.text}")
-            return f"Sorry, I encountered an error with the Gemini API: {response.status_code} - {response.text}"
-            
+    except LLMError as e:
+        return llm_error_answer(e)
     except Exception as e:
         logger.error(f"Error calling Gemini API: {e}")
         return f"Sorry, I encountered an error: {str(e)}"
 
-def generate_gemini_response_with_context(user_query, context_info="", conversation_history=""):
-    """Generate context-aware response using Google's Gemini API"""
-    if not GEMINI_API_KEY:
-        return "Gemini API key not configured. Please check server logs and ensure GEMINI_APIKEY is set in the .env file."
+# The user_context keys format_user_context renders; sessions keep only these
+USER_CONTEXT_KEYS = ('businessType', 'industry', 'budget', 'timeline', 'goals')
+
+def format_user_context(user_context):
+    """Render the client's user_context as a prompt section"""
+    if not user_context:
+        return ""
+    context_parts = []
+    if user_context.get('businessType'):
+        context_parts.append(f"Business Type: {user_context['businessType']}")
+    if user_context.get('industry'):
+        context_parts.append(f"Industry: {user_context['industry']}")
+    if user_context.get('budget'):
+        context_parts.append(f"Budget: {user_context['budget']}")
+    if user_context.get('timeline'):
+        context_parts.append(f"Timeline: {user_context['timeline']}")
+    if user_context.get('goals'):
+        context_parts.append(f"Goals: {', '.join(user_context['goals'])}")
     
+    if not context_parts:
+        return ""
+    return f"\n\n**User Context:**\n" + "\n".join(f"- {part}" for part in context_parts)
+
+def build_chat_prompt(question, user_context=None, conversation_history=None):
+    """Context-aware chat prompt, trimmed to CHAT_PROMPT_TOKEN_BUDGET"""
+    return CHAT_PROMPT.render(question, format_user_context(user_context), conversation_history)
+
+# Server-side chat sessions; they live in one process, so route a session to the same worker when WEB_CONCURRENCY > 1
+chat_sessions = ChatSessionStore(
+    max_sessions=int(os.getenv('CHAT_SESSION_MAX', 10000)),
+    idle_ttl=float(os.getenv('CHAT_SESSION_TTL', 3600)),
+    max_bytes=int(os.getenv('CHAT_SESSION_MAX_BYTES', 64 * 1024 * 1024)),
+    max_lines=CHAT_PROMPT.max_history_messages,
+    context_keys=USER_CONTEXT_KEYS
+)
+
+def prepare_chat(data):
+    """
+    (prompt, session) for a chat request. Requests with a session_id key use the
+    server-side session, starting a new one if the id is null or unknown; the
+    rest are rendered from the conversation_history and user_context they send.
+    """
+    question = data['question']
+    if 'session_id' not in data:
+        return build_chat_prompt(question, data.get('user_context', {}), data.get('conversation_history', [])), None
+    session = chat_sessions.get_or_create(data['session_id'])
+    chat_sessions.update_context(session, data.get('user_context') or {}, format_user_context)
+    return CHAT_PROMPT.render_lines(question, session.context_info, list(session.lines)), session
+
+def chat_flow(data):
+    """Response body for a chat request: Gemini's answer, or an explanation if the call fails"""
+    question = data['question']
+    full_prompt, session = prepare_chat(data)
     try:
-        # Use gemini-1.5-flash which is available in the current API
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
-        headers = {
-            "Content-Type": "application/json",
-        }
-        
-        # Professional marketing expert system prompt
-        system_prompt = """You are AdVision AI, a professional Marketing, Advertising, and Campaign Product Manager expert. You specialize in:
-
-**Core Expertise:**
-- Digital marketing strategy and campaign planning
-- Social media advertising (Meta, Google, TikTok, LinkedIn)
-- Performance marketing and ROI optimization
-- Brand strategy and positioning
-- Marketing analytics and data-driven insights
-- Creative campaign development
-- Customer acquisition and retention strategies
-- Marketing automation and funnel optimization
-
-**Your Communication Style:**
-- Professional yet approachable
-- Data-driven with practical insights
-- Ask clarifying questions to understand context
-- Provide actionable recommendations
-- Use industry terminology appropriately
-- Share relevant examples and case studies when helpful
-
-**Conversation Flow:**
-- Greet users warmly and introduce yourself as AdVision AI
-- Ask about their business, industry, or specific marketing challenges
-- Gather relevant context (budget, timeline, goals, current performance)
-- Provide tailored, actionable advice
-- Ask follow-up questions to dive deeper
-- Offer next steps or additional resources when appropriate
-
-**Response Guidelines:**
-- Keep responses concise but comprehensive
-- Focus ONLY on marketing, advertising, and campaign management topics
-- If asked about non-marketing topics, politely redirect to marketing-related subjects
-- Use bullet points and structured responses for complex topics
-- Include specific metrics, benchmarks, or industry standards when relevant
-- Always maintain a helpful, professional tone
-
-**Context Management:**
-- Remember user's business type, industry, budget, and goals
-- Reference previous conversation context when appropriate
-- Build on previous recommendations and insights
-- Ask follow-up questions based on what you've learned about their situation
-
-Remember: You are a marketing expert assistant. Stay focused on helping users with their marketing, advertising, and campaign needs."""
-
-        # Combine system prompt with context and user query
-        full_prompt = f"{system_prompt}{context_info}{conversation_history}\n\nUser: {user_query}\n\nAdVision AI:"
-        
-        data = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": full_prompt
-                        }
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topP": 0.9,
-                "topK": 40,
-                "maxOutputTokens": 1000
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=data)
-        
-        if response.status_code == 200:
-            result = response.json()
-            if 'candidates' in result and len(result['candidates']) > 0:
-                content = result['candidates'][0]['content']
-                if 'parts' in content and len(content['parts']) > 0:
-                    return content['parts'][0]['text']
-                else:
-                    return "I received a response but couldn't extract the text."
-            else:
-                return "I received a response but it was empty."
-        else:
-            logger.error(f"Gemini API error: {response.status_code} - {response.text}")
-            return f"Sorry, I encountered an error with the Gemini API: {response.status_code} - {response.text}"
-            
-    except Exception as e:
-        logger.error(f"Error calling Gemini API: {e}")
-        return f"Sorry, I encountered an error: {str(e)}"
+        answer = yield Generate(full_prompt, CHAT_GENERATION_CONFIG)
+        record_chat_turn(session, question, answer)
+    except LLMError as e:
+        answer = llm_error_answer(e)
+
+    response = {"answer": answer}
+    if session is not None:
+        response["session_id"] = session.session_id
+    return response
+
+def record_chat_turn(session, question, answer):
+    """Append a completed exchange to the session's history"""
+    if session is not None:
+        chat_sessions.append(
+            session,
+            CHAT_PROMPT.format_message({'role': 'user', 'content': question}),
+            CHAT_PROMPT.format_message({'role': 'assistant', 'content': answer})
+        )
+
+# Browser caching of the read-only endpoints: ads and filters can be reused for HTTP_CACHE_MAX_AGE
+# seconds, then (like health, always) revalidated with their ETag. Larger bodies are gzip/brotli-encoded
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 60))
+HTTP_COMPRESS_MIN_BYTES = int(os.getenv('HTTP_COMPRESS_MIN_BYTES', 1024))
+DATASET_CACHE_CONTROL = f"public, max-age={HTTP_CACHE_MAX_AGE}"
+
+# Largest page /api/fetch-ads returns; larger limits are capped to it
+FETCH_ADS_MAX_LIMIT = max(1, int(os.getenv('FETCH_ADS_MAX_LIMIT', 100)))
 
 @app.route('/api/health', methods=['GET'])
+@http_cached("no-cache", min_size=HTTP_COMPRESS_MIN_BYTES)
 def health_check():
     return jsonify({
         "status": "ok" if GEMINI_API_KEY else "error",
-        "model": "gemini-1.5-flash" if GEMINI_API_KEY else "not configured",
+        "model": GEMINI_MODEL if GEMINI_API_KEY else "not configured",
         "api_key_configured": bool(GEMINI_API_KEY),
         "message": "Gemini API configured successfully!" if GEMINI_API_KEY else "Gemini API key not found. Check logs and ensure GEMINI_APIKEY is set."
     }), 200 if GEMINI_API_KEY else 503
 
 @app.route('/api/chat', methods=['POST'])
+@with_priority(CHAT)
 def chat():
     try:
         data = request.json
@@ -231,54 +230,80 @@ def chat():
             return jsonify({"error": "Missing question parameter"}), 400
         
         question = data['question']
-        conversation_history = data.get('conversation_history', [])
-        user_context = data.get('user_context', {})
         
         logger.info(f"Received question: {question}")
-        logger.info(f"User context: {user_context}")
+        logger.info(f"User context: {data.get('user_context', {})}")
         
         if not GEMINI_API_KEY:
             return jsonify({
                 "answer": "Gemini API key is not configured. Please check server logs and ensure GEMINI_APIKEY is set in the .env file."
             })
         
-        # Build context-aware prompt
-        context_info = ""
-        if user_context:
-            context_parts = []
-            if user_context.get('businessType'):
-                context_parts.append(f"Business Type: {user_context['businessType']}")
-            if user_context.get('industry'):
-                context_parts.append(f"Industry: {user_context['industry']}")
-            if user_context.get('budget'):
-                context_parts.append(f"Budget: {user_context['budget']}")
-            if user_context.get('timeline'):
-                context_parts.append(f"Timeline: {user_context['timeline']}")
-            if user_context.get('goals'):
-                context_parts.append(f"Goals: {', '.join(user_context['goals'])}")
-            
-            if context_parts:
-                context_info = f"\n\n**User Context:**\n" + "\n".join(f"- {part}" for part in context_parts)
-        
-        # Build conversation history
-        conversation_text = ""
-        if conversation_history:
-            conversation_text = "\n\n**Previous Conversation:**\n"
-            for msg in conversation_history[-6:]:  # Last 6 messages for context
-                role = "User" if msg.get('role') == 'user' else "AdVision AI"
-                conversation_text += f"{role}: {msg.get('content', '')}\n"
-        
-        answer = generate_gemini_response_with_context(question, context_info, conversation_text)
-        
-        return jsonify({
-            "answer": answer
-        })
+        return jsonify(run_gemini_flow(chat_flow(data)))
         
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def sse_event(event, payload):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def stream_summary(started, first_token_ms, parts, session):
+    """Payload of the final "done" event of a chat stream"""
+    summary = {
+        "model": GEMINI_MODEL,
+        "time_to_first_token_ms": first_token_ms,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "chunks": len(parts),
+        "characters": sum(len(text) for text in parts)
+    }
+    if session is not None:
+        summary["session_id"] = session.session_id
+    return summary
+
+@app.route('/api/chat/stream', methods=['POST'])
+@with_priority(CHAT)
+def chat_stream():
+    """Stream the chat answer as Server-Sent Events: token*, then done (or error)"""
+    data = request.json
+    if not data or 'question' not in data:
+        return jsonify({"error": "Missing question parameter"}), 400
+    
+    question = data['question']
+    
+    logger.info(f"Received streaming question: {question}")
+    
+    if not GEMINI_API_KEY:
+        return jsonify({"error": "Gemini API key not configured"}), 503
+    
+    full_prompt, session = prepare_chat(data)
+    
+    def generate():
+        started = time.perf_counter()
+        first_token_ms = None
+        parts = []
+        try:
+            for text in get_gemini_client(GEMINI_API_KEY).stream_text(full_prompt, CHAT_GENERATION_CONFIG, CHAT):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except LLMError as e:
+            logger.error(f"Gemini streaming error: {e.status_code or e}")
+            yield sse_event("error", {"error": "Failed to generate response", "status": e.status_code})
+            return
+        answer = "".join(parts)
+        record_chat_turn(session, question, answer)
+        yield sse_event("done", stream_summary(started, first_token_ms, parts, session))
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/fetch-ads', methods=['GET'])
+@http_cached(DATASET_CACHE_CONTROL, version=get_dataset_version, min_size=HTTP_COMPRESS_MIN_BYTES)
 def fetch_ads():
     # Get query params
     q = request.args.get('q', '')
@@ -287,22 +312,45 @@ def fetch_ads():
     impressions_max = int(request.args.get('impressions_max', 1000000))
     spend_min = int(request.args.get('spend_min', 0))
     spend_max = int(request.args.get('spend_max', 100000))
-    limit = int(request.args.get('limit', 12))
-    offset = int(request.args.get('offset', 0))
+    start_date = request.args.get('start_date') or None
+    end_date = request.args.get('end_date') or None
+    try:
+        limit = int(request.args.get('limit', 12))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    # A page with room for no rows could never advance the cursor
+    if limit < 1 or offset < 0:
+        return jsonify({'error': 'limit must be at least 1 and offset must not be negative'}), 400
+    limit = min(limit, FETCH_ADS_MAX_LIMIT)
 
     # Use mock data instead of Meta API
     try:
-        ads = filter_ads(
+        query = build_ad_query(
             search_query=q,
             countries=country if country else None,
             min_spend=spend_min,
             max_spend=spend_max,
             min_impressions=impressions_min,
             max_impressions=impressions_max,
-            limit=limit,
-            offset=offset
+            start_date=start_date,
+            end_date=end_date
         )
         
+        # Cursor mode: any request carrying a cursor parameter (empty for the first page)
+        # or asking for facet counts gets a {ads, next_cursor, has_more, ...} object
+        include_facets = request.args.get('facets', '').lower() in ('1', 'true', 'yes')
+        if 'cursor' in request.args or include_facets:
+            include_total = request.args.get('include_total', '').lower() in ('1', 'true', 'yes')
+            try:
+                page = filter_ads_page(query, request.args.get('cursor'), limit, include_total, include_facets)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            logger.info(f"Returning {len(page['ads'])} mock ads (cursor page) for query: {q}")
+            return jsonify(page)
+        
+        ads = page_ads(query, limit, offset)
+        
         logger.info(f"Returning {len(ads)} mock ads for query: {q}")
         return jsonify(ads)
         
@@ -311,22 +359,428 @@ def fetch_ads():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/filter-options', methods=['GET'])
+@http_cached(DATASET_CACHE_CONTROL, version=get_dataset_version, min_size=HTTP_COMPRESS_MIN_BYTES)
 def get_filter_options():
     """Get available filter options for the frontend"""
     try:
         return jsonify({
             'business_types': get_business_types(),
             'categories': get_categories(),
-            'countries': get_countries()
+            'countries': get_countries(),
+            'facets': get_facets()
         })
     except Exception as e:
         logger.error(f"Exception in get_filter_options: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """Counters for the analysis cache, chat sessions, LLM call coalescing, rate limiting, circuit breakers, jobs and images"""
+    return jsonify({
+        "analysis": analysis_cache.stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "single_flight": single_flight_stats(),
+        "rate_limiter": rate_limit_stats(),
+        "circuit_breakers": circuit_breaker_stats(),
+        "jobs": job_workers.stats(),
+        "image_assets": image_store.stats() if image_store else None
+    })
+
 @app.route('/api/test', methods=['GET'])
 def test():
     return jsonify({"message": "Test endpoint working"})
 
+ANALYSIS_JSON_FORMAT = """{
+        "marketingStrategy": {
+            "primaryStrategy": "string",
+            "callToAction": "string",
+            "valueProposition": "string"
+        },
+        "emotionalAnalysis": {
+            "primaryEmotion": "string",
+            "emotionalScore": number (0-100),
+            "emotionalTriggers": ["string", "string"]
+        },
+        "sentimentAnalysis": {
+            "overallSentiment": "positive|negative|neutral",
+            "sentimentScore": number (-100 to 100),
+            "keyPhrases": ["string", "string", "string"]
+        },
+        "hooks": {
+            "primaryHook": "string",
+            "hookType": "curiosity|urgency|social_proof|fear|benefit|story",
+            "hookEffectiveness": number (0-100)
+        },
+        "performanceMetrics": {
+            "estimatedEngagement": number (0-100),
+            "conversionPotential": number (0-100),
+            "viralityScore": number (0-100)
+        }
+    }"""
+
+ANALYSIS_FOCUS = """Focus on:
+    1. Marketing strategy and positioning
+    2. Emotional triggers and psychological appeal
+    3. Sentiment and tone analysis
+    4. Hook types and effectiveness
+    5. Performance potential metrics"""
+
+ANALYSIS_SECTIONS = ("marketingStrategy", "emotionalAnalysis", "sentimentAnalysis", "hooks", "performanceMetrics")
+
+def format_ad_details(ad):
+    """Render the ad fields that the analysis prompts are built from"""
+    return f"""Ad Creative: "{ad.get('ad_creative_body', '')}"
+    Business Type: {ad.get('business_type', '')}
+    Category: {ad.get('category', '')}
+    Platform: {ad.get('platform', '')}
+    Ad Type: {ad.get('ad_type', '')}
+    Target Audience: {ad.get('target_audience', '')}
+    Spend: ${ad.get('spend', 0):,}
+    Impressions: {ad.get('impressions', 0):,}"""
+
+def build_analysis_prompt(ad):
+    """Prompt for analyzing a single ad"""
+    return f"""
+    Analyze this advertising creative and provide detailed insights in JSON format:
+
+    {format_ad_details(ad)}
+
+    Please provide analysis in this exact JSON format:
+    {ANALYSIS_JSON_FORMAT}
+
+    {ANALYSIS_FOCUS}
+    """
+
+def build_batch_analysis_prompt(ads, refs):
+    """Prompt for analyzing several ads in one request, each tagged with its ref"""
+    ad_blocks = "\n\n".join(
+        f"    [Ad ID: {ref}]\n    {format_ad_details(ad)}" for ad, ref in zip(ads, refs)
+    )
+    return f"""
+    Analyze each of the following {len(ads)} advertising creatives and provide detailed insights in JSON format.
+
+{ad_blocks}
+
+    Respond with a JSON array containing exactly one object per ad. Each object must
+    include an "id" field set to the Ad ID shown above, plus the analysis in this exact format:
+    {ANALYSIS_JSON_FORMAT}
+
+    {ANALYSIS_FOCUS}
+    """
+
+def cache_analysis(ad, analysis_json):
+    """Store a Gemini analysis (without the ad itself or its batch id) in the analysis cache and return it"""
+    analysis = {key: value for key, value in analysis_json.items() if key not in ("ad", "id")}
+    analysis_cache.set(analysis_cache_key(ad, ANALYSIS_PROMPT_VERSION), analysis)
+    return analysis
+
+def get_cached_analysis(ad):
+    """Cached analysis result for an ad, or None"""
+    cached = analysis_cache.get(analysis_cache_key(ad, ANALYSIS_PROMPT_VERSION))
+    return {"ad": ad, **cached} if cached is not None else None
+
+def extract_json_object(text):
+    """The {...} span of a free-text reply as JSON; raises StructuredOutputError if there is none"""
+    # Find JSON in the response
+    json_match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not json_match:
+        raise StructuredOutputError("no JSON object in reply", text=text)
+    try:
+        return json.loads(json_match.group())
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"invalid JSON: {e}", text=text) from e
+
+def request_analysis_flow(ad):
+    """
+    Gemini analysis result for one ad, cached on success. Unlike analyze_single_ad
+    it raises LLMError or StructuredOutputError instead of falling back.
+    """
+    prompt = build_analysis_prompt(ad)
+    if STRUCTURED_OUTPUT:
+        analysis_json = yield GenerateJson(prompt, ANALYSIS_GENERATION_CONFIG, ANALYSIS_SCHEMA)
+    else:
+        analysis_json = extract_json_object((yield Generate(prompt, ANALYSIS_GENERATION_CONFIG)))
+    return {"ad": ad, **(yield Blocking(cache_analysis, ad, analysis_json))}
+
+def request_analysis(ad):
+    return run_gemini_flow(request_analysis_flow(ad))
+
+def analyze_single_ad_flow(ad, index):
+    """Analyze one ad with Gemini, falling back to mock analysis on any failure; None if the request deadline ran out"""
+    cached = yield Blocking(get_cached_analysis, ad)
+    if cached is not None:
+        return cached
+
+    try:
+        return (yield from request_analysis_flow(ad))
+
+    except DeadlineExceeded:
+        # Left for the caller to mark as unfinished
+        return None
+    except StructuredOutputError as e:
+        logger.warning(f"Malformed analysis for ad {index+1}: {e}")
+        return generate_mock_analysis(ad, index)
+    except LLMError as e:
+        logger.error(f"Gemini API error for ad {index+1}: {e.status_code or e}")
+        return generate_mock_analysis(ad, index)
+    except Exception as e:
+        logger.error(f"Error analyzing ad {index+1}: {e}")
+        return generate_mock_analysis(ad, index)
+
+def analyze_single_ad(ad, index):
+    return run_gemini_flow(analyze_single_ad_flow(ad, index))
+
+def parse_batch_analysis(text, refs):
+    """
+    Map each ref to its analysis object from a batch response.
+    Refs whose entry is missing or lacks an analysis section are left out.
+    """
+    json_match = re.search(r'\[.*\]', text, re.DOTALL)
+    if not json_match:
+        return {}
+    try:
+        items = json.loads(json_match.group())
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    wanted = set(refs)
+    parsed = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        ref = str(item.get("id", ""))
+        if ref in wanted and all(isinstance(item.get(section), dict) for section in ANALYSIS_SECTIONS):
+            parsed[ref] = item
+    return parsed
+
+def batch_items_by_ref(items, refs):
+    """Map the wanted refs to their (already validated) structured batch items"""
+    wanted = set(refs)
+    return {str(item["id"]): item for item in items if str(item["id"]) in wanted}
+
+def request_batch_analysis_flow(prompt, generation_config, refs):
+    """
+    {ref: analysis} for one batch prompt. In structured mode, items that arrived
+    before a malformed item or a dropped stream are kept; only the rest are retried.
+    """
+    if not STRUCTURED_OUTPUT:
+        return parse_batch_analysis((yield Generate(prompt, generation_config)), refs)
+
+    received = []
+    try:
+        items = yield GenerateJson(
+            prompt, generation_config, BATCH_ANALYSIS_SCHEMA, on_value=lambda _, item: received.append(item)
+        )
+    except StructuredOutputError as e:
+        logger.warning(f"Malformed structured batch analysis after {len(e.partial)} items: {e}")
+        items = e.partial
+    except LLMError:
+        if not received:
+            raise
+        logger.warning(f"Gemini stream failed after {len(received)} batch items, keeping them")
+        items = received
+    return batch_items_by_ref(items, refs)
+
+def batch_generation_config(batch_size):
+    """Analysis generation config with room for batch_size answers"""
+    return {
+        **ANALYSIS_GENERATION_CONFIG,
+        "maxOutputTokens": min(8192, ANALYSIS_GENERATION_CONFIG["maxOutputTokens"] * batch_size)
+    }
+
+def collect_batch_results(ads, indices, refs, parsed):
+    """
+    Turn a batch reply's {ref: analysis} into per-ad results, caching each one.
+    Returns ({index: analysis}, [halves of the missing indices to retry]).
+    """
+    results = {}
+    missing = []
+    for i in indices:
+        analysis_json = parsed.get(refs[i])
+        if analysis_json is None:
+            missing.append(i)
+            continue
+        results[i] = {"ad": ads[i], **cache_analysis(ads[i], analysis_json)}
+
+    if not missing:
+        return results, []
+    logger.warning(f"Batch response missing {len(missing)} of {len(indices)} ads, retrying them")
+    middle = (len(missing) + 1) // 2
+    return results, [part for part in (missing[:middle], missing[middle:]) if part]
+
+def plan_analysis_batches(ads, batch_size):
+    """
+    Assign each ad its prompt ref, serve cached ads and group the rest into batches.
+    Returns (refs, results with cached entries filled in, batches of pending indices).
+    """
+    # Ads are referenced by id in the prompt; positions stand in for missing or duplicate ids
+    ids = [str(ad.get('id') or '') for ad in ads]
+    id_counts = Counter(ids)
+    refs = [ad_id if ad_id and id_counts[ad_id] == 1 else f"item_{i}" for i, ad_id in enumerate(ids)]
+
+    results = [None] * len(ads)
+    pending = []
+    for i, ad in enumerate(ads):
+        results[i] = get_cached_analysis(ad)
+        if results[i] is None:
+            pending.append(i)
+
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    return refs, results, batches
+
+def analyze_ad_batch_flow(ads, indices, refs):
+    """
+    Analyze ads[i] for every i in indices with one Gemini call.
+    Ads missing from a malformed or partial response are split in half and
+    retried, down to single-ad requests. Returns {index: analysis}, with None
+    for ads the request deadline ran out on.
+    """
+    if len(indices) == 1:
+        return {indices[0]: (yield from analyze_single_ad_flow(ads[indices[0]], indices[0]))}
+
+    batch_refs = [refs[i] for i in indices]
+    try:
+        parsed = yield from request_batch_analysis_flow(
+            build_batch_analysis_prompt([ads[i] for i in indices], batch_refs),
+            batch_generation_config(len(indices)),
+            batch_refs
+        )
+    except DeadlineExceeded:
+        return {i: None for i in indices}
+    except LLMError as e:
+        logger.error(f"Gemini API error for batch of {len(indices)} ads: {e.status_code or e}")
+        return {i: generate_mock_analysis(ads[i], i) for i in indices}
+
+    results, retry_parts = yield Blocking(collect_batch_results, ads, indices, refs, parsed)
+    # In sequence on the threaded server (the call already holds a pool thread), concurrently on the async one
+    for part_results in (yield Parallel([analyze_ad_batch_flow(ads, part, refs) for part in retry_parts])):
+        results.update(part_results)
+    return results
+
+def analyze_ad_batch(ads, indices, refs):
+    return run_gemini_flow(analyze_ad_batch_flow(ads, indices, refs))
+
+def run_until_deadline(calls, max_workers, deadline):
+    """
+    Run calls on a bounded pool in the request's context and return their
+    results in order, with None for calls unfinished at the deadline. Queued
+    calls are dropped; running ones stop at their deadline-clipped timeouts.
+    """
+    results = [None] * len(calls)
+    workers = min(max_workers, len(calls))
+    if workers <= 1:
+        for n, call in enumerate(calls):
+            if deadline is not None and deadline.expired:
+                break
+            results[n] = call()
+        return results
+
+    context = contextvars.copy_context()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {executor.submit(context.copy().run, call): n for n, call in enumerate(calls)}
+    done, _ = wait(futures, timeout=None if deadline is None else deadline.remaining())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for future in done:
+        results[futures[future]] = future.result()
+    return results
+
+def iter_until_deadline(calls, max_workers, deadline):
+    """
+    Run calls on a bounded pool under the deadline and yield each result as
+    soon as its call finishes (completion order). Stops at the deadline, or
+    when the consumer closes the generator, dropping calls not yet started.
+    """
+    if not calls:
+        return
+    context = contextvars.copy_context()
+
+    def run(call):
+        with deadline_scope(deadline):
+            return call()
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(calls)))
+    futures = [executor.submit(context.copy().run, run, call) for call in calls]
+    try:
+        for future in as_completed(futures, timeout=None if deadline is None else deadline.remaining()):
+            yield future.result()
+    except FuturesTimeoutError:
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def ndjson_line(payload):
+    """Format one newline-delimited JSON record"""
+    return json.dumps(payload) + "\n"
+
+def wants_ndjson(data, accept):
+    """Whether an analyze request asked for the streaming response, by body flag or Accept header"""
+    return bool(data.get('stream')) or 'application/x-ndjson' in (accept or '')
+
+def stream_analyses(ads, mode, batch_size, deadline, on_deadline):
+    """
+    NDJSON records {"index", "analysis"}, one per ad as soon as its analysis is
+    ready (cached ads first), then ads unfinished at the deadline as fallback or
+    pending entries, and finally a {"done": true} summary record.
+    """
+    results = [None] * len(ads)
+    if mode == 'batch':
+        refs, results, batches = plan_analysis_batches(ads, batch_size)
+        calls = [lambda batch=batch: analyze_ad_batch(ads, batch, refs) for batch in batches]
+    else:
+        calls = [lambda ad=ad, i=i: {i: analyze_single_ad(ad, i)} for i, ad in enumerate(ads)]
+    for i, result in enumerate(results):
+        if result is not None:
+            yield ndjson_line({"index": i, "analysis": result})
+    for finished in iter_until_deadline(calls, ANALYZE_MAX_WORKERS, deadline):
+        for i, result in finished.items():
+            if result is not None:
+                results[i] = result
+                yield ndjson_line({"index": i, "analysis": result})
+    yield from stream_unfinished_analyses(ads, results, on_deadline)
+
+def stream_unfinished_analyses(ads, results, on_deadline):
+    """NDJSON records for the ads unfinished at the deadline, then the {"done": true} summary record"""
+    unfinished = [i for i, result in enumerate(results) if result is None]
+    results = finish_analyses(ads, results, on_deadline)
+    for i in unfinished:
+        yield ndjson_line({"index": i, "analysis": results[i]})
+    yield ndjson_line({"done": True, "total": len(ads), "unfinished": len(unfinished)})
+
+def stream_finished_analyses(analyses):
+    """NDJSON records for analyses that are all ready up front (heuristic mode)"""
+    for i, analysis in enumerate(analyses):
+        yield ndjson_line({"index": i, "analysis": analysis})
+    yield ndjson_line({"done": True, "total": len(analyses), "unfinished": 0})
+
+def ndjson_response(lines):
+    response = Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def analyze_ads_batched(ads, batch_size, max_workers, deadline=None):
+    """Analyze ads in multi-ad Gemini requests, serving cached ads without a call; None where the deadline ran out"""
+    refs, results, batches = plan_analysis_batches(ads, batch_size)
+    calls = [lambda batch=batch: analyze_ad_batch(ads, batch, refs) for batch in batches]
+    for batch, batch_result in zip(batches, run_until_deadline(calls, max_workers, deadline)):
+        for i in batch:
+            results[i] = (batch_result or {}).get(i)
+    return results
+
+def finish_analyses(ads, results, on_deadline):
+    """results with each None (not analyzed before the deadline) replaced by a fallback or pending entry"""
+    unfinished = [i for i, result in enumerate(results) if result is None]
+    if unfinished:
+        logger.warning(f"Deadline reached with {len(unfinished)} of {len(ads)} ads unfinished, marking them {on_deadline}")
+    for i in unfinished:
+        if on_deadline == 'pending':
+            results[i] = {"ad": ads[i], "status": "pending"}
+        else:
+            results[i] = {**generate_mock_analysis(ads[i], i), "status": "fallback"}
+    return results
+
 @app.route('/api/analyze-ads', methods=['POST', 'OPTIONS'])
 def analyze_ads():
     """Analyze selected ads using AI"""
@@ -334,7 +788,7 @@ def analyze_ads():
     if request.method == 'OPTIONS':
         response = jsonify({'status': 'ok'})
         response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        response.headers.add('Access-Control-Allow-Headers', f'Content-Type, {DEADLINE_HEADER}')
         response.headers.add('Access-Control-Allow-Methods', 'POST')
         return response
     
@@ -350,121 +804,141 @@ def analyze_ads():
         
         logger.info(f"Analyzing {len(ads)} ads")
         
+        mode = data.get('mode', ANALYZE_MODE)
+        stream = wants_ndjson(data, request.headers.get('Accept'))
+        if mode == 'heuristic':
+            # Local keyword analysis only: no Gemini call, no API key needed
+            analyses = heuristic_analyzer.analyze_batch(ads)
+            if stream:
+                return ndjson_response(stream_finished_analyses(analyses))
+            return jsonify(analyses)
+        
         if not GEMINI_API_KEY:
             return jsonify({"error": "Gemini API key not configured"}), 503
         
-        # Create analysis prompt for each ad
-        analysis_results = []
+        deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER), ANALYZE_DEADLINE_SECONDS)
+        on_deadline = data.get('on_deadline', ANALYZE_ON_DEADLINE)
+        batch_size = max(1, int(data.get('batch_size', ANALYZE_BATCH_SIZE)))
+        if stream:
+            # Each record is sent as soon as its ad is analyzed
+            return ndjson_response(stream_analyses(ads, mode, batch_size, deadline, on_deadline))
         
-        for i, ad in enumerate(ads):
-            analysis_prompt = f"""
-            Analyze this advertising creative and provide detailed insights in JSON format:
-
-            Ad Creative: "{ad.get('ad_creative_body', '')}"
-            Business Type: {ad.get('business_type', '')}
-            Category: {ad.get('category', '')}
-            Platform: {ad.get('platform', '')}
-            Ad Type: {ad.get('ad_type', '')}
-            Target Audience: {ad.get('target_audience', '')}
-            Spend: ${ad.get('spend', 0):,}
-            Impressions: {ad.get('impressions', 0):,}
-
-            Please provide analysis in this exact JSON format:
-            {{
-                "marketingStrategy": {{
-                    "primaryStrategy": "string",
-                    "callToAction": "string", 
-                    "valueProposition": "string"
-                }},
-                "emotionalAnalysis": {{
-                    "primaryEmotion": "string",
-                    "emotionalScore": number (0-100),
-                    "emotionalTriggers": ["string", "string"]
-                }},
-                "sentimentAnalysis": {{
-                    "overallSentiment": "positive|negative|neutral",
-                    "sentimentScore": number (-100 to 100),
-                    "keyPhrases": ["string", "string", "string"]
-                }},
-                "hooks": {{
-                    "primaryHook": "string",
-                    "hookType": "curiosity|urgency|social_proof|fear|benefit|story",
-                    "hookEffectiveness": number (0-100)
-                }},
-                "performanceMetrics": {{
-                    "estimatedEngagement": number (0-100),
-                    "conversionPotential": number (0-100),
-                    "viralityScore": number (0-100)
-                }}
-            }}
-
-            Focus on:
-            1. Marketing strategy and positioning
-            2. Emotional triggers and psychological appeal
-            3. Sentiment and tone analysis
-            4. Hook types and effectiveness
-            5. Performance potential metrics
-            """
-            
-            try:
-                # Call Gemini API for analysis
-                url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
-                headers = {"Content-Type": "application/json"}
-                
-                data_request = {
-                    "contents": [{"parts": [{"text": analysis_prompt}]}],
-                    "generationConfig": {
-                        "temperature": 0.3,
-                        "topP": 0.8,
-                        "topK": 40,
-                        "maxOutputTokens": 2000
-                    }
-                }
-                
-                response = requests.post(url, headers=headers, json=data_request)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if 'candidates' in result and len(result['candidates']) > 0:
-                        content = result['candidates'][0]['content']
-                        if 'parts' in content and len(content['parts']) > 0:
-                            analysis_text = content['parts'][0]['text']
-                            
-                            # Try to extract JSON from the response
-                            import json
-                            import re
-                            
-                            # Find JSON in the response
-                            json_match = re.search(r'\{.*\}', analysis_text, re.DOTALL)
-                            if json_match:
-                                analysis_json = json.loads(json_match.group())
-                                analysis_results.append({
-                                    "ad": ad,
-                                    **analysis_json
-                                })
-                            else:
-                                # Fallback to mock data if JSON parsing fails
-                                logger.warning(f"Could not parse JSON from analysis for ad {i+1}")
-                                analysis_results.append(generate_mock_analysis(ad, i))
-                        else:
-                            analysis_results.append(generate_mock_analysis(ad, i))
-                    else:
-                        analysis_results.append(generate_mock_analysis(ad, i))
-                else:
-                    logger.error(f"Gemini API error for ad {i+1}: {response.status_code}")
-                    analysis_results.append(generate_mock_analysis(ad, i))
-                    
-            except Exception as e:
-                logger.error(f"Error analyzing ad {i+1}: {e}")
-                analysis_results.append(generate_mock_analysis(ad, i))
+        with deadline_scope(deadline):
+            if mode == 'batch':
+                analysis_results = analyze_ads_batched(ads, batch_size, ANALYZE_MAX_WORKERS, deadline)
+            else:
+                # Analyze ads on a bounded worker pool, results in input order
+                calls = [lambda ad=ad, i=i: analyze_single_ad(ad, i) for i, ad in enumerate(ads)]
+                analysis_results = run_until_deadline(calls, ANALYZE_MAX_WORKERS, deadline)
         
-        return jsonify(analysis_results)
+        return jsonify(finish_analyses(ads, analysis_results, on_deadline))
         
     except Exception as e:
         logger.error(f"Error in analyze_ads endpoint: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def plan_insights_findings(analysis):
+    """Map-reduce rounds for a selection too large to describe by its summary alone, else None"""
+    if len(analysis) <= INSIGHTS_MAP_REDUCE_THRESHOLD:
+        return None
+    return findings_rounds(
+        analysis, INSIGHTS_MAP_CHUNK_SIZE, INSIGHTS_REDUCE_FAN_IN, INSIGHTS_MAX_FINDINGS, INSIGHTS_FINDINGS_TOKEN_BUDGET
+    )
+
+def request_findings_flow(prompt):
+    """Findings list from one map or reduce prompt; empty if the call fails"""
+    try:
+        if STRUCTURED_OUTPUT:
+            value = yield GenerateJson(prompt, FINDINGS_GENERATION_CONFIG, FINDINGS_SCHEMA)
+        else:
+            value = extract_json_object((yield Generate(prompt, FINDINGS_GENERATION_CONFIG)))
+        return parse_findings(value)
+    except (LLMError, StructuredOutputError) as e:
+        logger.warning(f"Insights map-reduce step failed: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Error in insights map-reduce step: {e}")
+        return []
+
+def insights_findings_flow(analysis):
+    """Findings for a very large selection (None for ordinary ones), each round's map or reduce calls run in parallel"""
+    rounds = plan_insights_findings(analysis)
+    if rounds is None:
+        return None
+    prompts = next(rounds)
+    while True:
+        logger.info(f"Insights map-reduce round of {len(prompts)} calls")
+        findings = yield Parallel([request_findings_flow(prompt) for prompt in prompts], ANALYZE_MAX_WORKERS)
+        try:
+            prompts = rounds.send(findings)
+        except StopIteration as done:
+            return done.value
+
+def build_insights_prompt(analysis, findings=None):
+    """Prompt asking Gemini for insights across the given ad analyses, from their summary (and map-reduce findings)"""
+    return f"""
+    As a marketing expert, analyze these competitor ad analyses and provide actionable insights for creating better ads:
+
+    {render_insights_data(summarize_analyses(analysis), findings, INSIGHTS_PROMPT_TOKEN_BUDGET)}
+
+    Based on this analysis, provide comprehensive insights in this exact JSON format:
+    {{
+        "competitiveAnalysis": {{
+            "strengths": ["string", "string", "string"],
+            "weaknesses": ["string", "string", "string"],
+            "opportunities": ["string", "string", "string"],
+            "threats": ["string", "string", "string"]
+        }},
+        "strategicRecommendations": {{
+            "marketingStrategy": ["string", "string", "string"],
+            "emotionalAppeal": ["string", "string", "string"],
+            "hookOptimization": ["string", "string", "string"],
+            "performanceOptimization": ["string", "string", "string"]
+        }},
+        "creativeGuidelines": {{
+            "messaging": ["string", "string", "string"],
+            "visualElements": ["string", "string", "string"],
+            "callToAction": ["string", "string", "string"],
+            "toneOfVoice": ["string", "string", "string"]
+        }},
+        "implementationPlan": {{
+            "immediateActions": ["string", "string", "string"],
+            "shortTermGoals": ["string", "string", "string"],
+            "longTermStrategy": ["string", "string", "string"],
+            "successMetrics": ["string", "string", "string"]
+        }},
+        "competitiveAdvantage": {{
+            "uniquePositioning": "string",
+            "differentiationStrategy": "string",
+            "valueProposition": "string",
+            "targetAudience": "string"
+        }}
+    }}
+
+    Focus on:
+    1. Identifying gaps in competitor strategies
+    2. Opportunities for differentiation
+    3. Specific actionable recommendations
+    4. Creative and messaging improvements
+    5. Performance optimization strategies
+    6. Implementation roadmap
+    """
+
+def parse_insights(insights_text, analysis):
+    """Insights JSON from a Gemini reply, or mock insights if none can be parsed"""
+    # Find JSON in the response
+    json_match = re.search(r'\{.*\}', insights_text, re.DOTALL)
+    if json_match:
+        try:
+            return json.loads(json_match.group())
+        except json.JSONDecodeError as e:
+            logger.warning(f"Invalid JSON in insights generation: {e}")
+    # Fallback to mock insights if JSON parsing fails
+    logger.warning("Could not parse JSON from insights generation")
+    return generate_mock_insights(analysis)
+
 @app.route('/api/generate-insights', methods=['POST', 'OPTIONS'])
+@with_priority(INTERACTIVE)
 def generate_insights():
     """Generate smart insights based on competitor ad analysis"""
     # Handle preflight requests
@@ -490,323 +964,252 @@ def generate_insights():
         if not GEMINI_API_KEY:
             return jsonify({"error": "Gemini API key not configured"}), 503
         
-        # Create insights prompt
-        insights_prompt = f"""
-        As a marketing expert, analyze these competitor ad analyses and provide actionable insights for creating better ads:
-
-        {json.dumps(analysis, indent=2)}
-
-        Based on this analysis, provide comprehensive insights in this exact JSON format:
-        {{
-            "competitiveAnalysis": {{
-                "strengths": ["string", "string", "string"],
-                "weaknesses": ["string", "string", "string"],
-                "opportunities": ["string", "string", "string"],
-                "threats": ["string", "string", "string"]
-            }},
-            "strategicRecommendations": {{
-                "marketingStrategy": ["string", "string", "string"],
-                "emotionalAppeal": ["string", "string", "string"],
-                "hookOptimization": ["string", "string", "string"],
-                "performanceOptimization": ["string", "string", "string"]
-            }},
-            "creativeGuidelines": {{
-                "messaging": ["string", "string", "string"],
-                "visualElements": ["string", "string", "string"],
-                "callToAction": ["string", "string", "string"],
-                "toneOfVoice": ["string", "string", "string"]
-            }},
-            "implementationPlan": {{
-                "immediateActions": ["string", "string", "string"],
-                "shortTermGoals": ["string", "string", "string"],
-                "longTermStrategy": ["string", "string", "string"],
-                "successMetrics": ["string", "string", "string"]
-            }},
-            "competitiveAdvantage": {{
-                "uniquePositioning": "string",
-                "differentiationStrategy": "string",
-                "valueProposition": "string",
-                "targetAudience": "string"
-            }}
-        }}
-
-        Focus on:
-        1. Identifying gaps in competitor strategies
-        2. Opportunities for differentiation
-        3. Specific actionable recommendations
-        4. Creative and messaging improvements
-        5. Performance optimization strategies
-        6. Implementation roadmap
-        """
-        
-        try:
-            # Call Gemini API for insights
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
-            headers = {"Content-Type": "application/json"}
-            
-            data_request = {
-                "contents": [{"parts": [{"text": insights_prompt}]}],
-                "generationConfig": {
-                    "temperature": 0.4,
-                    "topP": 0.8,
-                    "topK": 40,
-                    "maxOutputTokens": 3000
-                }
-            }
-            
-            response = requests.post(url, headers=headers, json=data_request)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    content = result['candidates'][0]['content']
-                    if 'parts' in content and len(content['parts']) > 0:
-                        insights_text = content['parts'][0]['text']
-                        
-                        # Try to extract JSON from the response
-                        # Find JSON in the response
-                        json_match = re.search(r'\{.*\}', insights_text, re.DOTALL)
-                        if json_match:
-                            insights_json = json.loads(json_match.group())
-                            return jsonify(insights_json)
-                        else:
-                            # Fallback to mock insights if JSON parsing fails
-                            logger.warning("Could not parse JSON from insights generation")
-                            return jsonify(generate_mock_insights(analysis))
-                    else:
-                        return jsonify(generate_mock_insights(analysis))
-                else:
-                    return jsonify(generate_mock_insights(analysis))
-            else:
-                logger.error(f"Gemini API error for insights: {response.status_code}")
-                return jsonify(generate_mock_insights(analysis))
-                
-        except Exception as e:
-            logger.error(f"Error generating insights: {e}")
-            return jsonify(generate_mock_insights(analysis))
+        return jsonify(create_insights(analysis))
         
     except Exception as e:
         logger.error(f"Error in generate_insights endpoint: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def create_insights_flow(analysis):
+    """Insights across the analyses from Gemini, or mock insights if the call fails"""
+    try:
+        insights_prompt = build_insights_prompt(analysis, (yield from insights_findings_flow(analysis)))
+        if STRUCTURED_OUTPUT:
+            return (yield GenerateJson(insights_prompt, INSIGHTS_GENERATION_CONFIG, INSIGHTS_SCHEMA))
+        insights_text = yield Generate(insights_prompt, INSIGHTS_GENERATION_CONFIG)
+        return parse_insights(insights_text, analysis)
+            
+    except StructuredOutputError as e:
+        logger.warning(f"Malformed structured insights: {e}")
+        return generate_mock_insights(analysis)
+    except LLMError as e:
+        logger.error(f"Gemini API error for insights: {e.status_code or e}")
+        return generate_mock_insights(analysis)
+    except Exception as e:
+        logger.error(f"Error generating insights: {e}")
+        return generate_mock_insights(analysis)
+
+def create_insights(analysis):
+    return run_gemini_flow(create_insights_flow(analysis))
+
 def generate_mock_insights(analysis):
     """Generate mock insights data for fallback"""
-    
-    # Analyze the provided analysis to generate relevant insights
-    strategies = [item.get('marketingStrategy', {}).get('primaryStrategy', '') for item in analysis]
-    emotions = [item.get('emotionalAnalysis', {}).get('primaryEmotion', '') for item in analysis]
-    sentiments = [item.get('sentimentAnalysis', {}).get('overallSentiment', '') for item in analysis]
-    
-    # Identify common patterns
-    common_strategy = max(set(strategies), key=strategies.count) if strategies else 'General'
-    common_emotion = max(set(emotions), key=emotions.count) if emotions else 'Neutral'
-    avg_sentiment = 'positive' if sentiments.count('positive') > len(sentiments)/2 else 'negative' if sentiments.count('negative') > len(sentiments)/2 else 'neutral'
-    
-    return {
-        "competitiveAnalysis": {
-            "strengths": [
-                f"Competitors are using {common_strategy} effectively",
-                "Strong emotional connection through targeted messaging",
-                "Consistent brand positioning across campaigns"
-            ],
-            "weaknesses": [
-                "Limited differentiation in messaging approach",
-                "Over-reliance on single emotional trigger",
-                "Generic call-to-action strategies"
-            ],
-            "opportunities": [
-                "Gap in unique value proposition messaging",
-                "Potential for innovative hook strategies",
-                "Room for improved emotional storytelling"
-            ],
-            "threats": [
-                "Market saturation with similar approaches",
-                "Risk of being perceived as generic",
-                "Potential loss of competitive edge"
-            ]
-        },
-        "strategicRecommendations": {
-            "marketingStrategy": [
-                f"Differentiate from {common_strategy} approach",
-                "Focus on unique value proposition",
-                "Implement multi-channel strategy"
-            ],
-            "emotionalAppeal": [
-                f"Counter {common_emotion} with complementary emotions",
-                "Create emotional journey in messaging",
-                "Build deeper emotional connections"
-            ],
-            "hookOptimization": [
-                "Develop unique hook patterns",
-                "Test curiosity-driven approaches",
-                "Implement urgency without pressure"
-            ],
-            "performanceOptimization": [
-                "A/B test multiple messaging approaches",
-                "Optimize for higher engagement rates",
-                "Focus on conversion optimization"
-            ]
-        },
-        "creativeGuidelines": {
-            "messaging": [
-                "Lead with unique value proposition",
-                "Use storytelling to create connection",
-                "Include social proof elements"
-            ],
-            "visualElements": [
-                "Use contrasting colors to stand out",
-                "Implement dynamic visual storytelling",
-                "Focus on human-centric imagery"
-            ],
-            "callToAction": [
-                "Create urgency without pressure",
-                "Use action-oriented language",
-                "Offer clear value exchange"
-            ],
-            "toneOfVoice": [
-                "Maintain professional yet approachable tone",
-                "Use conversational language",
-                "Build trust through authenticity"
-            ]
-        },
-        "implementationPlan": {
-            "immediateActions": [
-                "Audit current messaging strategy",
-                "Identify unique value propositions",
-                "Plan A/B testing framework"
-            ],
-            "shortTermGoals": [
-                "Develop differentiated messaging",
-                "Create new creative assets",
-                "Implement tracking mechanisms"
-            ],
-            "longTermStrategy": [
-                "Build brand differentiation",
-                "Establish market leadership",
-                "Create sustainable competitive advantage"
-            ],
-            "successMetrics": [
-                "Engagement rate improvement",
-                "Conversion rate optimization",
-                "Brand recognition growth"
-            ]
-        },
-        "competitiveAdvantage": {
-            "uniquePositioning": f"Differentiate from {common_strategy} approach with innovative messaging",
-            "differentiationStrategy": "Focus on unique value propositions and emotional storytelling",
-            "valueProposition": "Provide clear, compelling reasons to choose your brand",
-            "targetAudience": "Identify and target underserved audience segments"
-        }
-    }
+    return InsightsAggregator().extend(analysis).insights()
 
 def generate_mock_analysis(ad, index):
     """Generate mock analysis data for fallback"""
-    
-    # Analyze ad content for more realistic metrics
-    ad_text = ad.get('ad_creative_body', '').lower()
-    business_type = ad.get('business_type', '').lower()
-    category = ad.get('category', '').lower()
-    spend = ad.get('spend', 0)
-    impressions = ad.get('impressions', 0)
-    
-    # Base strategies based on content analysis
-    strategies = ['Emotional Storytelling', 'Social Proof', 'Urgency & Scarcity', 'Problem-Solution', 'Benefit-Driven', 'Exclusive Access', 'Limited Time Offer']
-    emotions = ['Excitement', 'Trust', 'Curiosity', 'Urgency', 'Joy', 'Relief', 'Confidence', 'Inspiration']
-    ctas = ['Shop Now', 'Learn More', 'Get Started', 'Try Free', 'Join Today', 'Download Now', 'Book Now', 'Sign Up']
-    value_props = ['Save 50% today only', 'Join 10,000+ satisfied customers', 'Transform your life in 30 days', 'Limited time offer', 'Exclusive access', 'Proven results']
-    hooks = ['What if you could...', 'Imagine having...', 'Don\'t miss out on...', 'Discover the secret...', 'Transform your...', 'Unlock the power of...']
-    hook_types = ['curiosity', 'urgency', 'social_proof', 'fear', 'benefit', 'story', 'exclusive']
-    triggers = ['Limited time', 'Exclusive access', 'Social proof', 'Personal benefit', 'Scarcity', 'Authority', 'Reciprocity']
-    phrases = ['amazing results', 'best value', 'limited time', 'exclusive offer', 'proven method', 'transform', 'discover', 'unlock']
-    
-    # Content-based strategy selection
-    if any(word in ad_text for word in ['limited', 'today only', 'offer', 'sale']):
-        strategy = 'Urgency & Scarcity'
-    elif any(word in ad_text for word in ['join', 'community', 'people', 'customers']):
-        strategy = 'Social Proof'
-    elif any(word in ad_text for word in ['transform', 'change', 'improve', 'better']):
-        strategy = 'Benefit-Driven'
-    elif any(word in ad_text for word in ['problem', 'struggle', 'difficult', 'challenge']):
-        strategy = 'Problem-Solution'
+    return heuristic_analyzer.analyze(ad, index)
+
+def run_analysis_job(payload, done, record):
+    """
+    Job handler: analyze payload["ads"] like /api/analyze-ads, recording each
+    ad's analysis as it completes, then (if payload["insights"]) generate
+    insights across all of them. Ads in done were finished by an earlier run.
+    """
+    ads = payload['ads']
+    mode = payload.get('mode', ANALYZE_MODE)
+    results = dict(done)
+
+    def store(i, result):
+        if result is None:
+            # Not analyzed (a deadline ran out on a call it shared): fall back like finish_analyses
+            logger.warning(f"Ad {i+1} of a job was not analyzed, using the heuristic fallback")
+            result = {**generate_mock_analysis(ads[i], i), "status": "fallback"}
+        results[i] = result
+        record(i, result)
+
+    todo = [i for i in range(len(ads)) if i not in done]
+    if mode == 'heuristic':
+        for i in todo:
+            store(i, heuristic_analyzer.analyze(ads[i], i))
+        calls = []
+    elif mode == 'batch':
+        refs, cached, batches = plan_analysis_batches(ads, max(1, int(payload.get('batch_size', ANALYZE_BATCH_SIZE))))
+        for i in todo:
+            if cached[i] is not None:
+                store(i, cached[i])
+        batches = [[i for i in batch if i not in done] for batch in batches]
+        calls = [lambda batch=batch: analyze_ad_batch(ads, batch, refs) for batch in batches if batch]
     else:
-        strategy = strategies[index % len(strategies)]
-    
-    # Performance metrics based on ad characteristics
-    base_engagement = 45
-    base_conversion = 25
-    base_virality = 35
-    
-    # Adjust based on business type
-    if 'e-commerce' in business_type:
-        base_engagement += 10
-        base_conversion += 15
-    elif 'technology' in business_type:
-        base_engagement += 15
-        base_virality += 20
-    elif 'health' in business_type or 'fitness' in business_type:
-        base_engagement += 8
-        base_conversion += 10
-    
-    # Adjust based on spend (higher spend often correlates with better targeting)
-    if spend > 10000:
-        base_engagement += 8
-        base_conversion += 12
-    elif spend > 5000:
-        base_engagement += 5
-        base_conversion += 8
+        calls = [lambda i=i: {i: analyze_single_ad(ads[i], i)} for i in todo]
+
+    if calls:
+        with ThreadPoolExecutor(max_workers=min(ANALYZE_MAX_WORKERS, len(calls))) as executor:
+            for future in as_completed([executor.submit(call) for call in calls]):
+                for i, result in future.result().items():
+                    store(i, result)
+
+    if not payload.get('insights'):
+        return {}
+    analysis = [results[i] for i in range(len(ads))]
+    if mode == 'heuristic' or not GEMINI_API_KEY:
+        return {"insights": generate_mock_insights(analysis)}
+    return {"insights": create_insights(analysis)}
+
+# Background analysis jobs: "memory" (in-process queue) or "sqlite" (JOB_DB_PATH, survives restarts)
+JOB_BACKEND = os.getenv('JOB_BACKEND', 'memory')
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', 'jobs.sqlite3')
+JOB_TTL_SECONDS = float(os.getenv('JOB_TTL_SECONDS', 86400))
+# A running SQLite job whose process sent no heartbeat for this long is taken over by another worker
+JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', 60))
+if JOB_BACKEND == 'sqlite':
+    job_backend = SQLiteJobBackend(
+        os.path.join(SERVER_DIR, JOB_DB_PATH), ttl=JOB_TTL_SECONDS, stale_seconds=JOB_STALE_SECONDS
+    )
+else:
+    job_backend = MemoryJobBackend(ttl=JOB_TTL_SECONDS)
+job_workers = JobWorkers(
+    job_backend, {"analyze-ads": run_analysis_job}, workers=max(1, int(os.getenv('JOB_WORKERS', 2)))
+)
+
+@app.route('/api/jobs', methods=['POST', 'OPTIONS'])
+def submit_job():
+    """Queue analysis of the given ads (and optionally insights) as a background job"""
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'ok'})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        response.headers.add('Access-Control-Allow-Methods', 'POST')
+        return response
     
-    # Add randomness but keep within realistic bounds
-    engagement = min(95, max(20, base_engagement + random.uniform(-10, 15)))
-    conversion = min(85, max(10, base_conversion + random.uniform(-8, 12)))
-    virality = min(90, max(15, base_virality + random.uniform(-12, 18)))
+    try:
+        data = request.json
+        if not data or not data.get('ads'):
+            return jsonify({"error": "No ads provided for analysis"}), 400
+        
+        mode = data.get('mode', ANALYZE_MODE)
+        if mode != 'heuristic' and not GEMINI_API_KEY:
+            return jsonify({"error": "Gemini API key not configured"}), 503
+        
+        payload = {
+            "ads": data['ads'],
+            "mode": mode,
+            "batch_size": data.get('batch_size', ANALYZE_BATCH_SIZE),
+            "insights": bool(data.get('insights', False)),
+        }
+        job_id = job_workers.submit("analyze-ads", payload, len(data['ads']))
+        logger.info(f"Queued job {job_id} for {len(data['ads'])} ads")
+        return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+        
+    except Exception as e:
+        logger.error(f"Error in submit_job endpoint: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress and the results so far of a background job"""
+    job = job_workers.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+# Returned when no Gemini API key is configured
+MOCK_CAMPAIGN_STRATEGY = {
+    "marketingStrategy": {
+        "primaryStrategy": "Mock Strategy: Focus on unique value proposition and emotional storytelling based on competitive insights",
+        "keyMessages": [
+            "Differentiate from competitors with innovative messaging",
+            "Leverage emotional appeal for deeper connections",
+            "Implement data-driven optimization strategies"
+        ],
+        "emotionalAppeal": "Create emotional journey from problem awareness to solution satisfaction",
+        "hookStrategy": "Use curiosity-driven hooks with social proof elements"
+    },
+    "creativeElements": {
+        "headline": "Transform Your [Industry] Experience Today",
+        "subheadline": "Discover the innovative approach that's changing everything",
+        "callToAction": "Get Started Now - Limited Time Offer"
+    }
+}
+
+def build_strategy_prompt(insights, campaign_data):
+    """Create a comprehensive prompt for Gemini"""
+    return f"""
+    As a marketing expert, analyze the following insights and campaign data to generate a comprehensive marketing strategy:
     
-    # Sentiment analysis based on content
-    positive_words = ['amazing', 'best', 'great', 'excellent', 'perfect', 'love', 'wonderful', 'fantastic']
-    negative_words = ['worst', 'terrible', 'awful', 'horrible', 'bad', 'hate', 'disappointing']
+    INSIGHTS DATA:
+    - Competitive Advantage: {insights.get('competitiveAdvantage', {}).get('uniquePositioning', 'Not specified')}
+    - Strategic Recommendations: {insights.get('strategicRecommendations', {}).get('marketingStrategy', [])}
+    - Creative Guidelines: {insights.get('creativeGuidelines', {})}
     
-    positive_count = sum(1 for word in positive_words if word in ad_text)
-    negative_count = sum(1 for word in negative_words if word in ad_text)
+    CAMPAIGN DATA:
+    - Platform: {campaign_data.get('platform', 'Not specified')}
+    - Objective: {campaign_data.get('objective', 'Not specified')}
+    - Target Audience: {campaign_data.get('targetAudience', 'Not specified')}
+    - Budget: ${campaign_data.get('budget', 0)}
     
-    if positive_count > negative_count:
-        sentiment = 'positive'
-        sentiment_score = 30 + random.uniform(20, 50)
-    elif negative_count > positive_count:
-        sentiment = 'negative'
-        sentiment_score = -30 - random.uniform(20, 50)
-    else:
-        sentiment = 'neutral'
-        sentiment_score = random.uniform(-20, 20)
+    Please provide:
+    1. Enhanced marketing strategy with specific tactics
+    2. Creative elements (headline, subheadline, call-to-action)
+    3. Emotional appeal strategy
+    4. Hook strategy for audience engagement
+    5. Key messaging points
     
+    Format the response as JSON with the following structure:
+    {{
+        "marketingStrategy": {{
+            "primaryStrategy": "detailed strategy description",
+            "keyMessages": ["message1", "message2", "message3"],
+            "emotionalAppeal": "emotional appeal strategy",
+            "hookStrategy": "hook strategy description"
+        }},
+        "creativeElements": {{
+            "headline": "compelling headline",
+            "subheadline": "supporting subheadline",
+            "callToAction": "strong call to action"
+        }}
+    }}
+    """
+
+def parse_strategy(generated_text):
+    """Strategy JSON from a Gemini reply, or the text wrapped in the strategy structure"""
+    # Find JSON content in the response
+    json_match = re.search(r'\{.*\}', generated_text, re.DOTALL)
+    if json_match:
+        try:
+            return json.loads(json_match.group())
+        except json.JSONDecodeError:
+            pass
+    # Fallback: return structured data based on the text
+    return generate_text_strategy(generated_text)
+
+def campaign_strategy_flow(insights, campaign_data):
+    """(response body, status) for a campaign strategy request"""
+    prompt = build_strategy_prompt(insights, campaign_data)
+    try:
+        if STRUCTURED_OUTPUT:
+            return (yield GenerateJson(prompt, STRATEGY_GENERATION_CONFIG, STRATEGY_SCHEMA)), 200
+        generated_text = yield Generate(prompt, STRATEGY_GENERATION_CONFIG)
+    except StructuredOutputError as e:
+        logger.warning(f"Malformed structured strategy: {e}")
+        return generate_text_strategy(e.text), 200
+    except LLMUnavailableError as e:
+        logger.warning(f"Skipping campaign strategy call: {e}")
+        return MOCK_CAMPAIGN_STRATEGY, 200
+    except LLMError as e:
+        logger.error(f"Gemini API error for campaign strategy: {e.status_code or e}")
+        return {"error": "Failed to generate strategy"}, 500
+
+    return parse_strategy(generated_text), 200
+
+def generate_text_strategy(generated_text):
+    """Wrap free-form strategy text in the strategy structure when no JSON was returned"""
     return {
-        "ad": ad,
         "marketingStrategy": {
-            "primaryStrategy": strategy,
-            "callToAction": ctas[index % len(ctas)],
-            "valueProposition": value_props[index % len(value_props)]
-        },
-        "emotionalAnalysis": {
-            "primaryEmotion": emotions[index % len(emotions)],
-            "emotionalScore": 60 + random.uniform(10, 35),
-            "emotionalTriggers": random.sample(triggers, 3)
+            "primaryStrategy": generated_text[:200] + "...",
+            "keyMessages": ["Generated from AI insights", "Optimized for your platform", "Data-driven approach"],
+            "emotionalAppeal": "Emotional appeal strategy generated from insights",
+            "hookStrategy": "Hook strategy based on competitive analysis"
         },
-        "sentimentAnalysis": {
-            "overallSentiment": sentiment,
-            "sentimentScore": sentiment_score,
-            "keyPhrases": random.sample(phrases, 3)
-        },
-        "hooks": {
-            "primaryHook": hooks[index % len(hooks)],
-            "hookType": hook_types[index % len(hook_types)],
-            "hookEffectiveness": 55 + random.uniform(10, 40)
-        },
-        "performanceMetrics": {
-            "estimatedEngagement": round(engagement, 1),
-            "conversionPotential": round(conversion, 1),
-            "viralityScore": round(virality, 1)
+        "creativeElements": {
+            "headline": "AI-Generated Compelling Headline",
+            "subheadline": "Supporting subheadline based on insights",
+            "callToAction": "Strong call to action from strategy"
         }
     }
 
 @app.route('/api/generate-campaign-strategy', methods=['POST', 'OPTIONS'])
+@with_priority(INTERACTIVE)
 def generate_campaign_strategy():
     """Generate marketing strategy using Gemini API"""
     if request.method == 'OPTIONS':
@@ -824,127 +1227,77 @@ def generate_campaign_strategy():
         if not GEMINI_API_KEY:
             # Provide mock response when API key is not configured
             logger.warning("Gemini API key not configured, providing mock response")
-            return jsonify({
-                "marketingStrategy": {
-                    "primaryStrategy": "Mock Strategy: Focus on unique value proposition and emotional storytelling based on competitive insights",
-                    "keyMessages": [
-                        "Differentiate from competitors with innovative messaging",
-                        "Leverage emotional appeal for deeper connections",
-                        "Implement data-driven optimization strategies"
-                    ],
-                    "emotionalAppeal": "Create emotional journey from problem awareness to solution satisfaction",
-                    "hookStrategy": "Use curiosity-driven hooks with social proof elements"
-                },
-                "creativeElements": {
-                    "headline": "Transform Your [Industry] Experience Today",
-                    "subheadline": "Discover the innovative approach that's changing everything",
-                    "callToAction": "Get Started Now - Limited Time Offer"
-                }
-            })
-        
-        # Create a comprehensive prompt for Gemini
-        prompt = f"""
-        As a marketing expert, analyze the following insights and campaign data to generate a comprehensive marketing strategy:
-        
-        INSIGHTS DATA:
-        - Competitive Advantage: {insights.get('competitiveAdvantage', {}).get('uniquePositioning', 'Not specified')}
-        - Strategic Recommendations: {insights.get('strategicRecommendations', {}).get('marketingStrategy', [])}
-        - Creative Guidelines: {insights.get('creativeGuidelines', {})}
-        
-        CAMPAIGN DATA:
-        - Platform: {campaign_data.get('platform', 'Not specified')}
-        - Objective: {campaign_data.get('objective', 'Not specified')}
-        - Target Audience: {campaign_data.get('targetAudience', 'Not specified')}
-        - Budget: ${campaign_data.get('budget', 0)}
+            return jsonify(MOCK_CAMPAIGN_STRATEGY)
         
-        Please provide:
-        1. Enhanced marketing strategy with specific tactics
-        2. Creative elements (headline, subheadline, call-to-action)
-        3. Emotional appeal strategy
-        4. Hook strategy for audience engagement
-        5. Key messaging points
-        
-        Format the response as JSON with the following structure:
-        {{
-            "marketingStrategy": {{
-                "primaryStrategy": "detailed strategy description",
-                "keyMessages": ["message1", "message2", "message3"],
-                "emotionalAppeal": "emotional appeal strategy",
-                "hookStrategy": "hook strategy description"
-            }},
-            "creativeElements": {{
-                "headline": "compelling headline",
-                "subheadline": "supporting subheadline",
-                "callToAction": "strong call to action"
-            }}
-        }}
-        """
-        
-        # Call Gemini API
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
-        headers = {"Content-Type": "application/json"}
-        
-        data = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topP": 0.9,
-                "topK": 40,
-                "maxOutputTokens": 1500
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=data)
-        
-        if response.status_code == 200:
-            result = response.json()
-            generated_text = result['candidates'][0]['content']['parts'][0]['text']
-            
-            # Try to extract JSON from the response
-            try:
-                # Find JSON content in the response
-                import re
-                json_match = re.search(r'\{.*\}', generated_text, re.DOTALL)
-                if json_match:
-                    strategy_data = json.loads(json_match.group())
-                    return jsonify(strategy_data)
-                else:
-                    # Fallback: return structured data based on the text
-                    return jsonify({
-                        "marketingStrategy": {
-                            "primaryStrategy": generated_text[:200] + "...",
-                            "keyMessages": ["Generated from AI insights", "Optimized for your platform", "Data-driven approach"],
-                            "emotionalAppeal": "Emotional appeal strategy generated from insights",
-                            "hookStrategy": "Hook strategy based on competitive analysis"
-                        },
-                        "creativeElements": {
-                            "headline": "AI-Generated Compelling Headline",
-                            "subheadline": "Supporting subheadline based on insights",
-                            "callToAction": "Strong call to action from strategy"
-                        }
-                    })
-            except json.JSONDecodeError:
-                # Fallback response
-                return jsonify({
-                    "marketingStrategy": {
-                        "primaryStrategy": generated_text[:200] + "...",
-                        "keyMessages": ["Generated from AI insights", "Optimized for your platform", "Data-driven approach"],
-                        "emotionalAppeal": "Emotional appeal strategy generated from insights",
-                        "hookStrategy": "Hook strategy based on competitive analysis"
-                        },
-                    "creativeElements": {
-                        "headline": "AI-Generated Compelling Headline",
-                        "subheadline": "Supporting subheadline based on insights",
-                        "callToAction": "Strong call to action from strategy"
-                    }
-                })
-        else:
-            return jsonify({"error": "Failed to generate strategy"}), 500
+        body, status = run_gemini_flow(campaign_strategy_flow(insights, campaign_data))
+        return jsonify(body), status
             
     except Exception as e:
         logger.error(f"Error generating campaign strategy: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Returned when no OpenAI API key is configured
+MOCK_CAMPAIGN_IMAGE = {
+    "imageUrl": "https://picsum.photos/1024/1024?random=1",
+    "prompt": "Mock DALL-E prompt - professional marketing campaign visual",
+    "note": "This is a placeholder image from Picsum. Set OPENAI_API_KEY to generate real AI images."
+}
+
+# Returned while the OpenAI circuit breaker is open
+MOCK_CAMPAIGN_IMAGE_UNAVAILABLE = {
+    **MOCK_CAMPAIGN_IMAGE,
+    "note": "This is a placeholder image from Picsum. Image generation is temporarily unavailable, please retry shortly."
+}
+
+IMAGE_GENERATION_PARAMS = {"model": "dall-e-3", "n": 1, "size": "1024x1024", "quality": "standard", "style": "natural"}
+
+# Generated images are downloaded into this content-addressed store and served from /api/assets ('' = link OpenAI's URL)
+IMAGE_STORE_PATH = os.getenv('IMAGE_STORE_PATH', 'image_assets')
+IMAGE_THUMBNAIL_SIZES = [int(size) for size in os.getenv('IMAGE_THUMBNAIL_SIZES', '256,512').split(',') if size.strip()]
+IMAGE_ASSET_MAX_AGE = int(os.getenv('IMAGE_ASSET_MAX_AGE', 31536000))
+image_store = ImageAssetStore(
+    os.path.join(SERVER_DIR, IMAGE_STORE_PATH), IMAGE_THUMBNAIL_SIZES
+) if IMAGE_STORE_PATH else None
+
+def image_asset_response(image, prompt, cached):
+    """Campaign image response pointing at our own copy of the image and its thumbnails"""
+    return {
+        "imageUrl": f"/api/assets/{image.name}",
+        "thumbnails": {str(size): f"/api/assets/{image.thumbnail_name(size)}" for size in image.thumbnails},
+        "assetId": image.digest,
+        "prompt": prompt,
+        "cached": cached
+    }
+
+def store_generated_image(key, image_url):
+    """Download a DALL-E image into the asset store; None (keep OpenAI's URL) if that fails"""
+    try:
+        return image_store.save_from_url(key, image_url)
+    except Exception as e:
+        logger.warning(f"Could not store generated image, linking OpenAI's URL: {e}")
+        return None
+
+def build_image_prompt(campaign):
+    """Create a detailed prompt for DALL-E"""
+    return f"""
+    Create a professional marketing campaign visual for:
+    
+    Platform: {campaign.get('platform', 'social media')}
+    Objective: {campaign.get('objective', 'brand awareness')}
+    Headline: {campaign.get('creativeElements', {}).get('headline', 'Compelling headline')}
+    Visual Style: {campaign.get('creativeElements', {}).get('visualStyle', 'modern and professional')}
+    Tone: {campaign.get('creativeElements', {}).get('toneOfVoice', 'professional and engaging')}
+    
+    The image should be:
+    - High quality and professional
+    - Suitable for {campaign.get('platform', 'social media')} advertising
+    - Visually appealing and modern
+    - Include space for text overlay
+    - Match the {campaign.get('creativeElements', {}).get('visualStyle', 'modern')} style
+    
+    Style: Digital art, marketing design, professional advertising, clean and modern
+    """
+
 @app.route('/api/generate-campaign-image', methods=['POST', 'OPTIONS'])
 def generate_campaign_image():
     """Generate campaign image using DALL-E API"""
@@ -965,69 +1318,61 @@ def generate_campaign_image():
         if not openai_api_key:
             # Provide mock response when API key is not configured
             logger.warning("OpenAI API key not configured, providing mock image URL")
-            return jsonify({
-                "imageUrl": "https://picsum.photos/1024/1024?random=1",
-                "prompt": "Mock DALL-E prompt - professional marketing campaign visual",
-                "note": "This is a placeholder image from Picsum. Set OPENAI_API_KEY to generate real AI images."
-            })
+            return jsonify(MOCK_CAMPAIGN_IMAGE)
         
-        # Create a detailed prompt for DALL-E
-        prompt = f"""
-        Create a professional marketing campaign visual for:
-        
-        Platform: {campaign.get('platform', 'social media')}
-        Objective: {campaign.get('objective', 'brand awareness')}
-        Headline: {campaign.get('creativeElements', {}).get('headline', 'Compelling headline')}
-        Visual Style: {campaign.get('creativeElements', {}).get('visualStyle', 'modern and professional')}
-        Tone: {campaign.get('creativeElements', {}).get('toneOfVoice', 'professional and engaging')}
-        
-        The image should be:
-        - High quality and professional
-        - Suitable for {campaign.get('platform', 'social media')} advertising
-        - Visually appealing and modern
-        - Include space for text overlay
-        - Match the {campaign.get('creativeElements', {}).get('visualStyle', 'modern')} style
-        
-        Style: Digital art, marketing design, professional advertising, clean and modern
-        """
+        prompt = build_image_prompt(campaign)
+        key = image_prompt_key(prompt, IMAGE_GENERATION_PARAMS)
+        stored = image_store.lookup(key) if image_store else None
+        if stored is not None:
+            # Same prompt and parameters as an earlier image: no DALL-E call
+            return jsonify(image_asset_response(stored, prompt, cached=True))
         
         # Call OpenAI DALL-E API
-        url = "https://api.openai.com/v1/images/generations"
-        headers = {
-            "Authorization": f"Bearer {openai_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "dall-e-3",
-            "prompt": prompt,
-            "n": 1,
-            "size": "1024x1024",
-            "quality": "standard",
-            "style": "natural"
-        }
+        try:
+            result = get_openai_client(openai_api_key).generate_image(prompt, **IMAGE_GENERATION_PARAMS)
+        except LLMUnavailableError as e:
+            logger.warning(f"Skipping DALL-E call: {e}")
+            return jsonify(MOCK_CAMPAIGN_IMAGE_UNAVAILABLE)
+        except LLMError as e:
+            logger.error(f"DALL-E API error: {e.body or e}")
+            return jsonify({"error": "Failed to generate image"}), 500
         
-        response = requests.post(url, headers=headers, json=data)
+        image_url = result['data'][0]['url']
+        stored = store_generated_image(key, image_url) if image_store else None
+        if stored is not None:
+            return jsonify(image_asset_response(stored, prompt, cached=False))
         
-        if response.status_code == 200:
-            result = response.json()
-            image_url = result['data'][0]['url']
-            
-            return jsonify({
-                "imageUrl": image_url,
-                "prompt": prompt
-            })
-        else:
-            logger.error(f"DALL-E API error: {response.text}")
-            return jsonify({"error": "Failed to generate image"}), 500
+        return jsonify({
+            "imageUrl": image_url,
+            "prompt": prompt
+        })
             
     except Exception as e:
         logger.error(f"Error generating campaign image: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-# Start server
+@app.route('/api/assets/<name>', methods=['GET'])
+def get_asset(name):
+    """Serve a stored campaign image or thumbnail, with ETag and Range support"""
+    path = image_store.path(name) if image_store else None
+    if path is None:
+        return jsonify({"error": "Asset not found"}), 404
+    # Names are content hashes, so the bytes behind a URL never change
+    response = send_file(
+        path, mimetype=MEDIA_TYPES[ASSET_NAME.match(name).group(3)],
+        conditional=True, etag=name.rsplit('.', 1)[0], max_age=IMAGE_ASSET_MAX_AGE
+    )
+    response.cache_control.immutable = True
+    return response
+
+# Start server: the async production server by default, Flask's dev server with SERVER_MODE=dev
 if __name__ == '__main__':
-    logger.info("Starting server...")
-    port = int(os.environ.get('PORT', 5001))
-    logger.info(f"Starting server on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=False)
+    if os.getenv('SERVER_MODE', 'async') == 'dev':
+        port = int(os.environ.get('PORT', 5001))
+        logger.info(f"Starting development server on port {port}")
+        job_workers.start()
+        app.run(host='0.0.0.0', port=port, debug=False)
+    else:
+        import serve
+        logger.info(f"Starting async server on port {serve.PORT} with {serve.WEB_CONCURRENCY} worker(s)")
+        serve.main()
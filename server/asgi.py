@@ -0,0 +1,347 @@
+"""
+ASGI application for production serving.
+
+The LLM-bound endpoints (chat, analyze, insights, strategy and image) are
+served here by async handlers that await Gemini/OpenAI on a shared
+httpx.AsyncClient, so an in-flight model call holds no thread. They run the
+same llm_flow flows as the Flask views, so only request parsing and the
+fan-out differ; blocking work (cache, image store) runs in worker threads.
+Every other route is served by the Flask app, mounted underneath through a
+WSGI bridge.
+
+Run through serve.py (or `uvicorn asgi:app` from this directory).
+"""
+
+import asyncio
+import os
+import time
+import logging
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app, GEMINI_API_KEY, ANALYZE_MAX_WORKERS, ANALYZE_MODE, ANALYZE_BATCH_SIZE,
+    ANALYZE_DEADLINE_SECONDS, ANALYZE_ON_DEADLINE, finish_analyses,
+    wants_ndjson, ndjson_line, stream_finished_analyses, stream_unfinished_analyses,
+    CHAT_GENERATION_CONFIG, MOCK_CAMPAIGN_STRATEGY, MOCK_CAMPAIGN_IMAGE, MOCK_CAMPAIGN_IMAGE_UNAVAILABLE,
+    IMAGE_GENERATION_PARAMS, chat_flow, prepare_chat, record_chat_turn, sse_event, stream_summary,
+    analyze_single_ad_flow, analyze_ad_batch_flow, plan_analysis_batches, heuristic_analyzer,
+    create_insights_flow, campaign_strategy_flow, build_image_prompt,
+    image_store, image_asset_response, store_generated_image, job_workers,
+)
+from image_store import image_prompt_key
+from llm_flow import run_flow_async
+from rate_limiter import CHAT, INTERACTIVE, with_priority
+from deadline import DEADLINE_HEADER, Deadline, deadline_scope
+from llm_client import LLMError, LLMUnavailableError, get_async_gemini_client, get_async_openai_client, close_async_clients
+
+logger = logging.getLogger(__name__)
+
+# Threads available to the mounted Flask routes
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', 32))
+
+
+async def run_gemini_flow(flow, semaphore=None):
+    """Async counterpart of app.run_gemini_flow; semaphore, if given, bounds the flow's concurrent Gemini calls"""
+    return await run_flow_async(flow, get_async_gemini_client(GEMINI_API_KEY), semaphore)
+
+
+async def read_json(request):
+    """Request body as JSON, or None if it is missing or malformed"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@with_priority(CHAT)
+async def chat(request):
+    try:
+        data = await read_json(request)
+        if not data or 'question' not in data:
+            return JSONResponse({"error": "Missing question parameter"}, status_code=400)
+
+        question = data['question']
+        logger.info(f"Received question: {question}")
+
+        if not GEMINI_API_KEY:
+            return JSONResponse({
+                "answer": "Gemini API key is not configured. Please check server logs and ensure GEMINI_APIKEY is set in the .env file."
+            })
+
+        return JSONResponse(await run_gemini_flow(chat_flow(data)))
+
+    except Exception as e:
+        logger.error(f"Error in chat endpoint: {e}")
+        return JSONResponse({"error": "Internal server error"}, status_code=500)
+
+
+@with_priority(CHAT)
+async def chat_stream(request):
+    """Stream the chat answer as Server-Sent Events: token*, then done (or error)"""
+    data = await read_json(request)
+    if not data or 'question' not in data:
+        return JSONResponse({"error": "Missing question parameter"}, status_code=400)
+
+    question = data['question']
+    logger.info(f"Received streaming question: {question}")
+
+    if not GEMINI_API_KEY:
+        return JSONResponse({"error": "Gemini API key not configured"}, status_code=503)
+
+    full_prompt, session = prepare_chat(data)
+
+    async def generate():
+        started = time.perf_counter()
+        first_token_ms = None
+        parts = []
+        try:
+            async for text in get_async_gemini_client(GEMINI_API_KEY).stream_text(full_prompt, CHAT_GENERATION_CONFIG, CHAT):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except LLMError as e:
+            logger.error(f"Gemini streaming error: {e.status_code or e}")
+            yield sse_event("error", {"error": "Failed to generate response", "status": e.status_code})
+            return
+        record_chat_turn(session, question, "".join(parts))
+        yield sse_event("done", stream_summary(started, first_token_ms, parts, session))
+
+    return StreamingResponse(
+        generate(), media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def gather_until_deadline(coros, deadline):
+    """Async counterpart of app.run_until_deadline; coroutines unfinished at the deadline are cancelled"""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    if not tasks:
+        return []
+    done, pending = await asyncio.wait(tasks, timeout=None if deadline is None else deadline.remaining())
+    for task in pending:
+        task.cancel()
+    return [task.result() if task in done else None for task in tasks]
+
+
+async def single_analysis(ad, index, semaphore):
+    return {index: await run_gemini_flow(analyze_single_ad_flow(ad, index), semaphore)}
+
+
+async def stream_analyses(ads, mode, batch_size, deadline, on_deadline, semaphore):
+    """Async counterpart of app.stream_analyses; tasks unfinished at the deadline are cancelled"""
+    results = [None] * len(ads)
+    if mode == 'batch':
+        # Cache lookups are SQLite reads, kept off the event loop
+        refs, results, batches = await asyncio.to_thread(plan_analysis_batches, ads, batch_size)
+    # Tasks created in the scope carry the deadline to every Gemini call
+    with deadline_scope(deadline):
+        if mode == 'batch':
+            pending = {
+                asyncio.ensure_future(run_gemini_flow(analyze_ad_batch_flow(ads, batch, refs), semaphore))
+                for batch in batches
+            }
+        else:
+            pending = {asyncio.ensure_future(single_analysis(ad, i, semaphore)) for i, ad in enumerate(ads)}
+    try:
+        for i, result in enumerate(results):
+            if result is not None:
+                yield ndjson_line({"index": i, "analysis": result})
+        while pending:
+            timeout = None if deadline is None else deadline.remaining()
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                for i, result in task.result().items():
+                    if result is not None:
+                        results[i] = result
+                        yield ndjson_line({"index": i, "analysis": result})
+    finally:
+        # Deadline reached or client gone
+        for task in pending:
+            task.cancel()
+
+    for line in stream_unfinished_analyses(ads, results, on_deadline):
+        yield line
+
+
+def ndjson_response(lines):
+    return StreamingResponse(
+        lines, media_type='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def analyze_ads(request):
+    """Analyze selected ads using AI"""
+    try:
+        data = await read_json(request)
+        if not data or 'ads' not in data:
+            return JSONResponse({"error": "Missing ads parameter"}, status_code=400)
+
+        ads = data['ads']
+        if not ads or len(ads) == 0:
+            return JSONResponse({"error": "No ads provided for analysis"}, status_code=400)
+
+        logger.info(f"Analyzing {len(ads)} ads")
+
+        mode = data.get('mode', ANALYZE_MODE)
+        stream = wants_ndjson(data, request.headers.get('accept'))
+        if mode == 'heuristic':
+            analyses = heuristic_analyzer.analyze_batch(ads)
+            if stream:
+                return ndjson_response(stream_finished_analyses(analyses))
+            return JSONResponse(analyses)
+
+        if not GEMINI_API_KEY:
+            return JSONResponse({"error": "Gemini API key not configured"}, status_code=503)
+
+        # Same per-request concurrency bound as the threaded path, without the threads
+        semaphore = asyncio.Semaphore(ANALYZE_MAX_WORKERS)
+        deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER), ANALYZE_DEADLINE_SECONDS)
+        on_deadline = data.get('on_deadline', ANALYZE_ON_DEADLINE)
+        batch_size = max(1, int(data.get('batch_size', ANALYZE_BATCH_SIZE)))
+        if stream:
+            return ndjson_response(stream_analyses(ads, mode, batch_size, deadline, on_deadline, semaphore))
+
+        # Tasks created in the scope carry the deadline to every Gemini call
+        with deadline_scope(deadline):
+            if mode == 'batch':
+                refs, results, batches = await asyncio.to_thread(plan_analysis_batches, ads, batch_size)
+                batch_results = await gather_until_deadline(
+                    (run_gemini_flow(analyze_ad_batch_flow(ads, batch, refs), semaphore) for batch in batches), deadline
+                )
+                for batch, batch_result in zip(batches, batch_results):
+                    for i in batch:
+                        results[i] = (batch_result or {}).get(i)
+            else:
+                results = await gather_until_deadline(
+                    (run_gemini_flow(analyze_single_ad_flow(ad, i), semaphore) for i, ad in enumerate(ads)), deadline
+                )
+
+        return JSONResponse(finish_analyses(ads, results, on_deadline))
+
+    except Exception as e:
+        logger.error(f"Error in analyze_ads endpoint: {e}")
+        return JSONResponse({"error": "Internal server error"}, status_code=500)
+
+
+@with_priority(INTERACTIVE)
+async def generate_insights(request):
+    """Generate smart insights based on competitor ad analysis"""
+    try:
+        data = await read_json(request)
+        if not data or 'analysis' not in data:
+            return JSONResponse({"error": "Missing analysis parameter"}, status_code=400)
+
+        analysis = data['analysis']
+        if not analysis or len(analysis) == 0:
+            return JSONResponse({"error": "No analysis provided for insights"}, status_code=400)
+
+        logger.info(f"Generating insights from {len(analysis)} ad analyses")
+
+        if not GEMINI_API_KEY:
+            return JSONResponse({"error": "Gemini API key not configured"}, status_code=503)
+
+        # Same concurrency bound for the map-reduce calls as the threaded path
+        semaphore = asyncio.Semaphore(ANALYZE_MAX_WORKERS)
+        return JSONResponse(await run_gemini_flow(create_insights_flow(analysis), semaphore))
+
+    except Exception as e:
+        logger.error(f"Error in generate_insights endpoint: {e}")
+        return JSONResponse({"error": "Internal server error"}, status_code=500)
+
+
+@with_priority(INTERACTIVE)
+async def generate_campaign_strategy(request):
+    """Generate marketing strategy using Gemini API"""
+    try:
+        data = await read_json(request) or {}
+        insights = data.get('insights', {})
+        campaign_data = data.get('campaignData', {})
+
+        if not GEMINI_API_KEY:
+            logger.warning("Gemini API key not configured, providing mock response")
+            return JSONResponse(MOCK_CAMPAIGN_STRATEGY)
+
+        body, status = await run_gemini_flow(campaign_strategy_flow(insights, campaign_data))
+        return JSONResponse(body, status_code=status)
+
+    except Exception as e:
+        logger.error(f"Error generating campaign strategy: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def generate_campaign_image(request):
+    """Generate campaign image using DALL-E API"""
+    try:
+        data = await read_json(request) or {}
+        campaign = data.get('campaign', {})
+
+        openai_api_key = os.getenv('OPENAI_API_KEY')
+        if not openai_api_key:
+            logger.warning("OpenAI API key not configured, providing mock image URL")
+            return JSONResponse(MOCK_CAMPAIGN_IMAGE)
+
+        prompt = build_image_prompt(campaign)
+        key = image_prompt_key(prompt, IMAGE_GENERATION_PARAMS)
+        stored = await asyncio.to_thread(image_store.lookup, key) if image_store else None
+        if stored is not None:
+            return JSONResponse(image_asset_response(stored, prompt, cached=True))
+
+        try:
+            result = await get_async_openai_client(openai_api_key).generate_image(prompt, **IMAGE_GENERATION_PARAMS)
+        except LLMUnavailableError as e:
+            logger.warning(f"Skipping DALL-E call: {e}")
+            return JSONResponse(MOCK_CAMPAIGN_IMAGE_UNAVAILABLE)
+        except LLMError as e:
+            logger.error(f"DALL-E API error: {e.body or e}")
+            return JSONResponse({"error": "Failed to generate image"}, status_code=500)
+
+        # Download, hashing and thumbnails are blocking work, kept off the event loop
+        image_url = result['data'][0]['url']
+        stored = await asyncio.to_thread(store_generated_image, key, image_url) if image_store else None
+        if stored is not None:
+            return JSONResponse(image_asset_response(stored, prompt, cached=False))
+
+        return JSONResponse({
+            "imageUrl": image_url,
+            "prompt": prompt
+        })
+
+    except Exception as e:
+        logger.error(f"Error generating campaign image: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    # Queued jobs (including ones persisted by a previous run) start without waiting for a request
+    job_workers.start()
+    yield
+    await close_async_clients()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/chat', chat, methods=['POST']),
+        Route('/api/chat/stream', chat_stream, methods=['POST']),
+        Route('/api/analyze-ads', analyze_ads, methods=['POST']),
+        Route('/api/generate-insights', generate_insights, methods=['POST']),
+        Route('/api/generate-campaign-strategy', generate_campaign_strategy, methods=['POST']),
+        Route('/api/generate-campaign-image', generate_campaign_image, methods=['POST']),
+        # Everything else (ads, filters, health, stats) stays on Flask
+        Mount('/', WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ],
+    # Preflight and CORS headers for the async routes; Flask-CORS still covers the mounted app
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
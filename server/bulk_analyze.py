@@ -0,0 +1,244 @@
+"""
+Offline bulk analysis of the ad corpus.
+
+Streams ads from the in-memory store (or a JSONL file), runs the same Gemini
+analysis as /api/analyze-ads on a thread pool at BULK priority through the
+shared Gemini rate limiter (--rpm, if given, replaces its request quota),
+and appends each result to a JSONL or SQLite output as soon as it is ready.
+Ads already present in the output are skipped, so rerunning the same
+command after a crash resumes where it stopped. Results also land in the
+analysis cache, so the API serves them without a Gemini call.
+
+    python bulk_analyze.py --output analyses.jsonl --workers 8 --rpm 300
+    python bulk_analyze.py --input ads.jsonl --output analyses.sqlite3
+
+Failed ads are counted and logged but not written, so the next run retries them.
+Input lines that are not JSON ads with an id are logged and skipped.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, Set
+
+from app import GEMINI_API_KEY, request_analysis
+from llm_client import LLMError, gemini_rate_limiter
+from mock_ads_data import count_ads, iter_ads
+from rate_limiter import BULK, with_priority
+from structured_output import StructuredOutputError
+
+logger = logging.getLogger("bulk_analyze")
+
+
+class JSONLOutput:
+    """Append-only JSONL results; each line is flushed to disk as it is written"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def done_ids(self) -> Set[str]:
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    # Ids are compared as strings, whatever their JSON type
+                    done.add(str(json.loads(line)["id"]))
+                except (ValueError, KeyError):
+                    # A line cut short by a crash; its ad is analyzed again
+                    continue
+        return done
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+class SQLiteOutput:
+    """Results table keyed by ad id; each row is committed as it is written"""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS bulk_analysis ("
+            "id TEXT PRIMARY KEY, analysis TEXT NOT NULL, analyzed_at TEXT NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def done_ids(self) -> Set[str]:
+        return {str(row[0]) for row in self._db.execute("SELECT id FROM bulk_analysis")}
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO bulk_analysis (id, analysis, analyzed_at) VALUES (?, ?, ?)",
+                (record["id"], json.dumps(record["analysis"], ensure_ascii=False), record["analyzed_at"]),
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def open_output(path: str):
+    if path.endswith((".sqlite", ".sqlite3", ".db")):
+        return SQLiteOutput(path)
+    return JSONLOutput(path)
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    ad = json.loads(line)
+                except ValueError as e:
+                    logger.error(f"Skipping malformed input line {line_number}: {e}")
+                    continue
+                if not isinstance(ad, dict) or ad.get("id") is None:
+                    logger.error(f"Skipping input line {line_number}: not an ad with an id")
+                    continue
+                yield ad
+
+
+class Progress:
+    """Thread-safe counters with periodic throughput and failure-rate reports"""
+
+    def __init__(self, total: Optional[int], report_every: float):
+        self.total = total
+        self.report_every = report_every
+        self.started = time.monotonic()
+        self._last_report = self.started
+        self._lock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            now = time.monotonic()
+            if now - self._last_report >= self.report_every:
+                self._last_report = now
+                logger.info(self.summary())
+
+    def summary(self) -> str:
+        processed = self.succeeded + self.failed
+        minutes = max(time.monotonic() - self.started, 1e-9) / 60
+        failure_rate = self.failed / processed if processed else 0.0
+        remaining = f"/{self.total - self.skipped}" if self.total is not None else ""
+        return (
+            f"{processed}{remaining} processed, {self.succeeded} ok, {self.failed} failed "
+            f"({failure_rate:.1%}), {self.skipped} skipped, {processed / minutes:.1f} ads/min"
+        )
+
+
+@with_priority(BULK)
+def analyze_one(ad: Dict[str, Any]) -> Dict[str, Any]:
+    # Waits for quota in the shared limiter, behind any chat or interactive calls
+    result = request_analysis(ad)
+    result.pop("ad", None)
+    return {
+        "id": ad["id"],
+        "analysis": result,
+        "analyzed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def run(args: argparse.Namespace) -> int:
+    output = open_output(args.output)
+    done = output.done_ids()
+    if done:
+        logger.info(f"Resuming: {len(done)} ads already in {args.output}")
+
+    ads = read_jsonl(args.input) if args.input else iter_ads()
+    progress = Progress(None if args.input else count_ads(), args.report_every)
+    if args.rpm is not None:
+        gemini_rate_limiter.set_limits(requests_per_minute=args.rpm)
+    max_in_flight = args.workers * 2
+    submitted = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            pending = {}
+            for ad in ads:
+                if args.limit and submitted >= args.limit:
+                    break
+                if str(ad.get("id")) in done:
+                    progress.skipped += 1
+                    continue
+                # Keep only a bounded window in flight so the corpus is streamed, not loaded
+                while len(pending) >= max_in_flight:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        collect(future, pending.pop(future), output, progress)
+                pending[executor.submit(analyze_one, ad)] = ad
+                submitted += 1
+            for future in list(pending):
+                collect(future, pending.pop(future), output, progress)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; rerun the same command to resume")
+        return 130
+    finally:
+        output.close()
+        logger.info(f"Finished: {progress.summary()}")
+    return 1 if progress.failed else 0
+
+
+def collect(future, ad: Dict[str, Any], output, progress: Progress) -> None:
+    try:
+        record = future.result()
+    except (LLMError, StructuredOutputError) as e:
+        logger.error(f"Analysis failed for ad {ad.get('id')}: {e}")
+        progress.record(False)
+        return
+    except Exception as e:
+        logger.error(f"Error analyzing ad {ad.get('id')}: {e}")
+        progress.record(False)
+        return
+    output.write(record)
+    progress.record(True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-analyze the ad corpus with Gemini, resumably.")
+    parser.add_argument("--input", help="JSONL file of ads (default: the built-in ads store)")
+    parser.add_argument("--output", required=True, help="results file: .jsonl, or .sqlite3/.sqlite/.db for SQLite")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ANALYZE_MAX_WORKERS", 8)), help="concurrent Gemini requests")
+    parser.add_argument(
+        "--rpm", type=float, default=float(os.environ["BULK_ANALYZE_RPM"]) if os.getenv("BULK_ANALYZE_RPM") else None,
+        help="max requests started per minute (0 = unlimited; default: LLM_RATE_LIMIT_RPM)",
+    )
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many new ads (0 = all)")
+    parser.add_argument("--report-every", type=float, default=30, help="seconds between progress reports")
+    args = parser.parse_args(argv)
+
+    if not GEMINI_API_KEY:
+        logger.error("GEMINI_APIKEY is not set")
+        return 2
+    return run(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,156 @@
+"""
+Server-side chat sessions.
+
+A session keeps the rolling conversation as already-rendered prompt lines,
+the merged user context and its rendered prompt block, so a client only has
+to send its session id and the new question. Sessions are evicted least
+recently used first, when idle for longer than the TTL, and whenever the
+estimated memory of all sessions exceeds the global cap.
+
+Only the user context keys the prompt renders are kept, with long strings
+and lists clipped, so a client cannot park arbitrary data in a session.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class ChatSession:
+    """Rolling history and user context of one conversation"""
+
+    __slots__ = ("session_id", "lines", "user_context", "context_info", "last_used", "size")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.lines: List[str] = []
+        self.user_context: Dict[str, Any] = {}
+        self.context_info = ""
+        self.last_used = time.monotonic()
+        self.size = 0
+
+    def measure(self) -> int:
+        """Approximate bytes held by the session's strings and user context"""
+        context = len(json.dumps(self.user_context, default=str)) if self.user_context else 0
+        return len(self.session_id) + len(self.context_info) + context + sum(len(line) for line in self.lines) + 256
+
+
+def clip_value(value: Any, max_chars: int, max_items: int) -> Any:
+    """A user context value cut down to at most max_chars per string and max_items per list"""
+    if isinstance(value, (bool, int, float)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [str(item)[:max_chars] for item in value[:max_items]]
+    return str(value)[:max_chars]
+
+
+class ChatSessionStore:
+    """LRU/idle-TTL session map with a global memory cap"""
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        idle_ttl: float = 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_lines: int = 6,
+        context_keys: Optional[Iterable[str]] = None,
+        max_context_chars: int = 500,
+        max_context_items: int = 20,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        # None keeps every key (still clipped)
+        self.context_keys = None if context_keys is None else frozenset(context_keys)
+        self.max_context_chars = max_context_chars
+        self.max_context_items = max_context_items
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.created = 0
+        self.resumed = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def get_or_create(self, session_id: Optional[str] = None) -> ChatSession:
+        """The live session with this id, or a new session (with a fresh id) if there is none"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_used = now
+                self.resumed += 1
+                return session
+
+            session = ChatSession(uuid.uuid4().hex)
+            self._sessions[session.session_id] = session
+            self.created += 1
+            self._resize(session)
+            return session
+
+    def update_context(self, session: ChatSession, user_context: Dict[str, Any], render: Callable[[Dict[str, Any]], str]) -> None:
+        """Merge the kept keys of user_context into the session's and re-render its prompt block if anything changed"""
+        cleaned = {
+            key: clip_value(value, self.max_context_chars, self.max_context_items)
+            for key, value in user_context.items()
+            if self.context_keys is None or key in self.context_keys
+        }
+        with self._lock:
+            merged = {**session.user_context, **cleaned}
+            if merged == session.user_context:
+                return
+            session.user_context = merged
+            session.context_info = render(merged)
+            self._resize(session)
+
+    def append(self, session: ChatSession, *lines: str) -> None:
+        """Add rendered history lines, keeping only the most recent max_lines"""
+        with self._lock:
+            session.lines.extend(lines)
+            del session.lines[:-self.max_lines]
+            session.last_used = time.monotonic()
+            if session.session_id in self._sessions:
+                self._sessions.move_to_end(session.session_id)
+            self._resize(session)
+
+    def _resize(self, session: ChatSession) -> None:
+        if session.session_id in self._sessions:
+            size = session.measure()
+            self.total_bytes += size - session.size
+            session.size = size
+        while self._sessions and (len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes):
+            _, evicted = self._sessions.popitem(last=False)
+            self.total_bytes -= evicted.size
+            self.evicted += 1
+
+    def _expire(self, now: float) -> None:
+        # Least recently used first, so the idle sessions are all at the front
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used < self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.total_bytes -= session.size
+            self.expired += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Session counts, memory use and eviction counters"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_seconds": self.idle_ttl,
+                "created": self.created,
+                "resumed": self.resumed,
+                "evicted": self.evicted,
+                "expired": self.expired,
+            }
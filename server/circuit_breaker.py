@@ -0,0 +1,136 @@
+"""
+Circuit breakers for the upstream LLM APIs.
+
+Each breaker watches the outcomes of recent calls to one upstream. When
+enough of them fail or are slower than the latency threshold, it opens
+and calls are refused at once with CircuitOpenError, so endpoints go
+straight to their local fallbacks instead of each waiting out timeouts
+and retries. After a cool-down the breaker lets a few probe calls through
+(half-open). A successful probe closes it again; a failed one reopens it.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Failure-rate and slow-call breaker over a rolling window of recent calls"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window_calls: int = 20,
+        window_seconds: float = 60,
+        slow_call_seconds: float = 20,
+        open_seconds: float = 30,
+        half_open_probes: int = 1,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        # (finished at, failed or slow) of recent calls
+        self._outcomes: Deque[Tuple[float, bool]] = deque(maxlen=window_calls)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def before_call(self) -> bool:
+        """Admit a call or raise CircuitOpenError; True if the call is a half-open probe"""
+        with self._lock:
+            if self._state == OPEN:
+                retry_in = self._opened_at + self.open_seconds - time.monotonic()
+                if retry_in > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, retry_in)
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.open_seconds)
+                self._probes += 1
+                return True
+            return False
+
+    def record(self, ok: bool, latency: Optional[float] = None, probe: bool = False) -> None:
+        """Outcome of an admitted call; a slow success counts against the upstream too"""
+        bad = not ok or (latency is not None and latency > self.slow_call_seconds)
+        with self._lock:
+            now = time.monotonic()
+            if probe:
+                self._probes -= 1
+                if self._state == HALF_OPEN:
+                    if bad:
+                        self._open(now)
+                    else:
+                        self._state = CLOSED
+                        self._outcomes.clear()
+                    return
+            self._outcomes.append((now, bad))
+            if self._state == CLOSED and self._tripped(now):
+                self._open(now)
+
+    def release(self, probe: bool) -> None:
+        """An admitted call ended without a verdict on the upstream (e.g. it was cancelled)"""
+        if probe:
+            with self._lock:
+                self._probes -= 1
+
+    def _tripped(self, now: float) -> bool:
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+        calls = len(self._outcomes)
+        failures = sum(bad for _, bad in self._outcomes)
+        return calls >= self.min_calls and failures / calls >= self.failure_rate
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.opened += 1
+        logger.warning(f"{self.name} circuit opened for {self.open_seconds:.0f}s")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            failures = sum(bad for _, bad in self._outcomes)
+            return {
+                "state": state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
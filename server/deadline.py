@@ -0,0 +1,65 @@
+"""
+Per-request deadlines.
+
+A request's Deadline is held in a context variable for the duration of
+deadline_scope(), so it follows the request into asyncio tasks and into
+pool threads that run in a copy of its context. Outbound LLM calls under it
+clip their timeouts, retry backoff and rate-limit waits to the time left,
+and fail with DeadlineExceeded (see llm_client) once it is used up.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Clients send their remaining budget in seconds, e.g. "X-Request-Timeout: 25"
+DEADLINE_HEADER = 'X-Request-Timeout'
+
+
+class Deadline:
+    """Point in time by which a request's work must be done"""
+
+    __slots__ = ("seconds", "expires_at")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    @classmethod
+    def from_header(cls, value: Optional[str], default: float) -> Optional["Deadline"]:
+        """Deadline from a DEADLINE_HEADER value, else default seconds (0 = none)"""
+        try:
+            seconds = float(value) if value else default
+        except ValueError:
+            seconds = default
+        return cls(seconds) if seconds > 0 else None
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is none"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
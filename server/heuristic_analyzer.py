@@ -0,0 +1,185 @@
+"""
+Local heuristic ad analyzer.
+
+Scores creatives without calling an LLM. All keyword lists are compiled into
+one alternation regex with word boundaries (a keyword also matches its plural,
+but "bad" no longer matches "badge"), so each text is scanned once no matter
+how many keywords there are. analyze_batch() scans a whole batch of
+creatives in a single pass over their joined text.
+
+Metrics include random jitter. With a seed, each ad's jitter comes from its
+own RNG derived from the seed, the ad id and a hash of the ad's content, so
+its scores are reproducible and do not depend on batch composition or order.
+The canned strategy, CTA and hook labels still rotate with the ad's index.
+"""
+
+import hashlib
+import json
+import random
+import re
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+STRATEGIES = ['Emotional Storytelling', 'Social Proof', 'Urgency & Scarcity', 'Problem-Solution', 'Benefit-Driven', 'Exclusive Access', 'Limited Time Offer']
+EMOTIONS = ['Excitement', 'Trust', 'Curiosity', 'Urgency', 'Joy', 'Relief', 'Confidence', 'Inspiration']
+CTAS = ['Shop Now', 'Learn More', 'Get Started', 'Try Free', 'Join Today', 'Download Now', 'Book Now', 'Sign Up']
+VALUE_PROPS = ['Save 50% today only', 'Join 10,000+ satisfied customers', 'Transform your life in 30 days', 'Limited time offer', 'Exclusive access', 'Proven results']
+HOOKS = ['What if you could...', 'Imagine having...', 'Don\'t miss out on...', 'Discover the secret...', 'Transform your...', 'Unlock the power of...']
+HOOK_TYPES = ['curiosity', 'urgency', 'social_proof', 'fear', 'benefit', 'story', 'exclusive']
+TRIGGERS = ['Limited time', 'Exclusive access', 'Social proof', 'Personal benefit', 'Scarcity', 'Authority', 'Reciprocity']
+PHRASES = ['amazing results', 'best value', 'limited time', 'exclusive offer', 'proven method', 'transform', 'discover', 'unlock']
+
+# Keyword groups that pick the primary strategy, checked in this order
+STRATEGY_KEYWORDS = {
+    'Urgency & Scarcity': ['limited', 'today only', 'offer', 'sale'],
+    'Social Proof': ['join', 'community', 'people', 'customers'],
+    'Benefit-Driven': ['transform', 'change', 'improve', 'better'],
+    'Problem-Solution': ['problem', 'struggle', 'difficult', 'challenge'],
+}
+POSITIVE_WORDS = ['amazing', 'best', 'great', 'excellent', 'perfect', 'love', 'wonderful', 'fantastic']
+NEGATIVE_WORDS = ['worst', 'terrible', 'awful', 'horrible', 'bad', 'hate', 'disappointing']
+
+
+class KeywordMatcher:
+    """Single compiled automaton over labelled keyword groups"""
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        self.labels: Dict[str, str] = {}
+        alternatives = []
+        for n, (label, keywords) in enumerate(groups.items()):
+            name = f"g{n}"
+            self.labels[name] = label
+            # Longest first, so a phrase wins over a keyword it starts with
+            words = sorted({keyword.lower() for keyword in keywords}, key=len, reverse=True)
+            body = "|".join(r"\s+".join(map(re.escape, word.split())) for word in words)
+            alternatives.append(f"(?P<{name}>{body})")
+        self.pattern = re.compile(r"\b(?:" + "|".join(alternatives) + r")(?:e?s)?\b")
+
+    def match(self, text: str) -> Dict[str, Set[str]]:
+        """Distinct keywords of each group found in text"""
+        return self.match_many([text])[0]
+
+    def match_many(self, texts: List[str]) -> List[Dict[str, Set[str]]]:
+        """match() for every text, in one scan over all of them"""
+        texts = [text.lower() for text in texts]
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        # NUL separators keep a phrase from matching across two texts
+        joined = "\0".join(texts)
+
+        found: List[Dict[str, Set[str]]] = [{} for _ in texts]
+        for m in self.pattern.finditer(joined):
+            i = bisect_right(starts, m.start()) - 1
+            keyword = " ".join(m.group(m.lastgroup).split())
+            found[i].setdefault(self.labels[m.lastgroup], set()).add(keyword)
+        return found
+
+
+class HeuristicAnalyzer:
+    """Keyword- and metadata-based analysis in the same shape as the Gemini analysis"""
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed
+        self.matcher = KeywordMatcher({
+            **STRATEGY_KEYWORDS,
+            'positive': POSITIVE_WORDS,
+            'negative': NEGATIVE_WORDS,
+        })
+
+    def rng(self, ad: Dict[str, Any]) -> Any:
+        """Per-ad RNG when seeded (the same for the same ad at any position), else the shared module RNG"""
+        if self.seed is None:
+            return random
+        content = hashlib.sha256(json.dumps(ad, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return random.Random(f"{self.seed}:{ad.get('id', '')}:{content}")
+
+    def analyze(self, ad: Dict[str, Any], index: int) -> Dict[str, Any]:
+        """Analysis of one ad; index varies the canned strategy, CTA and hook choices"""
+        return self.build(ad, index, self.matcher.match(ad.get('ad_creative_body', '') or ''))
+
+    def analyze_batch(self, ads: List[Dict[str, Any]], start_index: int = 0) -> List[Dict[str, Any]]:
+        """Analyses of many ads, their creatives scanned in one pass"""
+        matches = self.matcher.match_many([ad.get('ad_creative_body', '') or '' for ad in ads])
+        return [self.build(ad, start_index + i, found) for i, (ad, found) in enumerate(zip(ads, matches))]
+
+    def build(self, ad: Dict[str, Any], index: int, found: Dict[str, Set[str]]) -> Dict[str, Any]:
+        rng = self.rng(ad)
+        business_type = ad.get('business_type', '').lower()
+        spend = ad.get('spend', 0)
+
+        # Content-based strategy selection
+        strategy = next((label for label in STRATEGY_KEYWORDS if label in found), STRATEGIES[index % len(STRATEGIES)])
+
+        # Performance metrics based on ad characteristics
+        base_engagement = 45
+        base_conversion = 25
+        base_virality = 35
+
+        # Adjust based on business type
+        if 'e-commerce' in business_type:
+            base_engagement += 10
+            base_conversion += 15
+        elif 'technology' in business_type:
+            base_engagement += 15
+            base_virality += 20
+        elif 'health' in business_type or 'fitness' in business_type:
+            base_engagement += 8
+            base_conversion += 10
+
+        # Adjust based on spend (higher spend often correlates with better targeting)
+        if spend > 10000:
+            base_engagement += 8
+            base_conversion += 12
+        elif spend > 5000:
+            base_engagement += 5
+            base_conversion += 8
+
+        # Add randomness but keep within realistic bounds
+        engagement = min(95, max(20, base_engagement + rng.uniform(-10, 15)))
+        conversion = min(85, max(10, base_conversion + rng.uniform(-8, 12)))
+        virality = min(90, max(15, base_virality + rng.uniform(-12, 18)))
+
+        # Sentiment from the number of distinct positive and negative words
+        positive_count = len(found.get('positive', ()))
+        negative_count = len(found.get('negative', ()))
+        if positive_count > negative_count:
+            sentiment = 'positive'
+            sentiment_score = 30 + rng.uniform(20, 50)
+        elif negative_count > positive_count:
+            sentiment = 'negative'
+            sentiment_score = -30 - rng.uniform(20, 50)
+        else:
+            sentiment = 'neutral'
+            sentiment_score = rng.uniform(-20, 20)
+
+        return {
+            "ad": ad,
+            "marketingStrategy": {
+                "primaryStrategy": strategy,
+                "callToAction": CTAS[index % len(CTAS)],
+                "valueProposition": VALUE_PROPS[index % len(VALUE_PROPS)]
+            },
+            "emotionalAnalysis": {
+                "primaryEmotion": EMOTIONS[index % len(EMOTIONS)],
+                "emotionalScore": 60 + rng.uniform(10, 35),
+                "emotionalTriggers": rng.sample(TRIGGERS, 3)
+            },
+            "sentimentAnalysis": {
+                "overallSentiment": sentiment,
+                "sentimentScore": sentiment_score,
+                "keyPhrases": rng.sample(PHRASES, 3)
+            },
+            "hooks": {
+                "primaryHook": HOOKS[index % len(HOOKS)],
+                "hookType": HOOK_TYPES[index % len(HOOK_TYPES)],
+                "hookEffectiveness": 55 + rng.uniform(10, 40)
+            },
+            "performanceMetrics": {
+                "estimatedEngagement": round(engagement, 1),
+                "conversionPotential": round(conversion, 1),
+                "viralityScore": round(virality, 1)
+            }
+        }
@@ -0,0 +1,137 @@
+"""
+HTTP validation and compression for read-only JSON endpoints.
+
+The http_cached decorator gives a Flask view a strong ETag and a
+Cache-Control header, answers a matching If-None-Match with 304, and gzip-
+or brotli-encodes bodies above a size threshold as the client's
+Accept-Encoding allows. When the view's output is fully determined by a
+version (e.g. the dataset version) and the normalized query string, the ETag
+is computed from those and a revalidation is answered without running the
+view at all; otherwise it is a hash of the body.
+
+Each encoding of a response is a separate representation, so it gets its
+own strong ETag ("<tag>-gzip", "<tag>-br"); If-None-Match matches any of
+them, since they share the same content.
+"""
+
+import functools
+import gzip
+import hashlib
+import logging
+from typing import Callable, Dict, Optional
+from urllib.parse import urlencode
+
+from flask import Response, make_response, request
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first when the client weighs encodings equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def normalized_query(args) -> str:
+    """
+    Query string with parameters sorted, so reordered URLs share a tag. Empty
+    values are kept: a view may switch on a parameter's presence alone
+    (?cursor= asks /api/fetch-ads for a page object rather than a list).
+    """
+    return urlencode(sorted(args.items(multi=True)))
+
+
+def entity_tag(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The content coding to use for a client's Accept-Encoding, or None for identity"""
+    weights: Dict[str, float] = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+    best, best_weight = None, 0.0
+    for name in ENCODINGS:
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def matched_tag(if_none_match: Optional[str], tag: str) -> Optional[str]:
+    """The entity-tag in If-None-Match naming any representation of tag, else None"""
+    for item in (if_none_match or "").split(","):
+        item = item.strip()
+        if item == "*":
+            return f'"{tag}"'
+        value = item[2:] if item.startswith("W/") else item
+        value = value.strip('"')
+        if value == tag or value in (f"{tag}-{encoding}" for encoding in ENCODINGS):
+            return f'"{value}"'
+    return None
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    response = Response(status=304)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def http_cached(cache_control: str, version: Optional[Callable[[], str]] = None, min_size: int = 1024):
+    """
+    Decorator adding ETag/304, Cache-Control and compression to a GET view
+    returning JSON. version, if given, returns a string that together with the
+    path and the normalized query fully determines the view's output.
+    """
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            tag = None
+            if version is not None:
+                tag = entity_tag(request.path, version(), normalized_query(request.args))
+                matched = matched_tag(request.headers.get("If-None-Match"), tag)
+                if matched is not None:
+                    return not_modified(matched, cache_control)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.direct_passthrough or response.content_encoding:
+                return response
+            body = response.get_data()
+            if tag is None:
+                tag = entity_tag(request.path, hashlib.sha256(body).hexdigest())
+                matched = matched_tag(request.headers.get("If-None-Match"), tag)
+                if matched is not None:
+                    return not_modified(matched, cache_control)
+
+            encoding = negotiate_encoding(request.headers.get("Accept-Encoding")) if len(body) >= min_size else None
+            if encoding is not None:
+                response.set_data(compress(body, encoding))
+                response.headers["Content-Encoding"] = encoding
+                tag = f"{tag}-{encoding}"
+            response.headers["ETag"] = f'"{tag}"'
+            response.headers["Cache-Control"] = cache_control
+            response.vary.add("Accept-Encoding")
+            return response
+        return wrapped
+    return decorate
@@ -0,0 +1,218 @@
+"""
+Content-addressed store for generated campaign images.
+
+DALL-E answers with a temporary third-party URL. Each generated image is
+downloaded once, stored on disk under the SHA-256 of its bytes together with
+resized thumbnails, and served from our own /api/assets/<name> endpoint. An
+index maps a hash of the prompt and generation parameters to the stored
+image, so generating the same prompt again costs no DALL-E call.
+
+Files are written under a temporary name and renamed into place, so
+concurrent writers (threads or processes) never expose a partial file.
+Thumbnails need Pillow; without it only the original is stored.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+    logger.warning("Pillow not installed, campaign image thumbnails disabled")
+
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+MEDIA_TYPES = {ext: media_type for media_type, ext in EXTENSIONS.items()}
+PIL_FORMATS = {"png": "PNG", "jpg": "JPEG", "webp": "WEBP"}
+
+# <sha256>.<ext> for an original, <sha256>_<size>.<ext> for a thumbnail
+ASSET_NAME = re.compile(r"^([0-9a-f]{64})(?:_(\d+))?\.(png|jpg|webp)$")
+
+
+def image_prompt_key(prompt: str, params: Dict[str, Any]) -> str:
+    """Hash of everything that determines a generated image"""
+    return hashlib.sha256(
+        json.dumps({"prompt": prompt, **params}, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def sniff_extension(data: bytes, content_type: Optional[str]) -> str:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in EXTENSIONS:
+        return EXTENSIONS[media_type]
+    if data.startswith(b"\xff\xd8"):
+        return "jpg"
+    if data[8:12] == b"WEBP":
+        return "webp"
+    return "png"
+
+
+class StoredImage:
+    """One stored original and the sizes of its thumbnails"""
+
+    __slots__ = ("digest", "ext", "thumbnails")
+
+    def __init__(self, digest: str, ext: str, thumbnails: Iterable[int] = ()):
+        self.digest = digest
+        self.ext = ext
+        self.thumbnails = sorted(thumbnails)
+
+    @property
+    def name(self) -> str:
+        return f"{self.digest}.{self.ext}"
+
+    def thumbnail_name(self, size: int) -> str:
+        return f"{self.digest}_{size}.{self.ext}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"digest": self.digest, "ext": self.ext, "thumbnails": self.thumbnails}
+
+
+class ImageAssetStore:
+    """Originals and thumbnails under root/objects, prompt index under root/prompts"""
+
+    def __init__(
+        self,
+        root: str,
+        thumbnail_sizes: Iterable[int] = (256, 512),
+        max_bytes: int = 20 * 1024 * 1024,
+        download_timeout: float = 30,
+    ):
+        self.root = root
+        self.thumbnail_sizes = sorted(thumbnail_sizes)
+        self.max_bytes = max_bytes
+        self.download_timeout = download_timeout
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "prompts"), exist_ok=True)
+        self._lock = threading.Lock()
+        self.prompt_hits = 0
+        self.prompt_misses = 0
+        self.stored = 0
+        self.deduplicated = 0
+
+    def _object_path(self, name: str) -> str:
+        # Shard by the first two hex digits to keep directories small
+        return os.path.join(self.root, "objects", name[:2], name)
+
+    def _prompt_path(self, key: str) -> str:
+        return os.path.join(self.root, "prompts", f"{key}.json")
+
+    def path(self, name: str) -> Optional[str]:
+        """Filesystem path of a stored original or thumbnail, or None if the name is invalid or unknown"""
+        if not ASSET_NAME.match(name):
+            return None
+        path = self._object_path(name)
+        return path if os.path.isfile(path) else None
+
+    def lookup(self, key: str) -> Optional[StoredImage]:
+        """The image stored for a prompt key, if any"""
+        try:
+            with open(self._prompt_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            image = StoredImage(entry["digest"], entry["ext"], entry.get("thumbnails", ()))
+        except (OSError, ValueError, KeyError):
+            image = None
+        if image is not None and not os.path.isfile(self._object_path(image.name)):
+            image = None
+        with self._lock:
+            if image is None:
+                self.prompt_misses += 1
+            else:
+                self.prompt_hits += 1
+        return image
+
+    def put(self, data: bytes, content_type: Optional[str] = None) -> StoredImage:
+        """Store image bytes (once per content) and their thumbnails"""
+        image = StoredImage(hashlib.sha256(data).hexdigest(), sniff_extension(data, content_type))
+        path = self._object_path(image.name)
+        if os.path.isfile(path):
+            with self._lock:
+                self.deduplicated += 1
+        else:
+            self._write(path, data)
+            with self._lock:
+                self.stored += 1
+        image.thumbnails = self._thumbnails(image, data)
+        return image
+
+    def remember(self, key: str, image: StoredImage) -> None:
+        self._write(self._prompt_path(key), json.dumps(image.to_dict()).encode("utf-8"))
+
+    def download(self, url: str) -> Tuple[bytes, Optional[str]]:
+        """Fetch an image, refusing bodies over max_bytes"""
+        with requests.get(url, stream=True, timeout=self.download_timeout) as response:
+            response.raise_for_status()
+            chunks: List[bytes] = []
+            size = 0
+            for chunk in response.iter_content(64 * 1024):
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise ValueError(f"image larger than {self.max_bytes} bytes")
+                chunks.append(chunk)
+            return b"".join(chunks), response.headers.get("Content-Type")
+
+    def save_from_url(self, key: str, url: str) -> StoredImage:
+        """Download a generated image, store it and index it under its prompt key"""
+        data, content_type = self.download(url)
+        image = self.put(data, content_type)
+        self.remember(key, image)
+        return image
+
+    def _thumbnails(self, image: StoredImage, data: bytes) -> List[int]:
+        if Image is None or not self.thumbnail_sizes:
+            return []
+        made = []
+        source = None
+        for size in self.thumbnail_sizes:
+            path = self._object_path(image.thumbnail_name(size))
+            if not os.path.isfile(path):
+                try:
+                    if source is None:
+                        source = Image.open(BytesIO(data))
+                        source.load()
+                    thumbnail = source.copy()
+                    thumbnail.thumbnail((size, size))
+                    out = BytesIO()
+                    thumbnail.save(out, PIL_FORMATS[image.ext])
+                except Exception as e:
+                    logger.error(f"Could not make {size}px thumbnail of {image.name}: {e}")
+                    continue
+                self._write(path, out.getvalue())
+            made.append(size)
+        return made
+
+    def _write(self, path: str, data: bytes) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "prompt_hits": self.prompt_hits,
+                "prompt_misses": self.prompt_misses,
+                "stored": self.stored,
+                "deduplicated": self.deduplicated,
+                "thumbnails": bool(Image is not None and self.thumbnail_sizes),
+            }
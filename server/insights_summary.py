@@ -0,0 +1,398 @@
+"""
+Compact summaries of ad analyses for the insights prompt.
+
+summarize_analyses() reduces any number of analyses to distributions of the
+categorical fields, score percentiles and a handful of representative
+quotes, so the insights prompt stays about the same size whether 5 or 5,000
+ads are selected. Embedded ad objects are never copied into the prompt.
+The work is done by InsightsAggregator, which takes analyses one at a time
+in linear total time, merges across chunks or workers, and also produces
+the local fallback insights.
+
+For very large selections the qualitative side is reduced hierarchically
+(findings_rounds): the model condenses each chunk's summary into a short
+list of findings (map), then consolidates those lists a group at a time
+until they fit the findings budget (reduce).
+"""
+
+import json
+from collections import Counter
+from typing import Any, Dict, Generator, Iterable, List, Optional, Sequence, Tuple
+
+from prompts import estimate_tokens, truncate_to_tokens
+
+# Prompt field name -> path in an analysis
+CATEGORIES = {
+    "primaryStrategy": ("marketingStrategy", "primaryStrategy"),
+    "callToAction": ("marketingStrategy", "callToAction"),
+    "primaryEmotion": ("emotionalAnalysis", "primaryEmotion"),
+    "overallSentiment": ("sentimentAnalysis", "overallSentiment"),
+    "hookType": ("hooks", "hookType"),
+}
+SCORES = {
+    "emotionalScore": ("emotionalAnalysis", "emotionalScore"),
+    "sentimentScore": ("sentimentAnalysis", "sentimentScore"),
+    "hookEffectiveness": ("hooks", "hookEffectiveness"),
+    "estimatedEngagement": ("performanceMetrics", "estimatedEngagement"),
+    "conversionPotential": ("performanceMetrics", "conversionPotential"),
+    "viralityScore": ("performanceMetrics", "viralityScore"),
+}
+TERMS = {
+    "emotionalTriggers": ("emotionalAnalysis", "emotionalTriggers"),
+    "keyPhrases": ("sentimentAnalysis", "keyPhrases"),
+}
+AD_FIELDS = ("business_type", "category", "platform", "ad_type")
+PERCENTILES = (10, 50, 90)
+QUOTE_CHARS = 160
+
+
+def field(item: Any, path: Sequence[str]) -> Any:
+    """Value at path in a nested dict, or None if any step is missing"""
+    value = item
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def distribution(counter: Counter, total: int, top: int) -> Dict[str, float]:
+    """Share (percent) of the top labels, with the rest folded into "other" """
+    shares = {label: round(100 * count / total, 1) for label, count in counter.most_common(top)}
+    rest = total - sum(count for _, count in counter.most_common(top))
+    if rest:
+        shares["other"] = round(100 * rest / total, 1)
+    return shares
+
+
+class ScoreSketch:
+    """
+    Mergeable quantile sketch for bounded scores: a histogram of fixed-width
+    buckets, so memory depends on the score range, not the number of values,
+    and percentiles are within half a bucket of the exact nearest-rank value.
+    """
+
+    __slots__ = ("resolution", "buckets", "count", "total")
+
+    def __init__(self, resolution: float = 0.1):
+        self.resolution = resolution
+        self.buckets: Counter = Counter()
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        self.buckets[round(value / self.resolution)] += 1
+        self.count += 1
+        self.total += value
+
+    def merge(self, other: "ScoreSketch") -> None:
+        if other.resolution != self.resolution:
+            raise ValueError("cannot merge sketches of different resolution")
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, p: float) -> float:
+        """Nearest-rank p-th percentile"""
+        rank = max(1, -(-p * self.count // 100))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return bucket * self.resolution
+        raise ValueError("empty sketch")
+
+    def summary(self) -> Dict[str, float]:
+        """Mean and PERCENTILES"""
+        summary = {f"p{p}": round(self.percentile(p), 1) for p in PERCENTILES}
+        summary["mean"] = round(self.total / self.count, 1)
+        return summary
+
+
+def quote(item: Dict[str, Any]) -> Dict[str, Any]:
+    """The few fields of one analysis that show what the ad actually says"""
+    body = " ".join(str(field(item, ("ad", "ad_creative_body")) or "").split())
+    return {
+        "strategy": field(item, CATEGORIES["primaryStrategy"]),
+        "hook": field(item, ("hooks", "primaryHook")),
+        "valueProposition": field(item, ("marketingStrategy", "valueProposition")),
+        "creative": body if len(body) <= QUOTE_CHARS else body[:QUOTE_CHARS].rstrip() + "…",
+        "engagement": field(item, SCORES["estimatedEngagement"]),
+    }
+
+
+class InsightsAggregator:
+    """
+    Running aggregate of ad analyses, fed one analysis at a time.
+
+    Keeps label counts, score sketches and the few candidate quotes, so
+    memory is bounded by the number of distinct labels rather than the
+    number of analyses. Aggregators built on separate chunks or workers
+    combine with merge(); summary() and insights() can be read at any point.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.categories = {name: Counter() for name in CATEGORIES}
+        self.terms = {name: Counter() for name in TERMS}
+        self.ad_fields = {name: Counter() for name in AD_FIELDS}
+        self.scores = {name: ScoreSketch() for name in SCORES}
+        # (engagement, quote) of the best ad per strategy, and of the strongest and weakest ads overall
+        self.best: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.strongest: Optional[Tuple[float, Dict[str, Any]]] = None
+        self.weakest: Optional[Tuple[float, Dict[str, Any]]] = None
+
+    def add(self, item: Dict[str, Any]) -> None:
+        self.count += 1
+        for name, path in CATEGORIES.items():
+            value = field(item, path)
+            if isinstance(value, str) and value:
+                self.categories[name][value] += 1
+        for name, path in SCORES.items():
+            value = field(item, path)
+            if is_number(value):
+                self.scores[name].add(value)
+        for name, path in TERMS.items():
+            values = field(item, path)
+            if isinstance(values, list):
+                self.terms[name].update(v.lower() for v in values if isinstance(v, str))
+        for name in AD_FIELDS:
+            value = field(item, ("ad", name))
+            if isinstance(value, str) and value:
+                self.ad_fields[name][value] += 1
+
+        engagement = field(item, SCORES["estimatedEngagement"])
+        engagement = engagement if is_number(engagement) else 0
+        strategy = field(item, CATEGORIES["primaryStrategy"])
+        # Quotes are only built for ads that take a slot
+        if isinstance(strategy, str) and strategy and (strategy not in self.best or engagement > self.best[strategy][0]):
+            self.best[strategy] = (engagement, quote(item))
+        if self.strongest is None or engagement > self.strongest[0]:
+            self.strongest = (engagement, quote(item))
+        if self.weakest is None or engagement < self.weakest[0]:
+            self.weakest = (engagement, quote(item))
+
+    def extend(self, items: Iterable[Dict[str, Any]]) -> "InsightsAggregator":
+        for item in items:
+            self.add(item)
+        return self
+
+    def merge(self, other: "InsightsAggregator") -> "InsightsAggregator":
+        """Fold in another aggregator's analyses"""
+        self.count += other.count
+        for mine, theirs in ((self.categories, other.categories), (self.terms, other.terms), (self.ad_fields, other.ad_fields)):
+            for name, counter in theirs.items():
+                mine[name].update(counter)
+        for name, sketch in other.scores.items():
+            self.scores[name].merge(sketch)
+        for strategy, best in other.best.items():
+            if strategy not in self.best or best[0] > self.best[strategy][0]:
+                self.best[strategy] = best
+        if other.strongest is not None and (self.strongest is None or other.strongest[0] > self.strongest[0]):
+            self.strongest = other.strongest
+        if other.weakest is not None and (self.weakest is None or other.weakest[0] < self.weakest[0]):
+            self.weakest = other.weakest
+        return self
+
+    def mode(self, name: str, default: str) -> str:
+        """Most common value of a category (the first seen on ties)"""
+        common = self.categories[name].most_common(1)
+        return common[0][0] if common else default
+
+    def representative_quotes(self, max_quotes: int) -> List[Dict[str, Any]]:
+        """Best-engaging ad of each of the three leading strategies, then the strongest and weakest ads overall"""
+        candidates = [self.best[label][1] for label, _ in self.categories["primaryStrategy"].most_common(3) if label in self.best]
+        candidates += [slot[1] for slot in (self.strongest, self.weakest) if slot is not None]
+        chosen: List[Dict[str, Any]] = []
+        for candidate in candidates:
+            if len(chosen) < max_quotes and candidate not in chosen:
+                chosen.append(candidate)
+        return chosen
+
+    def summary(self, top: int = 6, max_quotes: int = 6) -> Dict[str, Any]:
+        """Constant-size statistical summary of the analyses so far"""
+        total = self.count
+        return {
+            "adCount": total,
+            "ads": {name: distribution(counter, total, top) for name, counter in self.ad_fields.items() if counter},
+            "distributions": {name: distribution(counter, total, top) for name, counter in self.categories.items() if counter},
+            "scores": {name: sketch.summary() for name, sketch in self.scores.items() if sketch.count},
+            "commonTerms": {name: [term for term, _ in counter.most_common(top)] for name, counter in self.terms.items() if counter},
+            "representativeAds": self.representative_quotes(max_quotes),
+        }
+
+    def insights(self) -> Dict[str, Any]:
+        """Template insights (the /api/generate-insights shape) shaped by the analyses so far"""
+        common_strategy = self.mode("primaryStrategy", "General")
+        common_emotion = self.mode("primaryEmotion", "Neutral")
+        return {
+            "competitiveAnalysis": {
+                "strengths": [
+                    f"Competitors are using {common_strategy} effectively",
+                    "Strong emotional connection through targeted messaging",
+                    "Consistent brand positioning across campaigns"
+                ],
+                "weaknesses": [
+                    "Limited differentiation in messaging approach",
+                    "Over-reliance on single emotional trigger",
+                    "Generic call-to-action strategies"
+                ],
+                "opportunities": [
+                    "Gap in unique value proposition messaging",
+                    "Potential for innovative hook strategies",
+                    "Room for improved emotional storytelling"
+                ],
+                "threats": [
+                    "Market saturation with similar approaches",
+                    "Risk of being perceived as generic",
+                    "Potential loss of competitive edge"
+                ]
+            },
+            "strategicRecommendations": {
+                "marketingStrategy": [
+                    f"Differentiate from {common_strategy} approach",
+                    "Focus on unique value proposition",
+                    "Implement multi-channel strategy"
+                ],
+                "emotionalAppeal": [
+                    f"Counter {common_emotion} with complementary emotions",
+                    "Create emotional journey in messaging",
+                    "Build deeper emotional connections"
+                ],
+                "hookOptimization": [
+                    "Develop unique hook patterns",
+                    "Test curiosity-driven approaches",
+                    "Implement urgency without pressure"
+                ],
+                "performanceOptimization": [
+                    "A/B test multiple messaging approaches",
+                    "Optimize for higher engagement rates",
+                    "Focus on conversion optimization"
+                ]
+            },
+            "creativeGuidelines": {
+                "messaging": [
+                    "Lead with unique value proposition",
+                    "Use storytelling to create connection",
+                    "Include social proof elements"
+                ],
+                "visualElements": [
+                    "Use contrasting colors to stand out",
+                    "Implement dynamic visual storytelling",
+                    "Focus on human-centric imagery"
+                ],
+                "callToAction": [
+                    "Create urgency without pressure",
+                    "Use action-oriented language",
+                    "Offer clear value exchange"
+                ],
+                "toneOfVoice": [
+                    "Maintain professional yet approachable tone",
+                    "Use conversational language",
+                    "Build trust through authenticity"
+                ]
+            },
+            "implementationPlan": {
+                "immediateActions": [
+                    "Audit current messaging strategy",
+                    "Identify unique value propositions",
+                    "Plan A/B testing framework"
+                ],
+                "shortTermGoals": [
+                    "Develop differentiated messaging",
+                    "Create new creative assets",
+                    "Implement tracking mechanisms"
+                ],
+                "longTermStrategy": [
+                    "Build brand differentiation",
+                    "Establish market leadership",
+                    "Create sustainable competitive advantage"
+                ],
+                "successMetrics": [
+                    "Engagement rate improvement",
+                    "Conversion rate optimization",
+                    "Brand recognition growth"
+                ]
+            },
+            "competitiveAdvantage": {
+                "uniquePositioning": f"Differentiate from {common_strategy} approach with innovative messaging",
+                "differentiationStrategy": "Focus on unique value propositions and emotional storytelling",
+                "valueProposition": "Provide clear, compelling reasons to choose your brand",
+                "targetAudience": "Identify and target underserved audience segments"
+            }
+        }
+
+
+def summarize_analyses(analyses: Iterable[Dict[str, Any]], top: int = 6, max_quotes: int = 6) -> Dict[str, Any]:
+    """Constant-size statistical summary of any number of analyses"""
+    return InsightsAggregator().extend(analyses).summary(top, max_quotes)
+
+
+def render_summary(summary: Dict[str, Any]) -> str:
+    """Summary as compact JSON for the prompt"""
+    return json.dumps(summary, separators=(",", ":"), ensure_ascii=False)
+
+
+def chunked(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def findings_prompt(summary: Dict[str, Any], max_findings: int) -> str:
+    """Map step: findings from one chunk's summary"""
+    return f"""
+    As a marketing expert, review this statistical summary of {summary['adCount']} competitor ad analyses:
+
+    {render_summary(summary)}
+
+    List at most {max_findings} short, specific findings about the strategies, emotional appeals, hooks and
+    performance patterns in these ads, as JSON: {{"findings": ["string", "string"]}}
+    """
+
+
+def consolidate_prompt(findings: List[str], max_findings: int) -> str:
+    """Reduce step: one list of findings from several chunks' findings"""
+    listed = "\n".join(f"- {finding}" for finding in findings)
+    return f"""
+    As a marketing expert, consolidate these findings from several groups of competitor ads:
+
+    {listed}
+
+    Merge duplicates, keep the patterns that recur or matter most, and list at most {max_findings} findings,
+    as JSON: {{"findings": ["string", "string"]}}
+    """
+
+
+def findings_rounds(
+    analyses: List[Dict[str, Any]], chunk_size: int, fan_in: int, max_findings: int, budget: int
+) -> Generator[List[str], List[List[str]], List[str]]:
+    """
+    Map-reduce plan as a generator, so sync and async callers can share it:
+    each yield is a round of prompts, to be sent back the findings list of
+    each prompt in order; the return value is the final list of findings.
+    """
+    findings = yield [findings_prompt(summarize_analyses(chunk), max_findings) for chunk in chunked(analyses, chunk_size)]
+    while len(findings) > 1 and estimate_tokens("\n".join(f for group in findings for f in group)) > budget:
+        findings = yield [
+            consolidate_prompt([f for group in groups for f in group], max_findings)
+            for groups in chunked(findings, max(2, fan_in))
+        ]
+    return [f for group in findings for f in group]
+
+
+def parse_findings(value: Any) -> List[str]:
+    """Findings list from a parsed reply, ignoring anything that is not a string"""
+    findings = value.get("findings") if isinstance(value, dict) else None
+    return [f.strip() for f in findings if isinstance(f, str) and f.strip()] if isinstance(findings, list) else []
+
+
+def render_insights_data(summary: Dict[str, Any], findings: Optional[List[str]], budget: int) -> str:
+    """Summary and (for map-reduced selections) findings section of the insights prompt"""
+    text = f"Statistical summary of {summary['adCount']} competitor ad analyses (percent shares, score percentiles):\n    {render_summary(summary)}"
+    if findings:
+        listed = "\n".join(f"    - {finding}" for finding in findings)
+        text += f"\n\n    Findings from reviewing the ads in groups:\n{listed}"
+    return truncate_to_tokens(text, budget)
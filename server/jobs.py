@@ -0,0 +1,400 @@
+"""
+Background jobs for long-running analysis.
+
+A job is submitted with a kind and a JSON payload, gets an id at once and is
+run later by a pool of worker threads, which record per-item results as they
+complete. Status, progress and the results so far can be read at any time,
+and the whole result stays available for JOB_TTL seconds after it finishes.
+
+Two interchangeable backends hold the queue and the results:
+
+- MemoryJobBackend: in-process queue, lost on restart.
+- SQLiteJobBackend: jobs and per-item results in a local SQLite (WAL) file.
+  Jobs survive restarts and can be shared by several processes. While a
+  job runs, its worker's process refreshes a heartbeat; a job whose
+  heartbeat went stale (the process died) is claimed again and resumes
+  after the items it already finished.
+
+Workers are started with the server (JobWorkers.start()), so queued jobs
+left over from a previous run resume without waiting for a request.
+"""
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+logger = logging.getLogger(__name__)
+
+# (job id, kind, payload, results already recorded by index)
+Claim = Tuple[str, str, Dict[str, Any], Dict[int, Any]]
+
+# handler(payload, done, record) -> output; record(index, result) stores one item's result
+JobHandler = Callable[[Dict[str, Any], Dict[int, Any], Callable[[int, Any], None]], Dict[str, Any]]
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+class Job:
+    """State of one job in the in-memory backend"""
+
+    __slots__ = ("job_id", "kind", "payload", "status", "total", "results", "output", "error", "created_at", "updated_at")
+
+    def __init__(self, job_id: str, kind: str, payload: Dict[str, Any], total: int):
+        self.job_id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.status = QUEUED
+        self.total = total
+        self.results: Dict[int, Any] = {}
+        self.output: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+
+def job_view(job_id, kind, status, total, results, output, error, created_at, updated_at) -> Dict[str, Any]:
+    """Client-facing job state: results in input order, None where an item is not done yet"""
+    view = {
+        "job_id": job_id,
+        "kind": kind,
+        "status": status,
+        "progress": {"done": len(results), "total": total},
+        "results": [results.get(i) for i in range(total)],
+        "created_at": created_at,
+        "updated_at": updated_at,
+    }
+    if output is not None:
+        view.update(output)
+    if error is not None:
+        view["error"] = error
+    return view
+
+
+class MemoryJobBackend:
+    """Jobs in a dict and a FIFO queue of job ids, for a single process"""
+
+    def __init__(self, ttl: float = 86400):
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, payload: Dict[str, Any], total: int) -> str:
+        job = Job(new_job_id(), kind, payload, total)
+        with self._lock:
+            self._expire(job.created_at)
+            self._jobs[job.job_id] = job
+        self._queue.put(job.job_id)
+        return job.job_id
+
+    def claim(self, timeout: float) -> Optional[Claim]:
+        try:
+            job_id = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return None
+            job.status = RUNNING
+            job.updated_at = time.time()
+            return job.job_id, job.kind, job.payload, dict(job.results)
+
+    def record(self, job_id: str, index: int, result: Any) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.results[index] = result
+                job.updated_at = time.time()
+
+    def finish(self, job_id: str, output: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.status = FAILED if error is not None else SUCCEEDED
+                job.output = output
+                job.error = error
+                job.updated_at = time.time()
+                # The payload is no longer needed once the job is done
+                job.payload = {}
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return job_view(
+                job.job_id, job.kind, job.status, job.total, dict(job.results),
+                job.output, job.error, job.created_at, job.updated_at
+            )
+
+    def heartbeat(self, job_ids: List[str]) -> None:
+        """Running jobs live only as long as this process, so there is nothing to refresh"""
+
+    def _expire(self, now: float) -> None:
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in FINISHED and now - job.updated_at > self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {"backend": "memory", "jobs": counts}
+
+
+class SQLiteJobBackend:
+    """Jobs and per-item results in SQLite, claimed atomically so several processes can share them"""
+
+    def __init__(self, db_path: str, ttl: float = 86400, stale_seconds: float = 60, poll_seconds: float = 1.0):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.stale_seconds = stale_seconds
+        # Several heartbeats fit in the stale window, so a busy but live job is never reclaimed
+        self.heartbeat_seconds = stale_seconds / 4
+        self.poll_seconds = poll_seconds
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "total INTEGER NOT NULL, output TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_results ("
+            "job_id TEXT NOT NULL, idx INTEGER NOT NULL, result TEXT NOT NULL, PRIMARY KEY (job_id, idx))"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("heartbeat", "REAL")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._lock = threading.Lock()
+        self._submitted = threading.Condition(self._lock)
+        # Claim token of each job this process is running; writes for a job another process reclaimed are dropped
+        self._owners: Dict[str, str] = {}
+
+    def submit(self, kind: str, payload: Dict[str, Any], total: int) -> str:
+        job_id = new_job_id()
+        now = time.time()
+        with self._submitted:
+            self._expire(now)
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), QUEUED, total, now, now),
+            )
+            self._submitted.notify()
+        return job_id
+
+    def claim(self, timeout: float) -> Optional[Claim]:
+        with self._submitted:
+            claimed = self._claim_next()
+            if claimed is None:
+                # Jobs submitted by other processes are only seen on the next poll
+                self._submitted.wait(min(timeout, self.poll_seconds))
+                claimed = self._claim_next()
+            if claimed is None:
+                return None
+            job_id, kind, payload = claimed
+            done = {
+                idx: json.loads(result)
+                for idx, result in self._db.execute("SELECT idx, result FROM job_results WHERE job_id = ?", (job_id,))
+            }
+        return job_id, kind, json.loads(payload), done
+
+    def _claim_next(self) -> Optional[Tuple[str, str, str]]:
+        now = time.time()
+        candidates = self._db.execute(
+            "SELECT id, kind, payload, status, IFNULL(owner, '') FROM jobs "
+            "WHERE status = ? OR (status = ? AND IFNULL(heartbeat, 0) < ?) ORDER BY created_at LIMIT 8",
+            (QUEUED, RUNNING, now - self.stale_seconds),
+        ).fetchall()
+        for job_id, kind, payload, status, owner in candidates:
+            # Conditional update on the previous claim token: only one process wins a given job
+            token = uuid.uuid4().hex
+            claimed = self._db.execute(
+                "UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND IFNULL(owner, '') = ?",
+                (RUNNING, token, now, now, job_id, status, owner),
+            ).rowcount
+            if claimed:
+                if status == RUNNING:
+                    logger.warning(f"Resuming stalled job {job_id}")
+                self._owners[job_id] = token
+                return job_id, kind, payload
+        return None
+
+    def record(self, job_id: str, index: int, result: Any) -> None:
+        with self._lock:
+            now = time.time()
+            self._db.execute("BEGIN")
+            try:
+                # Owner check first: a run whose job was reclaimed must not overwrite the new owner's results
+                owned = self._db.execute(
+                    "UPDATE jobs SET updated_at = ?, heartbeat = ? WHERE id = ? AND owner = ?",
+                    (now, now, job_id, self._owners.get(job_id)),
+                ).rowcount
+                if owned:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO job_results (job_id, idx, result) VALUES (?, ?, ?)",
+                        (job_id, index, json.dumps(result, ensure_ascii=False)),
+                    )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        if not owned:
+            logger.warning(f"Job {job_id} was reclaimed by another worker, dropping this run's result {index}")
+
+    def heartbeat(self, job_ids: List[str]) -> None:
+        """Mark jobs this process is running as alive"""
+        with self._lock:
+            now = time.time()
+            for job_id in job_ids:
+                self._db.execute(
+                    "UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = ? AND owner = ?",
+                    (now, job_id, RUNNING, self._owners.get(job_id)),
+                )
+
+    def finish(self, job_id: str, output: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            finished = self._db.execute(
+                "UPDATE jobs SET status = ?, output = ?, error = ?, payload = '{}', updated_at = ? "
+                "WHERE id = ? AND owner = ?",
+                (
+                    FAILED if error is not None else SUCCEEDED,
+                    None if output is None else json.dumps(output, ensure_ascii=False),
+                    error, time.time(), job_id, self._owners.pop(job_id, None),
+                ),
+            ).rowcount
+        if not finished:
+            logger.warning(f"Job {job_id} was reclaimed by another worker, dropping this run's outcome")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT kind, status, total, output, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            results = {
+                idx: json.loads(result)
+                for idx, result in self._db.execute("SELECT idx, result FROM job_results WHERE job_id = ?", (job_id,))
+            }
+        kind, status, total, output, error, created_at, updated_at = row
+        return job_view(
+            job_id, kind, status, total, results,
+            None if output is None else json.loads(output), error, created_at, updated_at
+        )
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.ttl
+        self._db.execute(
+            "DELETE FROM job_results WHERE job_id IN (SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?)",
+            (*FINISHED, cutoff),
+        )
+        self._db.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (*FINISHED, cutoff))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+            for status, count in self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+                counts[status] = count
+        return {"backend": "sqlite", "path": self.db_path, "jobs": counts}
+
+
+class JobWorkers:
+    """Pool of daemon threads running queued jobs with the handler registered for their kind"""
+
+    def __init__(self, backend, handlers: Dict[str, JobHandler], workers: int = 2):
+        self.backend = backend
+        self.handlers = handlers
+        self.workers = workers
+        self._threads: List[threading.Thread] = []
+        self._running: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the worker threads (once); the servers call this at startup, submit/get as a fallback"""
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            interval = getattr(self.backend, "heartbeat_seconds", None)
+            if interval:
+                thread = threading.Thread(target=self._beat, args=(interval,), name="job-heartbeat", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _beat(self, interval: float) -> None:
+        # Independent of the handlers, which may block for long on rate limits or slow calls
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                running = list(self._running)
+            if running:
+                try:
+                    self.backend.heartbeat(running)
+                except Exception as e:
+                    logger.error(f"Error refreshing job heartbeats: {e}")
+
+    def submit(self, kind: str, payload: Dict[str, Any], total: int) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self.start()
+        return self.backend.submit(kind, payload, total)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self.start()
+        return self.backend.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.backend.stats(), "workers": self.workers, "started": bool(self._threads)}
+
+    def _work(self) -> None:
+        while True:
+            try:
+                claimed = self.backend.claim(timeout=5.0)
+            except Exception as e:
+                logger.error(f"Error claiming job: {e}")
+                time.sleep(1.0)
+                continue
+            if claimed is not None:
+                self._run(*claimed)
+
+    def _run(self, job_id: str, kind: str, payload: Dict[str, Any], done: Dict[int, Any]) -> None:
+        logger.info(f"Running {kind} job {job_id} ({len(done)} items already done)")
+        with self._lock:
+            self._running[job_id] = kind
+        try:
+            output = self.handlers[kind](payload, done, lambda index, result: self.backend.record(job_id, index, result))
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            self.backend.finish(job_id, error=str(e))
+            return
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+        self.backend.finish(job_id, output=output)
+        logger.info(f"Finished {kind} job {job_id}")
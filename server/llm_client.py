@@ -0,0 +1,714 @@
+"""
+Shared HTTP clients for the Gemini and OpenAI APIs.
+
+Every outbound LLM call goes through a pooled keep-alive ``requests.Session``
+(or, in the async serving mode, an ``httpx.AsyncClient``) with connect/read
+timeouts and jittered exponential-backoff retries on 429/5xx responses and
+transport errors. Gemini requests, retries included, first wait for the
+shared priority rate limiter; calls are then admitted by a per-upstream
+circuit breaker.
+"""
+
+import os
+import json
+import functools
+import random
+import threading
+import time
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import asyncio
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from deadline import remaining_time
+from prompts import estimate_tokens
+from rate_limiter import PriorityRateLimiter, RateLimitTimeout
+from single_flight import AsyncSingleFlight, SingleFlight, flight_key
+from structured_output import IncrementalJSONParser, StructuredOutputError, json_generation_config
+
+logger = logging.getLogger(__name__)
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+# Transport settings (seconds unless noted)
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', 60))
+OPENAI_IMAGE_READ_TIMEOUT = float(os.getenv('OPENAI_IMAGE_READ_TIMEOUT', 120))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 3))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 0.5))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', 8))
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', 32))
+LLM_ASYNC_POOL_SIZE = int(os.getenv('LLM_ASYNC_POOL_SIZE', 256))
+
+# Concurrent identical generate/image calls share one upstream request
+LLM_SINGLE_FLIGHT = os.getenv('LLM_SINGLE_FLIGHT', '1') == '1'
+
+# Gemini quota shared by every call in the process, admitted chat first, then strategy/insights, then bulk (0 = unlimited)
+LLM_RATE_LIMIT_RPM = float(os.getenv('LLM_RATE_LIMIT_RPM', 0))
+LLM_RATE_LIMIT_TPM = float(os.getenv('LLM_RATE_LIMIT_TPM', 0))
+
+# Per-upstream circuit breakers: open when at least LLM_CIRCUIT_FAILURE_RATE of the recent calls
+# (and LLM_CIRCUIT_MIN_CALLS or more) failed or took over LLM_CIRCUIT_SLOW_CALL_SECONDS to respond,
+# then refuse calls for LLM_CIRCUIT_OPEN_SECONDS before letting a probe through
+LLM_CIRCUIT_BREAKER = os.getenv('LLM_CIRCUIT_BREAKER', '1') == '1'
+LLM_CIRCUIT_FAILURE_RATE = float(os.getenv('LLM_CIRCUIT_FAILURE_RATE', 0.5))
+LLM_CIRCUIT_MIN_CALLS = int(os.getenv('LLM_CIRCUIT_MIN_CALLS', 5))
+LLM_CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv('LLM_CIRCUIT_SLOW_CALL_SECONDS', 20))
+LLM_CIRCUIT_OPEN_SECONDS = float(os.getenv('LLM_CIRCUIT_OPEN_SECONDS', 30))
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class LLMError(Exception):
+    """Raised when an upstream LLM call fails or returns no usable content"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, body: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+
+class DeadlineExceeded(LLMError):
+    """Raised when the current request deadline runs out before or during a call"""
+
+    def __init__(self, message: str = "Request deadline exceeded"):
+        super().__init__(message)
+
+
+# A timeout that fires with no more than this much of the deadline left was the deadline's doing
+DEADLINE_SLACK = 0.1
+
+
+def check_deadline() -> None:
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded()
+
+
+def deadline_reached() -> bool:
+    """Whether the current request deadline has (all but) run out"""
+    remaining = remaining_time()
+    return remaining is not None and remaining <= DEADLINE_SLACK
+
+
+def time_to_retry(delay: float) -> bool:
+    """Whether a retry after delay seconds still starts before the request deadline"""
+    remaining = remaining_time()
+    return remaining is None or delay < remaining
+
+
+class LLMUnavailableError(LLMError):
+    """Raised without calling the upstream while its circuit breaker is open"""
+
+    def __init__(self, error: CircuitOpenError):
+        super().__init__(str(error))
+        self.retry_in = error.retry_in
+
+
+def build_session(pool_size: int = LLM_POOL_SIZE) -> requests.Session:
+    """Create a keep-alive session whose connection pool fits pool_size concurrent calls"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, honouring a numeric Retry-After header"""
+    if retry_after:
+        try:
+            return min(LLM_BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def post_with_retries(
+    session: requests.Session,
+    url: str,
+    payload: Dict[str, Any],
+    headers: Dict[str, str],
+    timeout: tuple,
+    max_retries: int = LLM_MAX_RETRIES,
+    stream: bool = False,
+    admit: Optional[Callable[[], Any]] = None,
+) -> requests.Response:
+    """
+    POST payload as JSON, retrying transport errors and 429/5xx responses.
+    Returns the final response (which may still be an error status).
+    Only a timeout cut short by the request deadline raises DeadlineExceeded;
+    any other failure is retried while the deadline leaves time for it, then
+    reported as usual, so the circuit breaker sees it. admit() (rate limiting)
+    runs before every retry; the first attempt is admitted by the caller.
+    """
+    attempt = 0
+    while True:
+        if attempt and admit is not None:
+            # Retries are charged to the quota like any other request
+            admit()
+        # Timeouts never reach past the request deadline
+        remaining = remaining_time()
+        check_deadline()
+        attempt_timeout = timeout if remaining is None else tuple(min(t, remaining) for t in timeout)
+        try:
+            response = session.post(url, headers=headers, json=payload, timeout=attempt_timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if isinstance(e, requests.Timeout) and deadline_reached():
+                raise DeadlineExceeded() from e
+            delay = backoff_delay(attempt)
+            if attempt >= max_retries or not time_to_retry(delay):
+                raise LLMError(f"Request to {url.split('?')[0]} failed: {e}") from e
+            logger.warning(f"LLM request error ({e}), retrying in {delay:.2f}s")
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                return response
+            delay = backoff_delay(attempt, response.headers.get('Retry-After'))
+            if not time_to_retry(delay):
+                return response
+            response.close()
+            logger.warning(f"LLM request returned {response.status_code}, retrying in {delay:.2f}s")
+        time.sleep(delay)
+        attempt += 1
+
+
+def extract_text(result: Dict[str, Any]) -> Optional[str]:
+    """Join the text parts of the first Gemini candidate, or None if there are none"""
+    candidates = result.get('candidates') or []
+    if not candidates:
+        return None
+    parts = (candidates[0].get('content') or {}).get('parts') or []
+    texts = [part['text'] for part in parts if 'text' in part]
+    return "".join(texts) if texts else None
+
+
+# A leader's DeadlineExceeded is its own request's; followers repeat the call under theirs
+sync_flights = SingleFlight(unshared=(DeadlineExceeded,))
+async_flights = AsyncSingleFlight(unshared=(DeadlineExceeded,))
+
+
+def record_parts(parts: List[Any], on_value) -> Callable[[Any, Any], None]:
+    """Parser callback keeping every (key, value) part for coalesced callers before passing it on"""
+    def emit(key, value):
+        parts.append((key, value))
+        if on_value is not None:
+            on_value(key, value)
+    return emit
+
+
+def settle_json_flight(outcome: Tuple[List[Any], Any, Optional[Exception]], led: bool, on_value) -> Any:
+    """
+    Return or raise a generate_json outcome. Callers coalesced onto another's
+    flight never ran its parser, so the leader's parts are replayed to their
+    on_value first: all at once when the flight ends rather than as they
+    streamed, but in order and before a mid-stream error, as the leader saw them.
+    """
+    parts, result, error = outcome
+    if not led and on_value is not None:
+        for key, value in parts:
+            on_value(key, value)
+    if error is not None:
+        raise error
+    return result
+
+
+def single_flight_stats() -> Dict[str, Any]:
+    """Coalescing counters for the threaded and async clients"""
+    return {"enabled": LLM_SINGLE_FLIGHT, "sync": sync_flights.stats(), "async": async_flights.stats()}
+
+
+gemini_rate_limiter = PriorityRateLimiter(LLM_RATE_LIMIT_RPM, LLM_RATE_LIMIT_TPM)
+
+
+def rate_limit_stats() -> Dict[str, Any]:
+    """Quota, queue depth and wait times of the Gemini rate limiter"""
+    return gemini_rate_limiter.stats()
+
+
+def build_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_rate=LLM_CIRCUIT_FAILURE_RATE,
+        min_calls=LLM_CIRCUIT_MIN_CALLS,
+        slow_call_seconds=LLM_CIRCUIT_SLOW_CALL_SECONDS,
+        open_seconds=LLM_CIRCUIT_OPEN_SECONDS,
+    )
+
+
+gemini_breaker = build_breaker("Gemini")
+openai_breaker = build_breaker("OpenAI")
+
+
+def circuit_breaker_stats() -> Dict[str, Any]:
+    """State and counters of the per-upstream circuit breakers"""
+    return {"enabled": LLM_CIRCUIT_BREAKER, "gemini": gemini_breaker.stats(), "openai": openai_breaker.stats()}
+
+
+def upstream_failed(status_code: Optional[int]) -> bool:
+    """Whether a call's outcome counts against the upstream (transport error, 429 or 5xx; not 4xx)"""
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def call_through(breaker: CircuitBreaker, send: Callable[[], Any], admit: Optional[Callable[[], Any]] = None) -> Any:
+    """
+    send() the request if the breaker allows it, recording whether the
+    upstream failed and how long it took to respond. admit() (rate limiting)
+    runs before the breaker is asked, so a call queued for quota never holds
+    a half-open probe slot, and does not count towards the latency.
+    """
+    if admit is not None:
+        admit()
+    if not LLM_CIRCUIT_BREAKER:
+        return send()
+    try:
+        probe = breaker.before_call()
+    except CircuitOpenError as e:
+        raise LLMUnavailableError(e) from None
+    try:
+        started = time.monotonic()
+        response = send()
+    except DeadlineExceeded:
+        breaker.release(probe)
+        raise
+    except LLMError as e:
+        breaker.record(not upstream_failed(e.status_code), probe=probe)
+        raise
+    except BaseException:
+        breaker.release(probe)
+        raise
+    breaker.record(not upstream_failed(response.status_code), time.monotonic() - started, probe)
+    return response
+
+
+async def async_call_through(
+    breaker: CircuitBreaker, send: Callable[[], Awaitable[Any]], admit: Optional[Callable[[], Awaitable[Any]]] = None
+) -> Any:
+    """Async counterpart of call_through"""
+    if admit is not None:
+        await admit()
+    if not LLM_CIRCUIT_BREAKER:
+        return await send()
+    try:
+        probe = breaker.before_call()
+    except CircuitOpenError as e:
+        raise LLMUnavailableError(e) from None
+    try:
+        started = time.monotonic()
+        response = await send()
+    except DeadlineExceeded:
+        breaker.release(probe)
+        raise
+    except LLMError as e:
+        breaker.record(not upstream_failed(e.status_code), probe=probe)
+        raise
+    except BaseException:
+        breaker.release(probe)
+        raise
+    breaker.record(not upstream_failed(response.status_code), time.monotonic() - started, probe)
+    return response
+
+
+def admit_gemini(payload: Dict[str, Any], priority: Optional[int]) -> None:
+    """Wait for Gemini quota, at most until the request deadline"""
+    try:
+        gemini_rate_limiter.acquire(request_tokens(payload), priority, timeout=remaining_time())
+    except RateLimitTimeout as e:
+        raise DeadlineExceeded("Request deadline ran out waiting for Gemini quota") from e
+
+
+async def admit_gemini_async(payload: Dict[str, Any], priority: Optional[int]) -> None:
+    """Async counterpart of admit_gemini"""
+    try:
+        await gemini_rate_limiter.acquire_async(request_tokens(payload), priority, timeout=remaining_time())
+    except RateLimitTimeout as e:
+        raise DeadlineExceeded("Request deadline ran out waiting for Gemini quota") from e
+
+
+def request_tokens(payload: Dict[str, Any]) -> int:
+    """Tokens a generateContent call may use: its prompt plus the output allowance"""
+    prompt = "".join(part.get('text', '') for content in payload['contents'] for part in content['parts'])
+    return estimate_tokens(prompt) + int(payload.get('generationConfig', {}).get('maxOutputTokens', 0))
+
+
+class GeminiRequests:
+    """URL, header and payload construction shared by the sync and async Gemini clients"""
+
+    api_key: str
+    model: str
+
+    def url(self, method: str = "generateContent") -> str:
+        return f"{GEMINI_BASE_URL}/{self.model}:{method}"
+
+    def headers(self) -> Dict[str, str]:
+        return {"Content-Type": "application/json", "x-goog-api-key": self.api_key}
+
+    def build_payload(self, prompt: str, generation_config: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": generation_config,
+        }
+
+
+class GeminiClient(GeminiRequests):
+    """Pooled client for Gemini generateContent calls"""
+
+    def __init__(self, api_key: str, model: str = GEMINI_MODEL, session: Optional[requests.Session] = None):
+        self.api_key = api_key
+        self.model = model
+        self.session = session or build_session()
+        self.timeout = (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)
+
+    def generate(self, prompt: str, generation_config: Dict[str, Any], priority: Optional[int] = None) -> Dict[str, Any]:
+        """Return the raw generateContent response, raising LLMError on a non-200 status"""
+        payload = self.build_payload(prompt, generation_config)
+        if not LLM_SINGLE_FLIGHT:
+            return self._generate(payload, priority)
+        key = flight_key(self.api_key, self.url(), payload)
+        return sync_flights.do(key, lambda: self._generate(payload, priority))
+
+    def _generate(self, payload: Dict[str, Any], priority: Optional[int]) -> Dict[str, Any]:
+        admit = functools.partial(admit_gemini, payload, priority)
+        response = call_through(
+            gemini_breaker,
+            lambda: post_with_retries(self.session, self.url(), payload, self.headers(), self.timeout, admit=admit),
+            admit,
+        )
+        if response.status_code != 200:
+            raise LLMError(
+                f"Gemini API error: {response.status_code}",
+                status_code=response.status_code,
+                body=response.text,
+            )
+        return response.json()
+
+    def generate_text(self, prompt: str, generation_config: Dict[str, Any], priority: Optional[int] = None) -> str:
+        """Return the generated text, raising LLMError if the response has none"""
+        text = extract_text(self.generate(prompt, generation_config, priority))
+        if text is None:
+            raise LLMError("Gemini API returned an empty response")
+        return text
+
+    def generate_json(
+        self, prompt: str, generation_config: Dict[str, Any], schema: Dict[str, Any], on_value=None, priority: Optional[int] = None
+    ) -> Any:
+        """
+        Stream a JSON-mode completion constrained by schema and return the validated
+        value; on_value(key, value) sees each top-level part as soon as it arrives.
+        Raises LLMError, or StructuredOutputError holding the valid parts so far.
+        """
+        config = json_generation_config(generation_config, schema)
+        led = []
+
+        def run():
+            # Only the leader runs this; the parts and any failure travel with the outcome
+            led.append(True)
+            parts = []
+            parser = IncrementalJSONParser(schema, record_parts(parts, on_value))
+            try:
+                for text in self.stream_text(prompt, config, priority):
+                    parser.feed(text)
+                return parts, parser.close(), None
+            except DeadlineExceeded:
+                raise
+            except (LLMError, StructuredOutputError) as e:
+                return parts, None, e
+
+        if not LLM_SINGLE_FLIGHT:
+            return settle_json_flight(run(), True, on_value)
+        key = flight_key(self.api_key, self.url('streamGenerateContent'), self.build_payload(prompt, config))
+        return settle_json_flight(sync_flights.do(key, run), bool(led), on_value)
+
+    def stream_text(self, prompt: str, generation_config: Dict[str, Any], priority: Optional[int] = None) -> Iterator[str]:
+        """
+        Yield text chunks from streamGenerateContent as they arrive.
+        Retries only apply before the stream opens; a mid-stream failure raises LLMError.
+        """
+        payload = self.build_payload(prompt, generation_config)
+        admit = functools.partial(admit_gemini, payload, priority)
+        response = call_through(
+            gemini_breaker,
+            lambda: post_with_retries(
+                self.session, f"{self.url('streamGenerateContent')}?alt=sse",
+                payload, self.headers(), self.timeout,
+                stream=True, admit=admit,
+            ),
+            admit,
+        )
+        with response:
+            if response.status_code != 200:
+                raise LLMError(
+                    f"Gemini API error: {response.status_code}",
+                    status_code=response.status_code,
+                    body=response.text,
+                )
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    check_deadline()
+                    if not line or not line.startswith('data:'):
+                        continue
+                    text = extract_text(json.loads(line[5:].strip()))
+                    if text:
+                        yield text
+            except (requests.RequestException, ValueError) as e:
+                check_deadline()
+                raise LLMError(f"Gemini stream interrupted: {e}") from e
+
+
+def openai_headers(api_key: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+
+class OpenAIClient:
+    """Pooled client for the OpenAI image generation API"""
+
+    def __init__(self, api_key: str, session: Optional[requests.Session] = None):
+        self.api_key = api_key
+        self.session = session or build_session()
+        self.timeout = (LLM_CONNECT_TIMEOUT, OPENAI_IMAGE_READ_TIMEOUT)
+
+    def headers(self) -> Dict[str, str]:
+        return openai_headers(self.api_key)
+
+    def generate_image(self, prompt: str, **params: Any) -> Dict[str, Any]:
+        """Return the raw images/generations response, raising LLMError on a non-200 status"""
+        payload = {"prompt": prompt, **params}
+        if not LLM_SINGLE_FLIGHT:
+            return self._generate_image(payload)
+        key = flight_key(self.api_key, "images/generations", payload)
+        return sync_flights.do(key, lambda: self._generate_image(payload))
+
+    def _generate_image(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = call_through(openai_breaker, lambda: post_with_retries(
+            self.session, f"{OPENAI_BASE_URL}/images/generations", payload,
+            self.headers(), self.timeout,
+        ))
+        if response.status_code != 200:
+            raise LLMError(
+                f"OpenAI API error: {response.status_code}",
+                status_code=response.status_code,
+                body=response.text,
+            )
+        return response.json()
+
+
+def build_async_client(pool_size: int = LLM_ASYNC_POOL_SIZE) -> httpx.AsyncClient:
+    """Create a keep-alive async HTTP client allowing pool_size concurrent connections"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+    )
+
+
+def clip_timeout(timeout: httpx.Timeout, limit: float) -> httpx.Timeout:
+    """timeout with every phase capped at limit seconds"""
+    def clip(value):
+        return limit if value is None else min(value, limit)
+    return httpx.Timeout(connect=clip(timeout.connect), read=clip(timeout.read), write=clip(timeout.write), pool=clip(timeout.pool))
+
+
+async def async_post_with_retries(
+    client: httpx.AsyncClient,
+    url: str,
+    payload: Dict[str, Any],
+    headers: Dict[str, str],
+    timeout: httpx.Timeout,
+    max_retries: int = LLM_MAX_RETRIES,
+    stream: bool = False,
+    admit: Optional[Callable[[], Awaitable[Any]]] = None,
+) -> httpx.Response:
+    """Async counterpart of post_with_retries; a streamed response must be closed by the caller"""
+    attempt = 0
+    while True:
+        if attempt and admit is not None:
+            await admit()
+        remaining = remaining_time()
+        check_deadline()
+        attempt_timeout = timeout if remaining is None else clip_timeout(timeout, remaining)
+        request = client.build_request("POST", url, headers=headers, json=payload, timeout=attempt_timeout)
+        try:
+            response = await client.send(request, stream=stream)
+        except httpx.TransportError as e:
+            if isinstance(e, httpx.TimeoutException) and deadline_reached():
+                raise DeadlineExceeded() from e
+            delay = backoff_delay(attempt)
+            if attempt >= max_retries or not time_to_retry(delay):
+                raise LLMError(f"Request to {url.split('?')[0]} failed: {e}") from e
+            logger.warning(f"LLM request error ({e}), retrying in {delay:.2f}s")
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                return response
+            delay = backoff_delay(attempt, response.headers.get('Retry-After'))
+            if not time_to_retry(delay):
+                return response
+            await response.aclose()
+            logger.warning(f"LLM request returned {response.status_code}, retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def _raise_for_status(response: httpx.Response, api: str) -> None:
+    if response.status_code != 200:
+        body = (await response.aread()).decode('utf-8', errors='replace')
+        raise LLMError(f"{api} API error: {response.status_code}", status_code=response.status_code, body=body)
+
+
+class AsyncGeminiClient(GeminiRequests):
+    """Gemini client for the async serving mode; awaits outbound HTTP instead of blocking a thread"""
+
+    def __init__(self, api_key: str, model: str = GEMINI_MODEL, client: Optional[httpx.AsyncClient] = None):
+        self.api_key = api_key
+        self.model = model
+        self.client = client or build_async_client()
+        self.timeout = httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+    async def generate(self, prompt: str, generation_config: Dict[str, Any], priority: Optional[int] = None) -> Dict[str, Any]:
+        """Return the raw generateContent response, raising LLMError on a non-200 status"""
+        payload = self.build_payload(prompt, generation_config)
+        if not LLM_SINGLE_FLIGHT:
+            return await self._generate(payload, priority)
+        key = flight_key(self.api_key, self.url(), payload)
+        return await async_flights.do(key, lambda: self._generate(payload, priority))
+
+    async def _generate(self, payload: Dict[str, Any], priority: Optional[int]) -> Dict[str, Any]:
+        admit = functools.partial(admit_gemini_async, payload, priority)
+        response = await async_call_through(
+            gemini_breaker,
+            lambda: async_post_with_retries(self.client, self.url(), payload, self.headers(), self.timeout, admit=admit),
+            admit,
+        )
+        await _raise_for_status(response, "Gemini")
+        return response.json()
+
+    async def generate_text(self, prompt: str, generation_config: Dict[str, Any], priority: Optional[int] = None) -> str:
+        """Return the generated text, raising LLMError if the response has none"""
+        text = extract_text(await self.generate(prompt, generation_config, priority))
+        if text is None:
+            raise LLMError("Gemini API returned an empty response")
+        return text
+
+    async def generate_json(
+        self, prompt: str, generation_config: Dict[str, Any], schema: Dict[str, Any], on_value=None, priority: Optional[int] = None
+    ) -> Any:
+        """Async counterpart of GeminiClient.generate_json"""
+        config = json_generation_config(generation_config, schema)
+        led = []
+
+        async def run():
+            led.append(True)
+            parts = []
+            parser = IncrementalJSONParser(schema, record_parts(parts, on_value))
+            try:
+                async for text in self.stream_text(prompt, config, priority):
+                    parser.feed(text)
+                return parts, parser.close(), None
+            except DeadlineExceeded:
+                raise
+            except (LLMError, StructuredOutputError) as e:
+                return parts, None, e
+
+        if not LLM_SINGLE_FLIGHT:
+            return settle_json_flight(await run(), True, on_value)
+        key = flight_key(self.api_key, self.url('streamGenerateContent'), self.build_payload(prompt, config))
+        return settle_json_flight(await async_flights.do(key, run), bool(led), on_value)
+
+    async def stream_text(self, prompt: str, generation_config: Dict[str, Any], priority: Optional[int] = None) -> AsyncIterator[str]:
+        """Yield text chunks from streamGenerateContent as they arrive"""
+        payload = self.build_payload(prompt, generation_config)
+        admit = functools.partial(admit_gemini_async, payload, priority)
+        response = await async_call_through(
+            gemini_breaker,
+            lambda: async_post_with_retries(
+                self.client, f"{self.url('streamGenerateContent')}?alt=sse",
+                payload, self.headers(), self.timeout,
+                stream=True, admit=admit,
+            ),
+            admit,
+        )
+        try:
+            await _raise_for_status(response, "Gemini")
+            async for line in response.aiter_lines():
+                check_deadline()
+                if not line or not line.startswith('data:'):
+                    continue
+                text = extract_text(json.loads(line[5:].strip()))
+                if text:
+                    yield text
+        except (httpx.HTTPError, ValueError) as e:
+            check_deadline()
+            raise LLMError(f"Gemini stream interrupted: {e}") from e
+        finally:
+            await response.aclose()
+
+
+class AsyncOpenAIClient:
+    """OpenAI image client for the async serving mode"""
+
+    def __init__(self, api_key: str, client: Optional[httpx.AsyncClient] = None):
+        self.api_key = api_key
+        self.client = client or build_async_client()
+        self.timeout = httpx.Timeout(OPENAI_IMAGE_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+    async def generate_image(self, prompt: str, **params: Any) -> Dict[str, Any]:
+        """Return the raw images/generations response, raising LLMError on a non-200 status"""
+        payload = {"prompt": prompt, **params}
+        if not LLM_SINGLE_FLIGHT:
+            return await self._generate_image(payload)
+        key = flight_key(self.api_key, "images/generations", payload)
+        return await async_flights.do(key, lambda: self._generate_image(payload))
+
+    async def _generate_image(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = await async_call_through(openai_breaker, lambda: async_post_with_retries(
+            self.client, f"{OPENAI_BASE_URL}/images/generations", payload,
+            openai_headers(self.api_key), self.timeout,
+        ))
+        await _raise_for_status(response, "OpenAI")
+        return response.json()
+
+
+_clients: Dict[tuple, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(kind: str, api_key: str, factory):
+    key = (kind, api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory(api_key)
+        return client
+
+
+def get_gemini_client(api_key: str) -> GeminiClient:
+    """Process-wide Gemini client, so every endpoint shares one connection pool"""
+    return _get_client('gemini', api_key, GeminiClient)
+
+
+def get_openai_client(api_key: str) -> OpenAIClient:
+    """Process-wide OpenAI client, so every endpoint shares one connection pool"""
+    return _get_client('openai', api_key, OpenAIClient)
+
+
+def get_async_gemini_client(api_key: str) -> AsyncGeminiClient:
+    """Process-wide async Gemini client; must be first used from the serving event loop"""
+    return _get_client('gemini-async', api_key, AsyncGeminiClient)
+
+
+def get_async_openai_client(api_key: str) -> AsyncOpenAIClient:
+    """Process-wide async OpenAI client; must be first used from the serving event loop"""
+    return _get_client('openai-async', api_key, AsyncOpenAIClient)
+
+
+async def close_async_clients() -> None:
+    """Close the pools of every async client (called on ASGI shutdown)"""
+    with _clients_lock:
+        clients = [(key, client) for key, client in _clients.items() if key[0].endswith('-async')]
+        for key, _ in clients:
+            del _clients[key]
+    for _, client in clients:
+        await client.client.aclose()
@@ -0,0 +1,142 @@
+"""
+LLM orchestration written once for the threaded and the async server.
+
+A flow is a generator that yields the operations it needs and receives their
+results: a Gemini completion (Generate, GenerateJson), blocking work such as
+analysis cache reads and writes (Blocking), or several sub-flows at once
+(Parallel). An exception raised by an operation is thrown into the flow at
+its yield, so flows handle failures with ordinary try/except.
+
+run_flow performs the operations on a GeminiClient in the calling thread
+(sub-flows on a thread pool); run_flow_async awaits an AsyncGeminiClient and
+moves blocking work to a worker thread, so the event loop never waits on disk.
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generator, List, Optional
+
+Flow = Generator[Any, Any, Any]
+
+
+class Generate:
+    """Text of a Gemini completion"""
+
+    __slots__ = ("prompt", "generation_config")
+
+    def __init__(self, prompt: str, generation_config: Dict[str, Any]):
+        self.prompt = prompt
+        self.generation_config = generation_config
+
+
+class GenerateJson:
+    """Schema-validated JSON completion; on_value(key, value) sees each top-level part as it arrives"""
+
+    __slots__ = ("prompt", "generation_config", "schema", "on_value")
+
+    def __init__(
+        self, prompt: str, generation_config: Dict[str, Any], schema: Dict[str, Any],
+        on_value: Optional[Callable[[Any, Any], None]] = None,
+    ):
+        self.prompt = prompt
+        self.generation_config = generation_config
+        self.schema = schema
+        self.on_value = on_value
+
+
+class Blocking:
+    """fn(*args), for work (disk, SQLite) that must not run on the event loop"""
+
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn: Callable[..., Any], *args: Any):
+        self.fn = fn
+        self.args = args
+
+
+class Parallel:
+    """Results of the sub-flows, in order; the threaded runner uses up to max_workers threads"""
+
+    __slots__ = ("flows", "max_workers")
+
+    def __init__(self, flows: List[Flow], max_workers: int = 1):
+        self.flows = flows
+        self.max_workers = max_workers
+
+
+def run_flow(flow: Flow, client) -> Any:
+    """Run a flow to completion on a GeminiClient"""
+    value, error = None, None
+    try:
+        while True:
+            try:
+                operation = flow.send(value) if error is None else flow.throw(error)
+            except StopIteration as done:
+                return done.value
+            value, error = None, None
+            try:
+                value = perform(operation, client)
+            except Exception as e:
+                error = e
+    finally:
+        flow.close()
+
+
+def perform(operation, client) -> Any:
+    if isinstance(operation, Generate):
+        return client.generate_text(operation.prompt, operation.generation_config)
+    if isinstance(operation, GenerateJson):
+        return client.generate_json(
+            operation.prompt, operation.generation_config, operation.schema, on_value=operation.on_value
+        )
+    if isinstance(operation, Blocking):
+        return operation.fn(*operation.args)
+    if isinstance(operation, Parallel):
+        workers = min(operation.max_workers, len(operation.flows))
+        if workers <= 1:
+            return [run_flow(flow, client) for flow in operation.flows]
+        # Pool threads run in a copy of this context, keeping the deadline and rate-limit priority
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda flow: context.copy().run(run_flow, flow, client), operation.flows))
+    raise TypeError(f"unknown flow operation {operation!r}")
+
+
+async def run_flow_async(flow: Flow, client, semaphore: Optional[asyncio.Semaphore] = None) -> Any:
+    """Run a flow to completion on an AsyncGeminiClient; semaphore, if given, bounds concurrent Gemini calls"""
+    value, error = None, None
+    try:
+        while True:
+            try:
+                operation = flow.send(value) if error is None else flow.throw(error)
+            except StopIteration as done:
+                return done.value
+            value, error = None, None
+            try:
+                value = await perform_async(operation, client, semaphore)
+            except Exception as e:
+                error = e
+    finally:
+        flow.close()
+
+
+async def perform_async(operation, client, semaphore: Optional[asyncio.Semaphore]) -> Any:
+    if isinstance(operation, (Generate, GenerateJson)):
+        if semaphore is None:
+            return await generate_async(operation, client)
+        async with semaphore:
+            return await generate_async(operation, client)
+    if isinstance(operation, Blocking):
+        return await asyncio.to_thread(operation.fn, *operation.args)
+    if isinstance(operation, Parallel):
+        return list(await asyncio.gather(*(run_flow_async(flow, client, semaphore) for flow in operation.flows)))
+    raise TypeError(f"unknown flow operation {operation!r}")
+
+
+async def generate_async(operation, client) -> Any:
+    if isinstance(operation, Generate):
+        return await client.generate_text(operation.prompt, operation.generation_config)
+    return await client.generate_json(
+        operation.prompt, operation.generation_config, operation.schema, on_value=operation.on_value
+    )
@@ -1,6 +1,10 @@
+import base64
+import json
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
+import numpy as np
 from datetime import datetime, timedelta
+from ad_store import AdStore, AdQuery
 
 # Mock Ads Dataset
 MOCK_ADS = [
@@ -305,6 +309,40 @@ MOCK_ADS = [
     }
 ]
 
+# Columnar store with search index, built once at load time
+AD_STORE = AdStore(MOCK_ADS)
+
+def build_ad_query(
+    search_query: str = "",
+    countries: List[str] = None,
+    business_types: List[str] = None,
+    categories: List[str] = None,
+    min_spend: int = 0,
+    max_spend: int = 100000,
+    min_impressions: int = 0,
+    max_impressions: int = 1000000,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> AdQuery:
+    """
+    Compile filter arguments into a query against AD_STORE.
+    The search query matches ads containing it (case-insensitively) in the
+    creative body, business type, category or target audience.
+    """
+    return AD_STORE.compile(
+        search_query=search_query,
+        filters={
+            "country": countries,
+            "business_type": business_types,
+            "category": categories,
+        },
+        ranges={
+            "spend": (min_spend, max_spend),
+            "impressions": (min_impressions, max_impressions),
+        },
+        date_ranges={"created_date": (start_date, end_date)},
+    )
+
 def filter_ads(
     search_query: str = "",
     countries: List[str] = None,
@@ -315,60 +353,113 @@ def filter_ads(
     min_impressions: int = 0,
     max_impressions: int = 1000000,
     limit: int = 12,
-    offset: int = 0
+    offset: int = 0,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """
     Filter and search through mock ads data
     """
-    filtered_ads = MOCK_ADS.copy()
-    
-    # Search by query (case-insensitive)
-    if search_query:
-        search_query = search_query.lower()
-        filtered_ads = [
-            ad for ad in filtered_ads
-            if (search_query in ad["ad_creative_body"].lower() or
-                search_query in ad["business_type"].lower() or
-                search_query in ad["category"].lower() or
-                search_query in ad["target_audience"].lower())
-        ]
-    
-    # Filter by countries
-    if countries:
-        filtered_ads = [ad for ad in filtered_ads if ad["country"] in countries]
-    
-    # Filter by business types
-    if business_types:
-        filtered_ads = [ad for ad in filtered_ads if ad["business_type"] in business_types]
-    
-    # Filter by categories
-    if categories:
-        filtered_ads = [ad for ad in filtered_ads if ad["category"] in categories]
-    
-    # Filter by spend range
-    filtered_ads = [
-        ad for ad in filtered_ads
-        if min_spend <= ad["spend"] <= max_spend
-    ]
-    
-    # Filter by impressions range
-    filtered_ads = [
-        ad for ad in filtered_ads
-        if min_impressions <= ad["impressions"] <= max_impressions
-    ]
+    query = build_ad_query(
+        search_query, countries, business_types, categories,
+        min_spend, max_spend, min_impressions, max_impressions,
+        start_date, end_date
+    )
     
     # Apply pagination
-    start_index = offset
-    end_index = start_index + limit
-    paginated_ads = filtered_ads[start_index:end_index]
-    
-    return paginated_ads
+    return page_ads(query, limit, offset)
+
+def page_ads(query: AdQuery, limit: int = 12, offset: int = 0) -> List[Dict[str, Any]]:
+    """Offset-paginated ads matching a compiled query"""
+    return AD_STORE.page(query, limit, offset)
+
+def encode_cursor(row: int) -> str:
+    """Opaque cursor pointing just past the given row"""
+    payload = json.dumps({"after": int(row)}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """Row id encoded in a cursor; raises ValueError if the cursor is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["after"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(after, int) or after < -1:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return after
+
+def filter_ads_page(
+    query: AdQuery,
+    cursor: Optional[str] = None,
+    limit: int = 12,
+    include_total: bool = False,
+    include_facets: bool = False
+) -> Dict[str, Any]:
+    """
+    Keyset-paginated search over AD_STORE in dataset order.
+    Pass the returned next_cursor to fetch the following page; an empty or
+    missing cursor starts from the beginning. With include_facets the total,
+    the facet counts of the matching ads and the page all come from one mask.
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    after = decode_cursor(cursor) if cursor else -1
+    if include_facets:
+        mask = AD_STORE.mask(query)
+        matching = np.flatnonzero(mask)
+        start = int(np.searchsorted(matching, after, side="right"))
+        rows = matching[start:start + limit]
+        has_more = start + limit < len(matching)
+    else:
+        rows, has_more = AD_STORE.seek(query, after, limit)
+    page = {
+        "ads": AD_STORE.materialize(rows),
+        "next_cursor": encode_cursor(rows[-1]) if has_more and len(rows) else None,
+        "has_more": bool(has_more),
+    }
+    if include_facets:
+        page["total"] = len(matching)
+        page["facets"] = AD_STORE.facet_counts(mask=mask)
+    elif include_total:
+        page["total"] = AD_STORE.count(query)
+    return page
+
+# Whole-dataset facet counts, recomputed only when AD_STORE.version changes
+_facet_cache: Dict[str, Any] = {"version": None, "facets": {}}
+
+def get_facets() -> Dict[str, List[Dict[str, Any]]]:
+    """Value counts for every categorical field across the whole dataset"""
+    if _facet_cache["version"] != AD_STORE.version:
+        _facet_cache["facets"] = AD_STORE.facet_counts()
+        _facet_cache["version"] = AD_STORE.version
+    return _facet_cache["facets"]
+
+def get_dataset_version() -> str:
+    """Content version of the current dataset"""
+    return AD_STORE.version
+
+def iter_ads(chunk_rows: int = 1024) -> Iterator[Dict[str, Any]]:
+    """Every ad in the current dataset, in row order, materialized chunk_rows at a time"""
+    store = AD_STORE
+    for start in range(0, store.size, chunk_rows):
+        yield from store.materialize(range(start, min(start + chunk_rows, store.size)))
+
+def count_ads() -> int:
+    """Number of ads in the current dataset"""
+    return AD_STORE.size
+
+def load_ads(ads: List[Dict[str, Any]]) -> None:
+    """Replace the dataset and rebuild the store; cached facets are invalidated by the new version"""
+    global MOCK_ADS, AD_STORE
+    MOCK_ADS = ads
+    AD_STORE = AdStore(ads)
 
 def get_unique_values(field: str) -> List[str]:
     """
-    Get unique values for a specific field (for filters)
+    Get unique values for a specific field (for filters), in alphabetical order
     """
-    return list(set(ad[field] for ad in MOCK_ADS))
+    return sorted(facet["value"] for facet in get_facets()[field])
 
 def get_business_types() -> List[str]:
     """Get all unique business types"""
@@ -0,0 +1,167 @@
+"""
+Chat prompt assembly under a token budget.
+
+The system prompts are built once at import and their token cost measured
+once per template. Each request then only renders the variable sections
+(user context, recent history, question), trimming them to fit the
+template's budget: oversized messages are truncated and the oldest history
+is folded into a one-line summary, then dropped, before anything newer.
+"""
+
+from typing import Any, Dict, List, Optional
+
+# Gemini averages roughly four characters of English text per token
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = " …[truncated]"
+
+_EXPERTISE = """You are AdVision AI, a professional Marketing, Advertising, and Campaign Product Manager expert. You specialize in:
+
+**Core Expertise:**
+- Digital marketing strategy and campaign planning
+- Social media advertising (Meta, Google, TikTok, LinkedIn)
+- Performance marketing and ROI optimization
+- Brand strategy and positioning
+- Marketing analytics and data-driven insights
+- Creative campaign development
+- Customer acquisition and retention strategies
+- Marketing automation and funnel optimization
+
+**Your Communication Style:**
+- Professional yet approachable
+- Data-driven with practical insights
+- Ask clarifying questions to understand context
+- Provide actionable recommendations
+- Use industry terminology appropriately
+- Share relevant examples and case studies when helpful
+
+**Conversation Flow:**
+- Greet users warmly and introduce yourself as AdVision AI
+- Ask about their business, industry, or specific marketing challenges
+- Gather relevant context (budget, timeline, goals, current performance)
+- Provide tailored, actionable advice
+- Ask follow-up questions to dive deeper
+- Offer next steps or additional resources when appropriate
+
+**Response Guidelines:**
+- Keep responses concise but comprehensive
+- Focus ONLY on marketing, advertising, and campaign management topics
+- If asked about non-marketing topics, politely redirect to marketing-related subjects
+- Use bullet points and structured responses for complex topics
+- Include specific metrics, benchmarks, or industry standards when relevant
+- Always maintain a helpful, professional tone
+
+"""
+
+_CONTEXT_MANAGEMENT = """**Context Management:**
+- Remember user's business type, industry, budget, and goals
+- Reference previous conversation context when appropriate
+- Build on previous recommendations and insights
+- Ask follow-up questions based on what you've learned about their situation
+
+"""
+
+_REMINDER = "Remember: You are a marketing expert assistant. Stay focused on helping users with their marketing, advertising, and campaign needs."
+
+# Professional marketing expert system prompt
+SYSTEM_PROMPT = _EXPERTISE + _REMINDER
+
+# Same prompt for context-aware chat
+CONTEXT_SYSTEM_PROMPT = _EXPERTISE + _CONTEXT_MANAGEMENT + _REMINDER
+
+
+def estimate_tokens(text: str) -> int:
+    """Local estimate of the token count of text (no tokenizer round trip)"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """text cut down to about max_tokens, marked as truncated if anything was removed"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    keep = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER))
+    return text[:keep].rstrip() + TRUNCATION_MARKER
+
+
+class ChatPromptTemplate:
+    """System prompt plus budgeted context, history and question sections"""
+
+    def __init__(
+        self,
+        system_prompt: str,
+        budget: int,
+        max_history_messages: int = 6,
+        max_message_tokens: int = 400,
+        max_question_tokens: int = 1000,
+        max_context_tokens: int = 300,
+        summary_tokens: int = 100,
+    ):
+        self.system_prompt = system_prompt
+        self.system_tokens = estimate_tokens(system_prompt)
+        self.budget = budget
+        self.max_history_messages = max_history_messages
+        self.max_message_tokens = max_message_tokens
+        self.max_question_tokens = max_question_tokens
+        self.max_context_tokens = max_context_tokens
+        self.summary_tokens = summary_tokens
+
+    def render(self, question: str, context_info: str = "", history: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Full prompt for one turn, estimated to fit within the budget"""
+        lines = [
+            self.format_message(msg) for msg in (history or [])[-self.max_history_messages:] if isinstance(msg, dict)
+        ]
+        return self.render_lines(question, context_info, lines)
+
+    def render_lines(self, question: str, context_info: str, lines: List[str]) -> str:
+        """Like render, with the history already formatted by format_message"""
+        question = truncate_to_tokens(str(question), self.max_question_tokens)
+        context_info = truncate_to_tokens(context_info, self.max_context_tokens)
+        tail = f"\n\nUser: {question}\n\nAdVision AI:"
+        remaining = self.budget - self.system_tokens - estimate_tokens(context_info) - estimate_tokens(tail)
+        conversation_text = self.render_history(lines[-self.max_history_messages:], remaining)
+        return f"{self.system_prompt}{context_info}{conversation_text}{tail}"
+
+    def render_history(self, lines: List[str], budget: int) -> str:
+        """
+        Most recent message lines that fit in budget tokens, oldest first. Older
+        lines that do not fit are summarized in a single leading line.
+        """
+        if not lines:
+            return ""
+        header = "\n\n**Previous Conversation:**\n"
+        budget -= estimate_tokens(header)
+
+        kept: List[str] = []
+        used = 0
+        for line in reversed(lines):
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        # Give up the oldest kept messages until the summary of the rest fits
+        while kept and len(kept) < len(lines) and budget - used < self.summary_tokens:
+            used -= estimate_tokens(kept.pop())
+        kept.reverse()
+
+        dropped = lines[:len(lines) - len(kept)]
+        if dropped:
+            summary = self.summarize(dropped, min(self.summary_tokens, budget - used))
+            if summary:
+                kept.insert(0, summary)
+        if not kept:
+            return ""
+        return header + "".join(kept)
+
+    def format_message(self, msg: Dict[str, Any]) -> str:
+        """One history message as a prompt line, truncated to max_message_tokens"""
+        role = "User" if msg.get('role') == 'user' else "AdVision AI"
+        content = truncate_to_tokens(str(msg.get('content', '')), self.max_message_tokens)
+        return f"{role}: {content}\n"
+
+    @staticmethod
+    def summarize(lines: List[str], max_tokens: int) -> str:
+        """One-line digest of dropped messages: the opening words of each"""
+        if max_tokens <= 0:
+            return ""
+        openings = "; ".join(" ".join(line.split()[:12]) for line in lines)
+        return truncate_to_tokens(f"(Earlier, summarized) {openings}", max_tokens - 1) + "\n"
@@ -0,0 +1,273 @@
+"""
+Process-wide, priority-aware rate limiting of outbound Gemini calls.
+
+Two token buckets hold the per-minute request and token quota. A call
+waits in a priority queue until it is first in line and both buckets can
+cover it, so chat is served before strategy/insights, and those before
+bulk analysis; lower-priority work queues rather than failing. Threads and
+asyncio tasks wait in the same queue.
+
+The priority of a call is the one passed explicitly, else the current
+context's (set with the with_priority decorator on a handler), else BULK.
+"""
+
+import asyncio
+import functools
+import heapq
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+CHAT = 0
+INTERACTIVE = 1
+BULK = 2
+PRIORITY_NAMES = {CHAT: "chat", INTERACTIVE: "interactive", BULK: "bulk"}
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=BULK)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def with_priority(priority: int):
+    """Decorator running a sync or async handler's LLM calls at priority"""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                token = _priority.set(priority)
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    _priority.reset(token)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            token = _priority.set(priority)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _priority.reset(token)
+        return run
+    return decorate
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a call could not be admitted within its timeout"""
+
+
+class TokenBucket:
+    """Holds up to one minute of quota, refilled continuously (limit 0 = unlimited)"""
+
+    __slots__ = ("limit", "rate", "level", "updated")
+
+    def __init__(self, per_minute: float):
+        self.limit = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.limit, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def cost(self, amount: float) -> float:
+        # A call larger than the whole bucket is admitted once the bucket is full
+        return min(amount, self.limit)
+
+    def delay(self, amount: float) -> float:
+        """Seconds until amount is available (0 if it is now)"""
+        if not self.limit:
+            return 0.0
+        missing = self.cost(amount) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        if self.limit:
+            self.level -= self.cost(amount)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "enqueued", "wake")
+
+    def __init__(self, priority: int, seq: int, tokens: int, wake: Callable[[], None]):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.wake = wake
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _PriorityStats:
+    __slots__ = ("admitted", "queued", "abandoned", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.admitted = 0
+        self.queued = 0
+        self.abandoned = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class PriorityRateLimiter:
+    """Requests/min and tokens/min limits shared by every caller, admitted in priority order"""
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {priority: _PriorityStats() for priority in PRIORITY_NAMES}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests.limit or self.tokens.limit)
+
+    def set_limits(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None) -> None:
+        """Replace the request and/or token quota (None keeps the current one), starting with a full bucket"""
+        with self._lock:
+            if requests_per_minute is not None:
+                self.requests = TokenBucket(requests_per_minute)
+            if tokens_per_minute is not None:
+                self.tokens = TokenBucket(tokens_per_minute)
+            head = self._queue[0] if self._queue else None
+        if head is not None:
+            head.wake()
+
+    def acquire(self, tokens: int, priority: Optional[int] = None, timeout: Optional[float] = None) -> float:
+        """Block until a call of about tokens tokens may start; returns the seconds waited"""
+        if not self.enabled:
+            return 0.0
+        event = threading.Event()
+        waiter = self._enqueue(tokens, priority, event.set)
+        deadline = None if timeout is None else waiter.enqueued + timeout
+        try:
+            while True:
+                event.clear()
+                delay = self._admit(waiter)
+                if delay == 0:
+                    return time.monotonic() - waiter.enqueued
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RateLimitTimeout(f"not admitted within {timeout:.1f}s")
+                    delay = remaining if delay is None else min(delay, remaining)
+                event.wait(delay)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    async def acquire_async(self, tokens: int, priority: Optional[int] = None, timeout: Optional[float] = None) -> float:
+        """Async counterpart of acquire(); a cancelled task leaves the queue"""
+        if not self.enabled:
+            return 0.0
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = self._enqueue(tokens, priority, lambda: loop.call_soon_threadsafe(event.set))
+        deadline = None if timeout is None else waiter.enqueued + timeout
+        try:
+            while True:
+                event.clear()
+                delay = self._admit(waiter)
+                if delay == 0:
+                    return time.monotonic() - waiter.enqueued
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RateLimitTimeout(f"not admitted within {timeout:.1f}s")
+                    delay = remaining if delay is None else min(delay, remaining)
+                try:
+                    await asyncio.wait_for(event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    def _enqueue(self, tokens: int, priority: Optional[int], wake: Callable[[], None]) -> _Waiter:
+        priority = current_priority() if priority is None else priority
+        with self._lock:
+            waiter = _Waiter(priority, next(self._seq), tokens, wake)
+            heapq.heappush(self._queue, waiter)
+            return waiter
+
+    def _admit(self, waiter: _Waiter) -> Optional[float]:
+        """0 if waiter was admitted, else seconds to wait (None = until woken)"""
+        with self._lock:
+            if self._queue[0] is not waiter:
+                return None
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            delay = max(self.requests.delay(1), self.tokens.delay(waiter.tokens))
+            if delay > 0:
+                return delay
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            heapq.heappop(self._queue)
+            self._record(waiter, now - waiter.enqueued)
+            head = self._queue[0] if self._queue else None
+        if head is not None:
+            head.wake()
+        return 0
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter not in self._queue:
+                return
+            was_head = self._queue[0] is waiter
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+            self._stats[waiter.priority].abandoned += 1
+            head = self._queue[0] if was_head and self._queue else None
+        if head is not None:
+            head.wake()
+
+    def _record(self, waiter: _Waiter, waited: float) -> None:
+        stats = self._stats[waiter.priority]
+        stats.admitted += 1
+        if waited > 0.001:
+            stats.queued += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+
+    def stats(self) -> Dict[str, Any]:
+        """Limits, remaining quota, and queue depth and wait times per priority"""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            oldest = {name: 0.0 for name in PRIORITY_NAMES.values()}
+            for waiter in self._queue:
+                name = PRIORITY_NAMES[waiter.priority]
+                depth[name] += 1
+                oldest[name] = max(oldest[name], now - waiter.enqueued)
+            return {
+                "enabled": self.enabled,
+                "requests_per_minute": self.requests.limit,
+                "tokens_per_minute": self.tokens.limit,
+                "available_requests": round(self.requests.level, 1),
+                "available_tokens": round(self.tokens.level),
+                "queue_depth": len(self._queue),
+                "priorities": {
+                    PRIORITY_NAMES[priority]: {
+                        "queued_now": depth[PRIORITY_NAMES[priority]],
+                        "oldest_wait_seconds": round(oldest[PRIORITY_NAMES[priority]], 3),
+                        "admitted": s.admitted,
+                        "delayed": s.queued,
+                        "abandoned": s.abandoned,
+                        "avg_wait_seconds": round(s.wait_total / s.admitted, 3) if s.admitted else 0.0,
+                        "max_wait_seconds": round(s.wait_max, 3),
+                    }
+                    for priority, s in self._stats.items()
+                },
+            }
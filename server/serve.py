@@ -0,0 +1,34 @@
+"""
+Production entry point: serves asgi:app with uvicorn.
+
+    python serve.py
+
+HOST, PORT and WEB_CONCURRENCY (worker processes) come from the environment.
+"""
+
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+HOST = os.getenv('HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', 5001))
+WEB_CONCURRENCY = max(1, int(os.getenv('WEB_CONCURRENCY', 1)))
+
+
+def main():
+    uvicorn.run(
+        "asgi:app",
+        app_dir=SERVER_DIR,
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        proxy_headers=True,
+    )
+
+
+if __name__ == '__main__':
+    main()
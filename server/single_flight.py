@@ -0,0 +1,132 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+While a call for a key is running, later callers with the same key wait for
+it and share its result (or exception) instead of starting their own. The
+key is forgotten as soon as the call finishes, so this only merges
+concurrent duplicates; reuse of finished results is the caches' job.
+
+Exceptions of the types given as unshared describe the leader's own
+circumstances (e.g. its request deadline ran out), not the call: they are
+raised in the leader only, and each waiting follower makes the call again
+itself.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple, Type
+
+
+def flight_key(*parts: Any) -> str:
+    """Canonical hash of JSON-serializable parts (dict key order does not matter)"""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key across threads"""
+
+    def __init__(self, unshared: Tuple[Type[BaseException], ...] = ()):
+        self.unshared = unshared
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.retried = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn, or wait for the identical call already running, and return its result"""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.leaders += 1
+                else:
+                    self.followers += 1
+            if leader:
+                break
+
+            call.done.wait()
+            if call.error is None:
+                return call.result
+            if not isinstance(call.error, self.unshared):
+                raise call.error
+            # The leader's own failure: make the call again (possibly as the new leader)
+            with self._lock:
+                self.retried += 1
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls), "leaders": self.leaders,
+                "coalesced": self.followers, "retried": self.retried,
+            }
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent coroutine calls with the same key on one event loop"""
+
+    def __init__(self, unshared: Tuple[Type[BaseException], ...] = ()):
+        self.unshared = unshared
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.retried = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), or the identical call already running, and return its result"""
+        while True:
+            task = self._tasks.get(key)
+            # A finished task may not have been forgotten yet
+            leader = task is None or task.done()
+            if leader:
+                # The task runs in the leader's context (and so under its deadline)
+                task = self._tasks[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda done: self._forget(key, done))
+                self.leaders += 1
+            else:
+                self.followers += 1
+            try:
+                # Shielded so a caller going away does not cancel the call others wait on
+                return await asyncio.shield(task)
+            except self.unshared:
+                if leader:
+                    raise
+                self.retried += 1
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._tasks), "leaders": self.leaders,
+            "coalesced": self.followers, "retried": self.retried,
+        }
@@ -0,0 +1,221 @@
+"""
+Structured (JSON-mode) output for the analysis, insights and strategy prompts.
+
+Gemini is asked for ``application/json`` constrained by a response schema,
+and the streamed reply is fed to an IncrementalJSONParser. The parser picks
+out each top-level member (or array element) as soon as its closing bracket
+arrives and validates it against the schema, so finished parts can be used
+before the reply ends and malformed output is caught at the first bad part.
+"""
+
+import json
+from typing import Any, Callable, Dict, Optional
+
+
+class StructuredOutputError(ValueError):
+    """Reply did not parse or did not match the schema; partial holds the valid parts seen so far"""
+
+    def __init__(self, message: str, partial: Any = None, text: str = ""):
+        super().__init__(message)
+        self.partial = partial
+        self.text = text
+
+
+def _object(**properties: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "OBJECT", "properties": properties, "required": list(properties)}
+
+
+def _array(items: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "ARRAY", "items": items}
+
+
+def _string(*enum: str) -> Dict[str, Any]:
+    return {"type": "STRING", "enum": list(enum)} if enum else {"type": "STRING"}
+
+
+_NUMBER = {"type": "NUMBER"}
+_STRINGS = _array(_string())
+
+# Same shape as ANALYSIS_JSON_FORMAT in the analysis prompt
+ANALYSIS_SCHEMA = _object(
+    marketingStrategy=_object(primaryStrategy=_string(), callToAction=_string(), valueProposition=_string()),
+    emotionalAnalysis=_object(primaryEmotion=_string(), emotionalScore=_NUMBER, emotionalTriggers=_STRINGS),
+    sentimentAnalysis=_object(
+        overallSentiment=_string("positive", "negative", "neutral"), sentimentScore=_NUMBER, keyPhrases=_STRINGS
+    ),
+    hooks=_object(
+        primaryHook=_string(),
+        hookType=_string("curiosity", "urgency", "social_proof", "fear", "benefit", "story"),
+        hookEffectiveness=_NUMBER,
+    ),
+    performanceMetrics=_object(estimatedEngagement=_NUMBER, conversionPotential=_NUMBER, viralityScore=_NUMBER),
+)
+
+# One analysis per ad, tagged with the ad's prompt ref
+BATCH_ANALYSIS_SCHEMA = _array({
+    **ANALYSIS_SCHEMA,
+    "properties": {"id": _string(), **ANALYSIS_SCHEMA["properties"]},
+    "required": ["id", *ANALYSIS_SCHEMA["required"]],
+})
+
+INSIGHTS_SCHEMA = _object(
+    competitiveAnalysis=_object(strengths=_STRINGS, weaknesses=_STRINGS, opportunities=_STRINGS, threats=_STRINGS),
+    strategicRecommendations=_object(
+        marketingStrategy=_STRINGS, emotionalAppeal=_STRINGS, hookOptimization=_STRINGS, performanceOptimization=_STRINGS
+    ),
+    creativeGuidelines=_object(messaging=_STRINGS, visualElements=_STRINGS, callToAction=_STRINGS, toneOfVoice=_STRINGS),
+    implementationPlan=_object(
+        immediateActions=_STRINGS, shortTermGoals=_STRINGS, longTermStrategy=_STRINGS, successMetrics=_STRINGS
+    ),
+    competitiveAdvantage=_object(
+        uniquePositioning=_string(), differentiationStrategy=_string(), valueProposition=_string(), targetAudience=_string()
+    ),
+)
+
+# Map-reduce findings for very large insights selections
+FINDINGS_SCHEMA = _object(findings=_STRINGS)
+
+STRATEGY_SCHEMA = _object(
+    marketingStrategy=_object(
+        primaryStrategy=_string(), keyMessages=_STRINGS, emotionalAppeal=_string(), hookStrategy=_string()
+    ),
+    creativeElements=_object(headline=_string(), subheadline=_string(), callToAction=_string()),
+)
+
+
+def json_generation_config(generation_config: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+    """generation_config switched to JSON mode under schema"""
+    return {**generation_config, "responseMimeType": "application/json", "responseSchema": schema}
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> None:
+    """Raise StructuredOutputError if value does not match schema"""
+    kind = schema.get("type")
+    if kind == "OBJECT":
+        if not isinstance(value, dict):
+            raise StructuredOutputError(f"{path}: expected an object")
+        for field in schema.get("required", ()):
+            if field not in value:
+                raise StructuredOutputError(f"{path}: missing {field}")
+        for field, field_schema in schema.get("properties", {}).items():
+            if field in value:
+                validate(value[field], field_schema, f"{path}.{field}")
+    elif kind == "ARRAY":
+        if not isinstance(value, list):
+            raise StructuredOutputError(f"{path}: expected an array")
+        for i, item in enumerate(value):
+            validate(item, schema["items"], f"{path}[{i}]")
+    elif kind == "STRING":
+        if not isinstance(value, str):
+            raise StructuredOutputError(f"{path}: expected a string")
+        if "enum" in schema and value not in schema["enum"]:
+            raise StructuredOutputError(f"{path}: {value!r} is not one of {schema['enum']}")
+    elif kind == "NUMBER":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise StructuredOutputError(f"{path}: expected a number")
+
+
+class IncrementalJSONParser:
+    """
+    Streaming parser for a top-level JSON object or array.
+
+    feed() scans only the newly arrived text, tracking string and nesting
+    state; whenever a top-level member or element completes it is decoded on
+    its own, validated and passed to on_value(key_or_index, value).
+    """
+
+    def __init__(self, schema: Dict[str, Any], on_value: Optional[Callable[[Any, Any], None]] = None):
+        self.schema = schema
+        self.on_value = on_value
+        self.is_array = schema.get("type") == "ARRAY"
+        self.result: Any = [] if self.is_array else {}
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._part_start: Optional[int] = None
+        self._parts = 0
+        self._done = False
+
+    def feed(self, chunk: str) -> None:
+        """Consume the next piece of the reply"""
+        self.text += chunk
+        text = self.text
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if self._done:
+                if not char.isspace():
+                    self._fail(f"unexpected data after the JSON value at offset {pos}")
+                continue
+            if self._depth == 0:
+                if char.isspace():
+                    continue
+                if char != ("[" if self.is_array else "{"):
+                    self._fail(f"expected a JSON {'array' if self.is_array else 'object'} at offset {pos}")
+                self._depth = 1
+                self._part_start = pos + 1
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_part(text[self._part_start:pos], closing=True)
+                    self._done = True
+            elif char == "," and self._depth == 1:
+                self._finish_part(text[self._part_start:pos])
+                self._part_start = pos + 1
+        self._pos = len(text)
+
+    def close(self) -> Any:
+        """The complete validated value; raises StructuredOutputError if the reply was cut short"""
+        if not self._done:
+            self._fail("reply ended before the JSON value was complete")
+        if not self.is_array:
+            validate(self.result, {**self.schema, "properties": {}})
+        return self.result
+
+    def _finish_part(self, part: str, closing: bool = False) -> None:
+        if not part.strip():
+            if closing and not self._parts:
+                return  # empty container
+            self._fail("malformed JSON: empty member")
+        self._parts += 1
+        try:
+            if self.is_array:
+                key, value = len(self.result), json.loads(part)
+                validate(value, self.schema["items"], f"$[{key}]")
+                self.result.append(value)
+            else:
+                ((key, value),) = json.loads("{" + part + "}").items()
+                field_schema = self.schema.get("properties", {}).get(key)
+                if field_schema is not None:
+                    validate(value, field_schema, f"$.{key}")
+                self.result[key] = value
+        except StructuredOutputError as e:
+            self._fail(str(e))
+        except ValueError as e:
+            self._fail(f"malformed JSON: {e}")
+        if self.on_value is not None:
+            self.on_value(key, value)
+
+    def _fail(self, message: str) -> None:
+        raise StructuredOutputError(message, partial=self.result, text=self.text)
+
+
+def parse_json(text: str, schema: Dict[str, Any]) -> Any:
+    """Parse and validate a complete JSON-mode reply"""
+    parser = IncrementalJSONParser(schema)
+    parser.feed(text)
+    return parser.close()
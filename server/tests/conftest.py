@@ -0,0 +1,26 @@
+"""
+Shared setup for the server test suite (run `python -m pytest` from server/).
+
+The environment is fixed before any server module is imported: a dummy
+Gemini key, no disk tiers, and asset/job data in a temporary directory.
+No test talks to a real upstream; HTTP calls are stubbed per test.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("GEMINI_APIKEY", "test-key")
+os.environ["ANALYSIS_CACHE_PATH"] = ""
+os.environ["IMAGE_STORE_PATH"] = tempfile.mkdtemp(prefix="image-assets-")
+os.environ["JOB_BACKEND"] = "memory"
+os.environ["HEURISTIC_SEED"] = "7"
+
+import pytest
+
+import llm_client
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Retry immediately instead of sleeping out the backoff"""
+    monkeypatch.setattr(llm_client, "backoff_delay", lambda attempt, retry_after=None: 0.0)
@@ -0,0 +1,52 @@
+import pytest
+
+from ad_index import TEXT_FIELDS, TextIndex
+from mock_ads_data import MOCK_ADS, filter_ads
+
+
+def substring_ids(query):
+    """The original search filter: case-insensitive substring of any text field"""
+    query = query.lower()
+    return {
+        ad["id"] for ad in MOCK_ADS
+        if any(query in str(ad.get(field) or "").lower() for field in TEXT_FIELDS)
+    }
+
+
+@pytest.mark.parametrize("query", [
+    "%", "!!", "\U0001f525", "50%", "$", "-", "24/7",
+    "ai", "ness", "a", "fitness", "Fitness App", "fitness app", "app fitness", "online store",
+    "e-commerce", "itness ap", "tech", " ", "zzz", "free shipping", "order online", "Coffee lovers, 2",
+    "enthusiasts, 25-45", "ee shipp", "get free",
+])
+def test_search_matches_substring_filter(query):
+    ids = {ad["id"] for ad in filter_ads(search_query=query, limit=len(MOCK_ADS))}
+    assert ids == substring_ids(query)
+
+
+def test_symbol_only_query_does_not_match_everything():
+    assert len(filter_ads(search_query="!!", limit=len(MOCK_ADS))) < len(MOCK_ADS)
+
+
+def test_index_search_is_a_substring_search():
+    index = TextIndex({"body": ["Fitness app for runners", "Fit 50% off", "Benefits", "apps for fitness"]})
+    assert index.search("fit").tolist() == [0, 1, 2, 3]
+    assert index.search("ness").tolist() == [0, 3]
+    assert index.search("FITNESS App").tolist() == [0]
+    assert index.search("ness app").tolist() == [0]
+    assert index.search("app fitness").tolist() == []
+    assert index.search("50%").tolist() == [1]
+    assert index.search("%").tolist() == [1]
+    assert index.search("!!").tolist() == []
+
+
+def test_multi_word_queries_do_not_span_fields():
+    index = TextIndex({"a": ["Fitness"], "b": ["App"]})
+    assert index.search("fitness").tolist() == [0]
+    assert index.search("fitness app").tolist() == []
+
+
+def test_substring_scan_does_not_span_fields():
+    index = TextIndex({"a": ["ends with %"], "b": ["!start"]})
+    assert index.search("%!").tolist() == []
+    assert index.search("%").tolist() == [0]
@@ -0,0 +1,61 @@
+import threading
+
+import analysis_cache
+from analysis_cache import AnalysisCache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    AnalysisCache(db_path=path).set("k", {"score": 1})
+    cache = AnalysisCache(db_path=path)
+    assert cache.get("k") == {"score": 1}
+    assert cache.get("k") == {"score": 1}
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+
+def test_memory_hits_do_not_wait_for_sqlite(tmp_path):
+    cache = AnalysisCache(db_path=str(tmp_path / "cache.sqlite3"))
+    cache.set("k", {"score": 1})
+    result = []
+    # A slow disk read or write holds the connection lock
+    with cache._db_lock:
+        reader = threading.Thread(target=lambda: result.append(cache.get("k")))
+        reader.start()
+        reader.join(timeout=2)
+        assert not reader.is_alive()
+    assert result == [{"score": 1}]
+
+
+def test_expired_rows_are_deleted_on_write(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(analysis_cache.time, "time", clock)
+    path = str(tmp_path / "cache.sqlite3")
+    cache = AnalysisCache(ttl=100, db_path=path, purge_interval=50)
+    cache.set("old", {"score": 1})
+
+    clock.now += 150
+    cache.set("new", {"score": 2})
+    keys = [row[0] for row in cache._db.execute("SELECT key FROM analysis_cache")]
+    assert keys == ["new"]
+    assert cache.stats()["expired_deleted"] == 1
+
+
+def test_expired_rows_are_deleted_on_open(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(analysis_cache.time, "time", clock)
+    path = str(tmp_path / "cache.sqlite3")
+    AnalysisCache(ttl=100, db_path=path).set("old", {"score": 1})
+
+    clock.now += 150
+    cache = AnalysisCache(ttl=100, db_path=path)
+    assert cache._db.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0] == 0
+    assert cache.get("old") is None
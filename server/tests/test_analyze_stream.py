@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+
+import pytest
+from starlette.testclient import TestClient
+
+import app
+import asgi
+from deadline import DEADLINE_HEADER
+
+ADS = [
+    {"id": "s1", "ad_creative_body": "Quick answer one"},
+    {"id": "s2", "ad_creative_body": "SLOW answer"},
+    {"id": "s3", "ad_creative_body": "Quick answer three"},
+]
+
+
+def analysis_for(prompt):
+    return {"marketingStrategy": {"primaryStrategy": "slow" if "SLOW" in prompt else "quick"}}
+
+
+class FakeClient:
+    """Answers at once, except for prompts about the SLOW ad, which outlive the deadline"""
+
+    def generate_json(self, prompt, generation_config, schema, on_value=None):
+        if "SLOW" in prompt:
+            time.sleep(0.6)
+        return analysis_for(prompt)
+
+
+class FakeAsyncClient:
+    async def generate_json(self, prompt, generation_config, schema, on_value=None):
+        if "SLOW" in prompt:
+            await asyncio.sleep(0.6)
+        return analysis_for(prompt)
+
+
+@pytest.fixture(autouse=True)
+def fake_gemini(monkeypatch):
+    monkeypatch.setattr(app, "STRUCTURED_OUTPUT", True)
+    monkeypatch.setattr(app, "get_cached_analysis", lambda ad: None)
+    monkeypatch.setattr(app, "cache_analysis", lambda ad, analysis: analysis)
+    monkeypatch.setattr(app, "get_gemini_client", lambda api_key: FakeClient())
+    monkeypatch.setattr(asgi, "get_async_gemini_client", lambda api_key: FakeAsyncClient())
+
+
+def flask_post(body, headers):
+    response = app.app.test_client().post("/api/analyze-ads", json=body, headers=headers)
+    return response.status_code, response.headers["Content-Type"], response.get_data(as_text=True)
+
+
+def asgi_post(body, headers):
+    response = TestClient(asgi.app).post("/api/analyze-ads", json=body, headers=headers)
+    return response.status_code, response.headers["content-type"], response.text
+
+
+def records(text):
+    lines = text.splitlines()
+    assert all(lines)
+    return [json.loads(line) for line in lines]
+
+
+@pytest.mark.parametrize("post", [flask_post, asgi_post], ids=["flask", "asgi"])
+def test_stream_sends_every_index_then_done(post):
+    status, content_type, text = post({"ads": ADS[::2], "stream": True, "mode": "single"}, {})
+    assert status == 200
+    assert content_type.startswith("application/x-ndjson")
+    *analyses, done = records(text)
+    assert sorted(record["index"] for record in analyses) == [0, 1]
+    assert all(record["analysis"]["marketingStrategy"]["primaryStrategy"] == "quick" for record in analyses)
+    assert done == {"done": True, "total": 2, "unfinished": 0}
+
+
+@pytest.mark.parametrize("post", [flask_post, asgi_post], ids=["flask", "asgi"])
+@pytest.mark.parametrize("on_deadline", ["fallback", "pending"])
+def test_stream_marks_ads_unfinished_at_the_deadline(post, on_deadline):
+    body = {"ads": ADS, "stream": True, "mode": "single", "on_deadline": on_deadline}
+    status, _, text = post(body, {DEADLINE_HEADER: "0.2"})
+    assert status == 200
+    *analyses, done = records(text)
+    assert done == {"done": True, "total": 3, "unfinished": 1}
+    # Finished ads come first; the slow one follows as the deadline's entry
+    assert sorted(record["index"] for record in analyses[:2]) == [0, 2]
+    late = analyses[2]
+    assert late["index"] == 1
+    assert late["analysis"]["status"] == on_deadline
+    assert late["analysis"]["ad"] == ADS[1]
@@ -0,0 +1,66 @@
+import argparse
+import json
+
+import bulk_analyze
+from rate_limiter import BULK, CHAT, PriorityRateLimiter, current_priority, with_priority
+
+
+def run_bulk(tmp_path, monkeypatch, ads, output_name, existing=None, rpm=None):
+    input_path = tmp_path / "ads.jsonl"
+    input_path.write_text("".join(ad if isinstance(ad, str) else json.dumps(ad) + "\n" for ad in ads), encoding="utf-8")
+    output_path = str(tmp_path / output_name)
+    if existing:
+        output = bulk_analyze.open_output(output_path)
+        for record in existing:
+            output.write(record)
+        output.close()
+
+    analyzed = []
+
+    def request_analysis(ad):
+        analyzed.append((ad["id"], current_priority()))
+        return {"ad": ad, "score": 1}
+
+    limiter = PriorityRateLimiter(requests_per_minute=30)
+    monkeypatch.setattr(bulk_analyze, "request_analysis", request_analysis)
+    monkeypatch.setattr(bulk_analyze, "gemini_rate_limiter", limiter)
+    args = argparse.Namespace(
+        input=str(input_path), output=output_path, workers=2, rpm=rpm, limit=0, report_every=60
+    )
+    assert bulk_analyze.run(args) == 0
+    return analyzed, limiter
+
+
+def test_resume_skips_numeric_ids_in_jsonl(tmp_path, monkeypatch):
+    existing = [{"id": 1, "analysis": {}, "analyzed_at": "2026-01-01T00:00:00+00:00"}]
+    analyzed, _ = run_bulk(tmp_path, monkeypatch, [{"id": 1}, {"id": 2}], "out.jsonl", existing)
+    assert [ad_id for ad_id, _ in analyzed] == [2]
+
+
+def test_resume_skips_numeric_ids_in_sqlite(tmp_path, monkeypatch):
+    existing = [{"id": 1, "analysis": {}, "analyzed_at": "2026-01-01T00:00:00+00:00"}]
+    analyzed, _ = run_bulk(tmp_path, monkeypatch, [{"id": 1}, {"id": 2}], "out.sqlite3", existing)
+    assert [ad_id for ad_id, _ in analyzed] == [2]
+
+
+def test_calls_run_at_bulk_priority_under_the_shared_limiter(tmp_path, monkeypatch):
+    analyzed, limiter = run_bulk(tmp_path, monkeypatch, [{"id": "a"}, {"id": "b"}], "out.jsonl", rpm=120)
+    assert sorted(analyzed) == [("a", BULK), ("b", BULK)]
+    assert limiter.stats()["requests_per_minute"] == 120
+
+
+def test_rpm_keeps_the_process_quota_unless_given(tmp_path, monkeypatch):
+    _, limiter = run_bulk(tmp_path, monkeypatch, [{"id": "a"}], "out.jsonl")
+    assert limiter.stats()["requests_per_minute"] == 30
+
+
+def test_input_rows_without_an_id_are_skipped(tmp_path, monkeypatch):
+    ads = [{"id": "a"}, {"ad_creative_body": "no id"}, "[1, 2]\n", "{not json\n", {"id": "b"}]
+    analyzed, _ = run_bulk(tmp_path, monkeypatch, ads, "out.jsonl")
+    assert sorted(ad_id for ad_id, _ in analyzed) == ["a", "b"]
+
+
+def test_analyze_one_sets_bulk_priority_itself(monkeypatch):
+    monkeypatch.setattr(bulk_analyze, "request_analysis", lambda ad: {"ad": ad, "priority": current_priority()})
+    record = with_priority(CHAT)(bulk_analyze.analyze_one)({"id": "a"})
+    assert record["analysis"] == {"priority": BULK}
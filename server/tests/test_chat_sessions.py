@@ -0,0 +1,49 @@
+import app
+from chat_sessions import ChatSessionStore
+
+
+def render(context):
+    return "\n".join(f"{key}: {value}" for key, value in sorted(context.items()))
+
+
+def test_user_context_counts_towards_session_size():
+    store = ChatSessionStore()
+    session = store.get_or_create()
+    empty = store.stats()["bytes"]
+    store.update_context(session, {"industry": "x" * 400}, render)
+    assert store.stats()["bytes"] >= empty + 2 * 400
+
+
+def test_unrendered_keys_are_dropped_and_values_clipped():
+    store = ChatSessionStore(context_keys=("industry", "goals"), max_context_chars=100, max_context_items=3)
+    session = store.get_or_create()
+    store.update_context(session, {
+        "industry": "x" * 5_000_000,
+        "goals": ["g" * 1000] * 50,
+        "blob": "y" * 5_000_000,
+    }, render)
+    assert set(session.user_context) == {"industry", "goals"}
+    assert len(session.user_context["industry"]) == 100
+    assert session.user_context["goals"] == ["g" * 100] * 3
+    assert store.stats()["bytes"] < 2000
+
+
+def test_memory_cap_holds_against_large_contexts():
+    store = ChatSessionStore(max_bytes=20_000)
+    for _ in range(50):
+        store.update_context(store.get_or_create(), {"industry": "z" * 10_000}, render)
+    stats = store.stats()
+    assert stats["bytes"] <= 20_000
+    assert stats["evicted"] > 0
+
+
+def test_chat_route_sessions_keep_only_rendered_keys():
+    session = app.chat_sessions.get_or_create()
+    app.prepare_chat({
+        "question": "hi",
+        "session_id": session.session_id,
+        "user_context": {"industry": "retail", "goals": ["reach", 3], "payload": "p" * 5_000_000},
+    })
+    assert session.user_context == {"industry": "retail", "goals": ["reach", "3"]}
+    assert "Industry: retail" in session.context_info
+    assert session.size < 2000
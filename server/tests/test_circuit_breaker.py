@@ -0,0 +1,138 @@
+import pytest
+
+import circuit_breaker
+import llm_client
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from llm_client import DeadlineExceeded, LLMError, LLMUnavailableError, call_through
+
+
+class Clock:
+    def __init__(self, now=1_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Response:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def breaker(**options):
+    return CircuitBreaker("test", **{"min_calls": 4, "window_calls": 10, "open_seconds": 30, **options})
+
+
+def fail(b, times):
+    for _ in range(times):
+        b.record(ok=False, probe=b.before_call())
+
+
+def test_opens_on_failure_rate_and_rejects_until_the_cool_down(clock):
+    b = breaker()
+    b.record(ok=True, probe=b.before_call())
+    fail(b, 2)
+    assert b.state == CLOSED  # 3 calls, below min_calls
+    fail(b, 1)
+    assert b.state == OPEN
+
+    clock.now += 29
+    with pytest.raises(CircuitOpenError) as error:
+        b.before_call()
+    assert error.value.retry_in == pytest.approx(1)
+    assert b.stats()["rejected"] == 1
+
+
+def test_successful_probe_closes_and_failed_probe_reopens(clock):
+    b = breaker()
+    fail(b, 4)
+    clock.now += 30
+    assert b.state == HALF_OPEN
+
+    probe = b.before_call()
+    assert probe is True
+    with pytest.raises(CircuitOpenError):
+        b.before_call()  # one probe at a time
+    b.record(ok=False, probe=probe)
+    assert b.state == OPEN
+    assert b.stats()["opened"] == 2
+
+    clock.now += 30
+    b.record(ok=True, probe=b.before_call())
+    assert b.state == CLOSED
+    assert b.stats()["recent_calls"] == 0
+    assert b.before_call() is False
+
+
+def test_old_failures_leave_the_window(clock):
+    b = breaker(window_seconds=60)
+    fail(b, 3)
+    clock.now += 61
+    b.record(ok=True, probe=b.before_call())
+    fail(b, 1)
+    assert b.state == CLOSED
+
+
+def test_slow_successes_count_as_failures(clock):
+    b = breaker(slow_call_seconds=5)
+    for _ in range(3):
+        b.record(ok=True, latency=4.9, probe=b.before_call())
+    assert b.state == CLOSED
+    for _ in range(2):
+        b.record(ok=True, latency=5.1, probe=b.before_call())
+    assert b.state == CLOSED  # 2 of 5 slow
+    b.record(ok=True, latency=5.1, probe=b.before_call())
+    assert b.state == OPEN
+
+
+def test_call_through_times_the_upstream(clock, monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_CIRCUIT_BREAKER", True)
+    b = breaker(slow_call_seconds=5)
+
+    def slow_send():
+        clock.now += 6
+        return Response()
+
+    for _ in range(4):
+        call_through(b, slow_send)
+    assert b.state == OPEN
+    with pytest.raises(LLMUnavailableError):
+        call_through(b, slow_send)
+
+
+def test_call_through_ignores_client_errors(clock, monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_CIRCUIT_BREAKER", True)
+    b = breaker()
+
+    def bad_request():
+        raise LLMError("bad request", status_code=400)
+
+    for _ in range(4):
+        with pytest.raises(LLMError):
+            call_through(b, bad_request)
+    assert b.state == CLOSED
+
+
+@pytest.mark.parametrize("error", [DeadlineExceeded(), KeyboardInterrupt()])
+def test_probe_is_released_when_the_call_ends_without_a_verdict(clock, monkeypatch, error):
+    monkeypatch.setattr(llm_client, "LLM_CIRCUIT_BREAKER", True)
+    b = breaker()
+    fail(b, 4)
+    clock.now += 30
+
+    def interrupted():
+        raise error
+
+    with pytest.raises(type(error)):
+        call_through(b, interrupted)
+    # No verdict: still half-open, and the next call gets the probe slot
+    assert b.state == HALF_OPEN
+    call_through(b, Response)
+    assert b.state == CLOSED
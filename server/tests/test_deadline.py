@@ -0,0 +1,154 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+import requests
+
+import llm_client
+from circuit_breaker import CLOSED, OPEN, CircuitBreaker
+from deadline import Deadline, deadline_scope
+from llm_client import DeadlineExceeded, LLMError, async_call_through, async_post_with_retries, call_through, post_with_retries
+
+URL = "https://upstream.test/v1/generate"
+TIMEOUT = (5.0, 60.0)
+
+
+class StubSession:
+    """requests.Session stand-in whose post() runs the given behaviour"""
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.timeouts = []
+
+    def post(self, url, headers=None, json=None, timeout=None, stream=False):
+        self.timeouts.append(timeout)
+        return self.behaviour(timeout)
+
+
+def connect_timeout(timeout):
+    raise requests.ConnectTimeout("connect timed out")
+
+
+def sleep_out_read_timeout(timeout):
+    time.sleep(timeout[1])
+    raise requests.ReadTimeout("read timed out")
+
+
+def test_connect_timeout_with_budget_left_is_retried(no_backoff):
+    session = StubSession(connect_timeout)
+    with deadline_scope(Deadline(25)):
+        with pytest.raises(LLMError) as raised:
+            post_with_retries(session, URL, {}, {}, TIMEOUT, max_retries=3)
+    assert not isinstance(raised.value, DeadlineExceeded)
+    assert len(session.timeouts) == 4
+    # Every attempt was still clipped to the deadline
+    assert all(read <= 25 for _, read in session.timeouts)
+
+
+def test_timeout_cut_short_by_deadline_raises_deadline_exceeded(no_backoff):
+    session = StubSession(sleep_out_read_timeout)
+    with deadline_scope(Deadline(0.2)):
+        with pytest.raises(DeadlineExceeded):
+            post_with_retries(session, URL, {}, {}, TIMEOUT, max_retries=3)
+    assert len(session.timeouts) == 1
+
+
+def test_no_deadline_never_raises_deadline_exceeded(no_backoff):
+    session = StubSession(connect_timeout)
+    with pytest.raises(LLMError) as raised:
+        post_with_retries(session, URL, {}, {}, TIMEOUT, max_retries=1)
+    assert not isinstance(raised.value, DeadlineExceeded)
+
+
+def test_failure_without_time_to_retry_is_reported_not_deadline(monkeypatch):
+    monkeypatch.setattr(llm_client, "backoff_delay", lambda attempt, retry_after=None: 5.0)
+    session = StubSession(connect_timeout)
+    with deadline_scope(Deadline(1)):
+        with pytest.raises(LLMError) as raised:
+            post_with_retries(session, URL, {}, {}, TIMEOUT, max_retries=3)
+    assert not isinstance(raised.value, DeadlineExceeded)
+    assert len(session.timeouts) == 1
+
+
+def test_breaker_opens_on_repeated_connect_timeouts_under_a_deadline(no_backoff):
+    breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=5)
+    session = StubSession(connect_timeout)
+    with deadline_scope(Deadline(25)):
+        for _ in range(10):
+            try:
+                call_through(breaker, lambda: post_with_retries(session, URL, {}, {}, TIMEOUT, max_retries=0))
+            except LLMError:
+                pass
+    assert breaker.state == OPEN
+
+
+def test_deadline_timeouts_do_not_count_against_the_breaker(no_backoff):
+    breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=2)
+    session = StubSession(sleep_out_read_timeout)
+    for _ in range(3):
+        with deadline_scope(Deadline(0.05)):
+            with pytest.raises(DeadlineExceeded):
+                call_through(breaker, lambda: post_with_retries(session, URL, {}, {}, TIMEOUT))
+    assert breaker.state == CLOSED
+    assert breaker.stats()["recent_calls"] == 0
+
+
+def run_async_post(handler, deadline_seconds, max_retries=3):
+    calls = []
+
+    async def send(request):
+        calls.append(request)
+        return await handler(request)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(send)) as client:
+            with deadline_scope(Deadline(deadline_seconds)):
+                return await async_post_with_retries(
+                    client, URL, {}, {}, httpx.Timeout(60.0, connect=5.0), max_retries=max_retries
+                )
+
+    return calls, main
+
+
+def test_async_connect_timeout_with_budget_left_is_retried(no_backoff):
+    async def handler(request):
+        raise httpx.ConnectTimeout("connect timed out", request=request)
+
+    calls, main = run_async_post(handler, 25)
+    with pytest.raises(LLMError) as raised:
+        asyncio.run(main())
+    assert not isinstance(raised.value, DeadlineExceeded)
+    assert len(calls) == 4
+
+
+def test_async_timeout_cut_short_by_deadline_raises_deadline_exceeded(no_backoff):
+    async def handler(request):
+        await asyncio.sleep(0.2)
+        raise httpx.ReadTimeout("read timed out", request=request)
+
+    calls, main = run_async_post(handler, 0.2)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert len(calls) == 1
+
+
+def test_async_breaker_records_connect_timeouts(no_backoff):
+    breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=5)
+
+    async def handler(request):
+        raise httpx.ConnectTimeout("connect timed out", request=request)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with deadline_scope(Deadline(25)):
+                for _ in range(10):
+                    try:
+                        await async_call_through(breaker, lambda: async_post_with_retries(
+                            client, URL, {}, {}, httpx.Timeout(60.0, connect=5.0), max_retries=0
+                        ))
+                    except LLMError:
+                        pass
+
+    asyncio.run(main())
+    assert breaker.state == OPEN
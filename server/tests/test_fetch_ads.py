@@ -0,0 +1,54 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def ids(ads):
+    return [ad["id"] for ad in ads]
+
+
+def offset_pages(client, params, limit):
+    collected, offset = [], 0
+    while True:
+        page = client.get("/api/fetch-ads", query_string={**params, "limit": limit, "offset": offset}).get_json()
+        collected += ids(page)
+        if len(page) < limit:
+            return collected
+        offset += limit
+
+
+def cursor_pages(client, params, limit):
+    collected, cursor = [], ""
+    while cursor is not None:
+        page = client.get("/api/fetch-ads", query_string={**params, "limit": limit, "cursor": cursor}).get_json()
+        assert len(page["ads"]) <= limit
+        assert page["has_more"] == (page["next_cursor"] is not None)
+        collected += ids(page["ads"])
+        cursor = page["next_cursor"]
+    return collected
+
+
+@pytest.mark.parametrize("params", [{}, {"q": "shop"}, {"q": "the"}, {"q": "no such ad"}])
+@pytest.mark.parametrize("limit", [1, 3])
+def test_cursor_pages_match_offset_pages(client, params, limit):
+    expected = offset_pages(client, params, limit)
+    assert cursor_pages(client, params, limit) == expected
+    assert len(expected) == len(set(expected))
+
+
+@pytest.mark.parametrize("query", ["limit=0", "limit=-1", "limit=0&cursor=", "limit=ten", "offset=-1"])
+def test_invalid_paging_is_rejected(client, query):
+    response = client.get(f"/api/fetch-ads?{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_limit_is_capped(client, monkeypatch):
+    monkeypatch.setattr(app, "FETCH_ADS_MAX_LIMIT", 3)
+    assert len(client.get("/api/fetch-ads?limit=50").get_json()) == 3
+    assert len(client.get("/api/fetch-ads?limit=50&cursor=").get_json()["ads"]) == 3
@@ -0,0 +1,34 @@
+from heuristic_analyzer import HeuristicAnalyzer
+
+ADS = [
+    {"id": "a", "ad_creative_body": "Amazing results, join our community", "business_type": "Fitness", "spend": 6000},
+    {"id": "b", "ad_creative_body": "Limited offer on the best shoes", "business_type": "E-commerce", "spend": 12000},
+    {"id": "c", "ad_creative_body": "Struggling with bugs? We fix them", "business_type": "Technology", "spend": 100},
+]
+
+
+def scores(analysis):
+    return (
+        analysis["performanceMetrics"],
+        analysis["sentimentAnalysis"]["sentimentScore"],
+        analysis["sentimentAnalysis"]["keyPhrases"],
+        analysis["emotionalAnalysis"]["emotionalScore"],
+        analysis["emotionalAnalysis"]["emotionalTriggers"],
+        analysis["hooks"]["hookEffectiveness"],
+    )
+
+
+def test_seeded_scores_do_not_depend_on_position():
+    analyzer = HeuristicAnalyzer(seed=7)
+    forward = {a["ad"]["id"]: scores(a) for a in analyzer.analyze_batch(ADS)}
+    backward = {a["ad"]["id"]: scores(a) for a in analyzer.analyze_batch(ADS[::-1], start_index=10)}
+    alone = scores(analyzer.analyze(ADS[1], 42))
+    assert forward == backward
+    assert forward["b"] == alone
+
+
+def test_seeded_scores_follow_ad_content():
+    analyzer = HeuristicAnalyzer(seed=7)
+    edited = {**ADS[0], "ad_creative_body": ADS[0]["ad_creative_body"] + "!"}
+    assert scores(analyzer.analyze(ADS[0], 0)) != scores(analyzer.analyze(edited, 0))
+    assert scores(analyzer.analyze(ADS[0], 0)) != scores(HeuristicAnalyzer(seed=8).analyze(ADS[0], 0))
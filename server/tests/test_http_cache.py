@@ -0,0 +1,73 @@
+import gzip
+
+import brotli
+import pytest
+
+import app
+from http_cache import matched_tag, negotiate_encoding
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def test_presence_only_parameters_get_their_own_etag(client):
+    listing = client.get("/api/fetch-ads?limit=2")
+    page = client.get("/api/fetch-ads?limit=2&cursor=")
+    assert isinstance(listing.get_json(), list)
+    assert isinstance(page.get_json(), dict)
+    assert listing.headers["ETag"] != page.headers["ETag"]
+
+    revalidated = client.get("/api/fetch-ads?limit=2&cursor=", headers={"If-None-Match": listing.headers["ETag"]})
+    assert revalidated.status_code == 200
+
+
+def test_reordered_parameters_share_an_etag(client):
+    first = client.get("/api/fetch-ads?limit=2&offset=1")
+    second = client.get("/api/fetch-ads?offset=1&limit=2")
+    assert first.headers["ETag"] == second.headers["ETag"]
+
+
+def test_matching_if_none_match_gets_304(client):
+    response = client.get("/api/filter-options")
+    etag = response.headers["ETag"]
+    revalidated = client.get("/api/filter-options", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert revalidated.get_data() == b""
+
+
+def test_body_hash_etag_revalidates_views_without_a_version(client):
+    response = client.get("/api/health")
+    revalidated = client.get("/api/health", headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+@pytest.mark.parametrize("accept, encoding, decode", [
+    ("gzip", "gzip", gzip.decompress),
+    ("br", "br", brotli.decompress),
+    ("gzip;q=0.5, br;q=1", "br", brotli.decompress),
+    ("gzip, br;q=0", "gzip", gzip.decompress),
+])
+def test_large_bodies_are_compressed_as_negotiated(client, accept, encoding, decode):
+    plain = client.get("/api/fetch-ads?limit=50", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+    response = client.get("/api/fetch-ads?limit=50", headers={"Accept-Encoding": accept})
+    assert response.headers["Content-Encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert decode(response.get_data()) == plain.get_data()
+    # Each encoding is its own representation, and any of them revalidates
+    assert response.headers["ETag"] == plain.headers["ETag"][:-1] + f'-{encoding}"'
+    revalidated = client.get(
+        "/api/fetch-ads?limit=50", headers={"Accept-Encoding": accept, "If-None-Match": plain.headers["ETag"]}
+    )
+    assert revalidated.status_code == 304
+
+
+def test_negotiation_and_tag_matching():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("*") == "br"
+    assert negotiate_encoding("gzip;q=0, br;q=0") is None
+    assert matched_tag('W/"abc-gzip"', "abc") == '"abc-gzip"'
+    assert matched_tag('"other"', "abc") is None
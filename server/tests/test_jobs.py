@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+import app
+from jobs import FAILED, SUCCEEDED, JobWorkers, MemoryJobBackend, SQLiteJobBackend
+from mock_ads_data import filter_ads
+
+ANALYSIS = {
+    "marketingStrategy": {"primaryStrategy": "s", "callToAction": "c", "valueProposition": "v"},
+    "emotionalAnalysis": {"primaryEmotion": "joy", "emotionalScore": 80, "emotionalTriggers": ["a"]},
+    "sentimentAnalysis": {"overallSentiment": "positive", "sentimentScore": 50, "keyPhrases": ["x"]},
+    "hooks": {"primaryHook": "h", "hookType": "story", "hookEffectiveness": 70},
+    "performanceMetrics": {"estimatedEngagement": 1, "conversionPotential": 2, "viralityScore": 3},
+}
+
+
+def wait_for(workers, job_id, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        job = workers.get(job_id)
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobBackend()
+    return SQLiteJobBackend(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_analysis_job_records_every_ad(backend, monkeypatch):
+    monkeypatch.setattr(app, "analyze_single_ad", lambda ad, i: {"ad": ad, **ANALYSIS})
+    ads = filter_ads(limit=3)
+    workers = JobWorkers(backend, {"analyze-ads": app.run_analysis_job}, workers=1)
+    job = wait_for(workers, workers.submit("analyze-ads", {"ads": ads, "mode": "single"}, len(ads)))
+    assert job["status"] == SUCCEEDED
+    assert job["progress"] == {"done": 3, "total": 3}
+    assert [result["ad"]["id"] for result in job["results"]] == [ad["id"] for ad in ads]
+
+
+def test_unanalyzed_ads_get_the_fallback_not_none(backend, monkeypatch):
+    # analyze_single_ad returns None when a deadline (e.g. one leaked from a shared call) runs out
+    monkeypatch.setattr(app, "analyze_single_ad", lambda ad, i: None)
+    monkeypatch.setattr(app, "create_insights", lambda analysis: {"analyses": len(analysis)})
+    ads = filter_ads(limit=3)
+    workers = JobWorkers(backend, {"analyze-ads": app.run_analysis_job}, workers=1)
+    job = wait_for(workers, workers.submit("analyze-ads", {"ads": ads, "mode": "single", "insights": True}, len(ads)))
+    assert job["status"] == SUCCEEDED
+    assert all(result is not None and result["status"] == "fallback" for result in job["results"])
+    assert all("marketingStrategy" in result for result in job["results"])
+
+
+def test_failing_handler_marks_the_job_failed(backend):
+    def handler(payload, done, record):
+        record(0, "partial")
+        raise RuntimeError("boom")
+
+    workers = JobWorkers(backend, {"x": handler}, workers=1)
+    job = wait_for(workers, workers.submit("x", {}, 2))
+    assert job["status"] == FAILED
+    assert job["error"] == "boom"
+    assert job["results"] == ["partial", None]
+
+
+def test_queued_jobs_resume_when_workers_start(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    # Queued by a previous run of the server
+    job_id = SQLiteJobBackend(path).submit("x", {"n": 2}, 2)
+
+    def handler(payload, done, record):
+        for i in range(payload["n"]):
+            record(i, i)
+        return {}
+
+    workers = JobWorkers(SQLiteJobBackend(path), {"x": handler}, workers=1)
+    workers.start()
+    end = time.monotonic() + 5
+    while workers.backend.get(job_id)["status"] != SUCCEEDED:
+        assert time.monotonic() < end, "queued job was not picked up at startup"
+        time.sleep(0.02)
+
+
+def test_busy_job_keeps_its_heartbeat_and_is_not_reclaimed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    release = threading.Event()
+    runs = []
+
+    def slow_handler(payload, done, record):
+        # Waits (e.g. on rate limits) far longer than the stale window without recording anything
+        runs.append(dict(done))
+        release.wait(5)
+        record(0, "done")
+        return {}
+
+    workers = JobWorkers(SQLiteJobBackend(path, stale_seconds=0.4), {"x": slow_handler}, workers=1)
+    job_id = workers.submit("x", {}, 1)
+    time.sleep(1.2)
+    other = SQLiteJobBackend(path, stale_seconds=0.4)
+    assert other.claim(timeout=0.1) is None
+    release.set()
+    end = time.monotonic() + 5
+    while workers.backend.get(job_id)["status"] != SUCCEEDED:
+        assert time.monotonic() < end
+        time.sleep(0.02)
+    assert len(runs) == 1
+
+
+def test_job_of_a_dead_process_is_reclaimed_and_resumed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    crashed = SQLiteJobBackend(path, stale_seconds=0.2)
+    job_id = crashed.submit("x", {"n": 3}, 3)
+    assert crashed.claim(timeout=0.1)[0] == job_id
+    crashed.record(job_id, 0, "a")
+    # No heartbeat follows: the process died
+
+    survivor = SQLiteJobBackend(path, stale_seconds=0.2)
+    time.sleep(0.3)
+    claimed = survivor.claim(timeout=0.1)
+    assert claimed is not None and claimed[0] == job_id and claimed[3] == {0: "a"}
+    # The dead run's late writes no longer win
+    survivor.record(job_id, 1, "b")
+    crashed.record(job_id, 1, "stale")
+    crashed.finish(job_id, error="late")
+    survivor.record(job_id, 2, "c")
+    survivor.finish(job_id, output={})
+    job = survivor.get(job_id)
+    assert job["status"] == SUCCEEDED and job["results"] == ["a", "b", "c"]
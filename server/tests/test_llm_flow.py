@@ -0,0 +1,125 @@
+import asyncio
+import threading
+
+import pytest
+from starlette.testclient import TestClient
+
+import app
+import asgi
+from llm_client import LLMError
+from llm_flow import Blocking, Generate, GenerateJson, Parallel, run_flow, run_flow_async
+
+
+class FakeClient:
+    """GeminiClient stand-in answering from a prompt -> reply (or exception) table"""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.prompts = []
+
+    def reply(self, prompt):
+        self.prompts.append(prompt)
+        reply = self.replies.get(prompt, prompt.upper())
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def generate_text(self, prompt, generation_config):
+        return self.reply(prompt)
+
+    def generate_json(self, prompt, generation_config, schema, on_value=None):
+        value = self.reply(prompt)
+        for item in value if isinstance(value, list) else ():
+            if on_value is not None:
+                on_value(None, item)
+        return value
+
+
+class FakeAsyncClient(FakeClient):
+    async def generate_text(self, prompt, generation_config):
+        await asyncio.sleep(0)
+        return self.reply(prompt)
+
+    async def generate_json(self, prompt, generation_config, schema, on_value=None):
+        await asyncio.sleep(0)
+        return FakeClient.generate_json(self, prompt, generation_config, schema, on_value)
+
+
+def word_flow(word):
+    try:
+        return (yield Generate(word, {}))
+    except LLMError:
+        return "fallback"
+
+
+def sample_flow():
+    first = yield Generate("a", {})
+    items = yield GenerateJson("list", {}, {})
+    stored = yield Blocking(lambda *args: "+".join(args), first, "b")
+    words = yield Parallel([word_flow("x"), word_flow("boom"), word_flow("y")], max_workers=3)
+    return first, items, stored, words
+
+
+REPLIES = {"list": [1, 2], "boom": LLMError("upstream failed")}
+EXPECTED = ("A", [1, 2], "A+b", ["X", "fallback", "Y"])
+
+
+def test_sync_and_async_runners_agree():
+    assert run_flow(sample_flow(), FakeClient(REPLIES)) == EXPECTED
+    assert asyncio.run(run_flow_async(sample_flow(), FakeAsyncClient(REPLIES))) == EXPECTED
+
+
+def test_unhandled_errors_propagate():
+    def failing():
+        yield Generate("boom", {})
+
+    with pytest.raises(LLMError):
+        run_flow(failing(), FakeClient(REPLIES))
+    with pytest.raises(LLMError):
+        asyncio.run(run_flow_async(failing(), FakeAsyncClient(REPLIES)))
+
+
+def test_async_runner_keeps_blocking_work_off_the_event_loop():
+    def flow():
+        return (yield Blocking(threading.get_ident))
+
+    async def run():
+        return threading.get_ident(), await run_flow_async(flow(), FakeAsyncClient({}))
+
+    loop_thread, worker_thread = asyncio.run(run())
+    assert loop_thread != worker_thread
+
+
+def test_async_analysis_reads_cache_in_a_worker_thread(monkeypatch):
+    ad = {"id": "ad-1", "ad_creative_body": "Run faster"}
+    threads = []
+
+    def cached(ad):
+        threads.append(threading.get_ident())
+        return {"ad": ad, "cached": True}
+
+    monkeypatch.setattr(app, "get_cached_analysis", cached)
+    client = FakeAsyncClient({})
+    monkeypatch.setattr(asgi, "get_async_gemini_client", lambda api_key: client)
+
+    async def run():
+        return threading.get_ident(), await asgi.run_gemini_flow(app.analyze_single_ad_flow(ad, 0))
+
+    loop_thread, result = asyncio.run(run())
+    assert result == {"ad": ad, "cached": True}
+    assert threads and threads[0] != loop_thread
+    assert client.prompts == []
+
+
+def test_insights_endpoints_share_one_orchestration(monkeypatch):
+    insights = {"competitiveAnalysis": {"strengths": ["reach"]}}
+    monkeypatch.setattr(app, "STRUCTURED_OUTPUT", True)
+    monkeypatch.setattr(app, "get_gemini_client", lambda api_key: FakeClient({}))
+    monkeypatch.setattr(asgi, "get_async_gemini_client", lambda api_key: FakeAsyncClient({}))
+    # Both clients answer with the prompt's reply; make it the insights object for any prompt
+    monkeypatch.setattr(FakeClient, "reply", lambda self, prompt: insights)
+
+    analysis = [{"ad": {"id": "1"}, "marketingStrategy": {}}]
+    flask_reply = app.app.test_client().post("/api/generate-insights", json={"analysis": analysis})
+    asgi_reply = TestClient(asgi.app).post("/api/generate-insights", json={"analysis": analysis})
+    assert flask_reply.get_json() == asgi_reply.json() == insights
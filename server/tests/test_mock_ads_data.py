@@ -0,0 +1,18 @@
+from mock_ads_data import MOCK_ADS, filter_ads
+
+
+def ids(ads):
+    return [ad["id"] for ad in ads]
+
+
+def test_positional_limit_and_offset_keep_their_places():
+    # search, countries, business types, categories, spend and impression bounds, limit, offset
+    positional = filter_ads("", None, None, None, 0, 100000, 0, 1000000, 3, 2)
+    assert ids(positional) == ids(filter_ads(limit=3, offset=2))
+    assert len(positional) == 3
+
+
+def test_date_range_is_keyword_filtered():
+    dated = filter_ads(start_date="2024-08-16", end_date="2024-08-17", limit=len(MOCK_ADS))
+    assert dated
+    assert all("2024-08-16" <= ad["created_date"] <= "2024-08-17" for ad in dated)
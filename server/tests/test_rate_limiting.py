@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+import llm_client
+from circuit_breaker import CLOSED, HALF_OPEN, CircuitBreaker
+from deadline import Deadline, deadline_scope
+from llm_client import DeadlineExceeded, GeminiClient, admit_gemini, call_through
+from rate_limiter import BULK, CHAT, INTERACTIVE, PriorityRateLimiter
+
+
+def test_queued_calls_are_admitted_in_priority_order():
+    limiter = PriorityRateLimiter(requests_per_minute=600)
+    limiter.requests.level = 0
+    admitted = []
+
+    def call(priority):
+        limiter.acquire(1, priority)
+        admitted.append(priority)
+
+    threads = []
+    for priority in (BULK, INTERACTIVE, CHAT):
+        thread = threading.Thread(target=call, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        # Let each caller join the queue before the next, more urgent one
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert admitted == [CHAT, INTERACTIVE, BULK]
+
+
+class Reply:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+        self.text = ""
+
+    def json(self):
+        return {"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}
+
+    def close(self):
+        pass
+
+
+class ThrottledSession:
+    """Answers 429 a given number of times, then 200"""
+
+    def __init__(self, throttled):
+        self.throttled = throttled
+        self.posts = 0
+
+    def post(self, url, headers=None, json=None, timeout=None, stream=False):
+        self.posts += 1
+        return Reply(429 if self.posts <= self.throttled else 200)
+
+
+def test_every_retry_is_charged_to_the_rate_limiter(monkeypatch, no_backoff):
+    limiter = PriorityRateLimiter(requests_per_minute=1000)
+    monkeypatch.setattr(llm_client, "gemini_rate_limiter", limiter)
+    monkeypatch.setattr(llm_client, "LLM_SINGLE_FLIGHT", False)
+    session = ThrottledSession(throttled=2)
+    client = GeminiClient("test-key", session=session)
+    assert client.generate_text("hello", {}, priority=CHAT) == "ok"
+    assert session.posts == 3
+    assert limiter.stats()["priorities"]["chat"]["admitted"] == 3
+
+
+def test_post_with_retries_admits_each_retry(no_backoff):
+    admitted = []
+    session = ThrottledSession(throttled=3)
+    response = llm_client.post_with_retries(
+        session, "https://upstream.test", {}, {}, (5.0, 60.0), max_retries=3, admit=lambda: admitted.append(1)
+    )
+    assert response.status_code == 200
+    # The first attempt is admitted by call_through
+    assert len(admitted) == 3
+
+
+def test_call_waiting_for_quota_does_not_hold_the_probe_slot():
+    breaker = CircuitBreaker("test", open_seconds=0)
+    breaker._open(time.monotonic())
+    assert breaker.state == HALF_OPEN
+    states = []
+
+    def admit():
+        # A second caller can still take the single half-open probe meanwhile
+        states.append(breaker.before_call())
+        breaker.release(True)
+
+    call_through(breaker, lambda: Reply(200), admit)
+    assert states == [True]
+    assert breaker.state == CLOSED
+
+
+def test_quota_timeout_is_a_deadline_not_a_failure(monkeypatch):
+    limiter = PriorityRateLimiter(requests_per_minute=1)
+    limiter.requests.level = 0
+    monkeypatch.setattr(llm_client, "gemini_rate_limiter", limiter)
+    breaker = CircuitBreaker("test")
+    with deadline_scope(Deadline(0.05)):
+        with pytest.raises(DeadlineExceeded):
+            call_through(breaker, lambda: Reply(200), lambda: admit_gemini({"contents": []}, BULK))
+    assert breaker.stats()["recent_calls"] == 0
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import llm_client
+from deadline import Deadline, deadline_scope
+from llm_client import AsyncGeminiClient, DeadlineExceeded, GeminiClient, LLMError, check_deadline, deadline_reached
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def slow_call(calls):
+    """A 0.2s upstream call that fails if the caller's deadline runs out meanwhile"""
+    def call():
+        calls.append(threading.current_thread().name)
+        time.sleep(0.2)
+        check_deadline()
+        if deadline_reached():
+            raise DeadlineExceeded()
+        return "answer"
+    return call
+
+
+def run_thread(target, results, name):
+    thread = threading.Thread(target=lambda: results.__setitem__(name, target()), name=name)
+    thread.start()
+    return thread
+
+
+def capture(fn):
+    def run():
+        try:
+            return fn()
+        except Exception as e:
+            return e
+    return run
+
+
+def test_concurrent_identical_calls_share_one_result():
+    flights = SingleFlight()
+    calls, results = [], {}
+    threads = [run_thread(capture(lambda: flights.do("k", slow_call(calls))), results, f"t{n}") for n in range(4)]
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert set(results.values()) == {"answer"}
+
+
+def test_leader_deadline_is_not_shared_with_followers():
+    flights = SingleFlight(unshared=(DeadlineExceeded,))
+    calls, results = [], {}
+
+    def leader():
+        with deadline_scope(Deadline(0.1)):
+            return flights.do("k", slow_call(calls))
+
+    leader_thread = run_thread(capture(leader), results, "leader")
+    time.sleep(0.05)
+    # No deadline of its own, e.g. a background job
+    follower_thread = run_thread(capture(lambda: flights.do("k", slow_call(calls))), results, "follower")
+    leader_thread.join()
+    follower_thread.join()
+
+    assert isinstance(results["leader"], DeadlineExceeded)
+    assert results["follower"] == "answer"
+    assert calls == ["leader", "follower"]
+    assert flights.stats()["retried"] == 1
+
+
+def test_other_errors_are_shared():
+    flights = SingleFlight(unshared=(DeadlineExceeded,))
+    calls, results = [], {}
+
+    def failing():
+        calls.append(1)
+        time.sleep(0.1)
+        raise ValueError("upstream said no")
+
+    threads = [run_thread(capture(lambda: flights.do("k", failing)), results, f"t{n}") for n in range(3)]
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results.values())
+
+
+def test_async_leader_deadline_is_not_shared_with_followers():
+    flights = AsyncSingleFlight(unshared=(DeadlineExceeded,))
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        if deadline_reached():
+            raise DeadlineExceeded()
+        return "answer"
+
+    async def leader():
+        with deadline_scope(Deadline(0.1)):
+            return await flights.do("k", upstream)
+
+    async def follower():
+        await asyncio.sleep(0.05)
+        return await flights.do("k", upstream)
+
+    async def main():
+        return await asyncio.gather(leader(), follower(), return_exceptions=True)
+
+    leader_result, follower_result = asyncio.run(main())
+    assert isinstance(leader_result, DeadlineExceeded)
+    assert follower_result == "answer"
+    assert len(calls) == 2
+
+
+def test_llm_clients_do_not_share_deadlines():
+    assert DeadlineExceeded in llm_client.sync_flights.unshared
+    assert DeadlineExceeded in llm_client.async_flights.unshared
+
+
+STRINGS = {"type": "ARRAY", "items": {"type": "STRING"}}
+
+
+def streamed_reply(streams, fail=False):
+    """stream_text stand-in sending ["a", "b"] in two slow chunks, or dropping after the first"""
+    def stream_text(prompt, config, priority=None):
+        streams.append(1)
+        yield '["a",'
+        time.sleep(0.2)
+        if fail:
+            raise LLMError("stream dropped")
+        yield '"b"]'
+    return stream_text
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_coalesced_json_callers_receive_the_leaders_parts(monkeypatch, fail):
+    monkeypatch.setattr(llm_client, "LLM_SINGLE_FLIGHT", True)
+    streams, results, seen = [], {}, {}
+    client = GeminiClient("key")
+    monkeypatch.setattr(client, "stream_text", streamed_reply(streams, fail))
+
+    def call(name):
+        seen[name] = []
+        return capture(lambda: client.generate_json("p", {}, STRINGS, on_value=lambda _, v: seen[name].append(v)))
+
+    threads = []
+    for name in ("leader", "follower"):
+        threads.append(run_thread(call(name), results, name))
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+
+    assert len(streams) == 1
+    if fail:
+        assert all(isinstance(result, LLMError) for result in results.values())
+        assert seen == {"leader": ["a"], "follower": ["a"]}
+    else:
+        assert results == {"leader": ["a", "b"], "follower": ["a", "b"]}
+        assert seen == {"leader": ["a", "b"], "follower": ["a", "b"]}
+
+
+def test_async_coalesced_json_callers_receive_the_leaders_parts(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_SINGLE_FLIGHT", True)
+    streams, seen = [], {"leader": [], "follower": []}
+    client = AsyncGeminiClient("key")
+
+    async def stream_text(prompt, config, priority=None):
+        streams.append(1)
+        yield '["a",'
+        await asyncio.sleep(0.1)
+        yield '"b"]'
+
+    monkeypatch.setattr(client, "stream_text", stream_text)
+
+    async def call(name, delay):
+        await asyncio.sleep(delay)
+        return await client.generate_json("p", {}, STRINGS, on_value=lambda _, v: seen[name].append(v))
+
+    async def main():
+        return await asyncio.gather(call("leader", 0), call("follower", 0.05))
+
+    assert asyncio.run(main()) == [["a", "b"], ["a", "b"]]
+    assert len(streams) == 1
+    assert seen == {"leader": ["a", "b"], "follower": ["a", "b"]}
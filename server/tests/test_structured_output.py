@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from structured_output import (
+    BATCH_ANALYSIS_SCHEMA, INSIGHTS_SCHEMA, IncrementalJSONParser, StructuredOutputError, parse_json,
+)
+
+STRINGS = {"type": "ARRAY", "items": {"type": "STRING"}}
+FINDINGS = {"type": "OBJECT", "properties": {"findings": STRINGS, "note": {"type": "STRING"}}, "required": ["findings"]}
+
+
+def parse_in_chunks(text, schema, size):
+    seen = []
+    parser = IncrementalJSONParser(schema, lambda key, value: seen.append((key, value)))
+    for start in range(0, len(text), size):
+        parser.feed(text[start:start + size])
+    return parser.close(), seen
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_chunk_boundaries_do_not_matter(size):
+    text = '{"findings": ["a, b", "[c]", "{d}"], "note": "done"}'
+    value, seen = parse_in_chunks(text, FINDINGS, size)
+    assert value == json.loads(text)
+    assert seen == [("findings", ["a, b", "[c]", "{d}"]), ("note", "done")]
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_escapes_inside_strings(size):
+    items = ['say "hi"', "back\\slash", "ends with \\", "quote, comma ]", "line\nbreak", "café"]
+    value, seen = parse_in_chunks(json.dumps(items), STRINGS, size)
+    assert value == items
+    assert seen == list(enumerate(items))
+
+
+@pytest.mark.parametrize("text", ["[]", " [ ] ", "[\n]"])
+def test_empty_array(text):
+    assert parse_in_chunks(text, STRINGS, 1) == ([], [])
+
+
+@pytest.mark.parametrize("text", ['["a",]', '["a",,"b"]', '[,]', '{"findings": [],}'])
+def test_trailing_and_empty_members_are_rejected(text):
+    with pytest.raises(StructuredOutputError, match="empty member"):
+        parse_json(text, FINDINGS if text.startswith("{") else STRINGS)
+
+
+@pytest.mark.parametrize("text", ['```json\n["a"]\n```', '["a"]\n```', 'Here you go: ["a"]'])
+def test_fenced_or_wrapped_replies_are_rejected(text):
+    with pytest.raises(StructuredOutputError):
+        parse_json(text, STRINGS)
+
+
+def test_reply_cut_short_keeps_the_complete_parts():
+    parser = IncrementalJSONParser(STRINGS)
+    parser.feed('["a", "b", "c')
+    with pytest.raises(StructuredOutputError) as error:
+        parser.close()
+    assert error.value.partial == ["a", "b"]
+
+
+def test_invalid_item_fails_with_the_valid_items_so_far():
+    seen = []
+    parser = IncrementalJSONParser(BATCH_ANALYSIS_SCHEMA, lambda key, value: seen.append(key))
+    with pytest.raises(StructuredOutputError, match=r"\$\[0\]: missing id") as error:
+        parser.feed('[{"marketingStrategy": {}}, ')
+    assert error.value.partial == []
+    assert seen == []
+
+
+def test_object_members_are_validated_as_they_arrive():
+    parser = IncrementalJSONParser(INSIGHTS_SCHEMA)
+    with pytest.raises(StructuredOutputError, match="competitiveAnalysis"):
+        parser.feed('{"competitiveAnalysis": {"strengths": "not a list"}, ')
@@ -13,7 +13,8 @@ const Chat = () => {
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
   const [isComposing, setIsComposing] = useState(false);
-  const [userContext, setUserContext] = useState<{[key: string]: any}>({});
+  // Server-side chat session: the backend keeps history and context, so only new turns are sent
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const chatEndRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
@@ -65,20 +66,13 @@ const Chat = () => {
     const userText = trimmed.replace(/\s+/g, " ");
     setMessages(prev => [...prev, { sender: "user", text: userText }]);
     
-    // Extract and update user context
+    // Extract user context; the server merges it into the session
     const newContext = extractUserContext(userText);
-    setUserContext(prev => ({ ...prev, ...newContext }));
     
     setInput("");
     setIsLoading(true);
     
     try {
-      // Prepare conversation history for context
-      const conversationHistory = messages.map(msg => ({
-        role: msg.sender === 'user' ? 'user' : 'assistant',
-        content: msg.text
-      }));
-      
       const response = await fetch('http://localhost:5001/api/chat', {
         method: 'POST',
         headers: {
@@ -86,8 +80,8 @@ const Chat = () => {
         },
         body: JSON.stringify({ 
           question: userText,
-          conversation_history: conversationHistory,
-          user_context: { ...userContext, ...newContext }
+          session_id: sessionId,
+          user_context: newContext
         }),
       });
       
@@ -96,6 +90,7 @@ const Chat = () => {
       }
       
       const data = await response.json();
+      if (data.session_id) setSessionId(data.session_id);
       setMessages(prev => [...prev, { sender: "ai", text: data.answer }]);
     } catch (error) {
       console.error('Error:', error);